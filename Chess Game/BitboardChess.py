@@ -0,0 +1,182 @@
+"""
+Precomputed bitboard tables used by the bitboard backend of GameState.
+Squares are numbered row * 8 + col, the same (row, col) layout as GameState.board,
+so square 0 is a8 and square 63 is h1.
+The tables are built once and cached in __pycache__, later imports load them with marshal (about ten times faster),
+which keeps the start of short lived engine processes cheap.
+"""
+import marshal
+import os
+
+#Order of the twelve piece bitboards
+PIECES = ["wp", "wN", "wB", "wR", "wQ", "wK", "bp", "bN", "bB", "bR", "bQ", "bK"]
+PIECE_INDEX = {piece: i for i, piece in enumerate(PIECES)}
+WHITE, BLACK = 0, 1
+
+FULL = 0xFFFFFFFFFFFFFFFF
+SQUARE_BB = [1 << sq for sq in range(64)]
+
+'''
+Lowest set bit index of a non empty bitboard
+'''
+def lsb(bb):
+    return (bb & -bb).bit_length() - 1
+
+'''
+Highest set bit index of a non empty bitboard
+'''
+def msb(bb):
+    return bb.bit_length() - 1
+
+'''
+Yield the index of every set bit, lowest first
+'''
+def squares(bb):
+    while bb:
+        low = bb & -bb
+        yield low.bit_length() - 1
+        bb ^= low
+
+def popCount(bb):
+    return bin(bb).count("1")
+
+def _onBoard(r, c):
+    return 0 <= r < 8 and 0 <= c < 8
+
+def _stepAttacks(offsets):
+    table = []
+    for sq in range(64):
+        r, c = sq >> 3, sq & 7
+        bb = 0
+        for dr, dc in offsets:
+            if _onBoard(r + dr, c + dc):
+                bb |= 1 << ((r + dr) * 8 + c + dc)
+        table.append(bb)
+    return table
+
+#Ray directions, the first four are orthogonal and the last four diagonal (same order as checkForPinsAndChecks)
+DIRECTIONS = ((-1, 0),(0, -1),(1, 0),(0, 1),(-1, -1),(-1, 1),(1, -1),(1, 1))
+
+def _ray(sq, d):
+    r, c = sq >> 3, sq & 7
+    bb = 0
+    r, c = r + d[0], c + d[1]
+    while _onBoard(r, c):
+        bb |= 1 << (r * 8 + c)
+        r, c = r + d[0], c + d[1]
+    return bb
+
+def _slide(sq, occ, dirs):
+    bb = 0
+    for d in dirs:
+        r, c = (sq >> 3) + d[0], (sq & 7) + d[1]
+        while _onBoard(r, c):
+            bb |= 1 << (r * 8 + c)
+            if occ >> (r * 8 + c) & 1:
+                break
+            r, c = r + d[0], c + d[1]
+    return bb
+
+'''
+Build the occupancy lookup for one line (rank, file or diagonal) through every square.
+The mask only keeps the inner squares of the line because the edge squares never block anything,
+and every subset of the mask is mapped straight to its attack set, so a slider lookup is one
+"and" plus one dict access instead of a walk along the ray.
+'''
+def _lineTable(dirs):
+    masks = []
+    tables = []
+    for sq in range(64):
+        mask = 0
+        for d in dirs:
+            ray = _ray(sq, d)
+            if ray:
+                #drop the last square of the ray (board edge)
+                edge = msb(ray) if (d[0] * 8 + d[1]) > 0 else lsb(ray)
+                mask |= ray & ~(1 << edge)
+        table = {}
+        sub = 0
+        while True: #carry-rippler enumeration of every subset of the mask
+            table[sub] = _slide(sq, sub, dirs)
+            sub = (sub - mask) & mask
+            if sub == 0:
+                break
+        masks.append(mask)
+        tables.append(table)
+    return masks, tables
+
+def _betweenTables(rays):
+    between = [[0] * 64 for _ in range(64)]
+    line = [[0] * 64 for _ in range(64)]
+    for a in range(64):
+        for i, d in enumerate(DIRECTIONS):
+            ray = rays[i][a]
+            for b in squares(ray):
+                #squares strictly between a and b, and the full line through both
+                between[a][b] = ray & ~rays[i][b] & ~(1 << b)
+                line[a][b] = ray | rays[_opposite(i)][a] | (1 << a)
+    return between, line
+
+def _opposite(i):
+    d = DIRECTIONS[i]
+    return DIRECTIONS.index((-d[0], -d[1]))
+
+def _buildTables():
+    tables = {"KNIGHT_ATTACKS": _stepAttacks(((-2,-1),(-2,1),(-1,-2),(-1,2),(2,-1),(2,1),(1,-2),(1,2))),
+              "KING_ATTACKS": _stepAttacks(((-1,-1),(-1,0),(-1,1),(0,-1),(0,1),(1,-1),(1,0),(1,1))),
+              "PAWN_ATTACKS": [_stepAttacks(((-1,-1),(-1,1))), _stepAttacks(((1,-1),(1,1)))],
+              "RAYS": [[_ray(sq, d) for sq in range(64)] for d in DIRECTIONS]}
+    for name, dirs in (("RANK", ((0, -1), (0, 1))), ("FILE", ((-1, 0), (1, 0))),
+                       ("DIAG", ((-1, -1), (1, 1))), ("ANTI", ((-1, 1), (1, -1)))):
+        tables[name + "_MASK"], tables[name + "_ATTACKS"] = _lineTable(dirs)
+    tables["BETWEEN"], tables["LINE"] = _betweenTables(tables["RAYS"])
+    return tables
+
+TABLES_VERSION = 1 #change it whenever a table changes so old cache files are rebuilt
+_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "__pycache__", "BitboardChess.tables")
+
+'''
+Load the tables from the cache file, or build them and try to write the cache
+'''
+def _loadTables():
+    try:
+        with open(_CACHE_PATH, "rb") as file:
+            tables = marshal.load(file)
+        if tables.get("version") == (TABLES_VERSION, marshal.version):
+            return tables
+    except (OSError, EOFError, ValueError, TypeError, AttributeError):
+        pass
+    tables = _buildTables()
+    tables["version"] = (TABLES_VERSION, marshal.version)
+    try:
+        os.makedirs(os.path.dirname(_CACHE_PATH), exist_ok = True)
+        with open(_CACHE_PATH + ".tmp", "wb") as file:
+            marshal.dump(tables, file)
+        os.replace(_CACHE_PATH + ".tmp", _CACHE_PATH) #never leave a half written cache for other processes
+    except OSError: #read only install, build the tables every time
+        pass
+    return tables
+
+_tables = _loadTables()
+KNIGHT_ATTACKS = _tables["KNIGHT_ATTACKS"]
+KING_ATTACKS = _tables["KING_ATTACKS"]
+#PAWN_ATTACKS[color][sq] : squares attacked by a pawn of that color standing on sq
+PAWN_ATTACKS = _tables["PAWN_ATTACKS"]
+#RAYS[i][sq] : every square from sq (exclusive) to the edge in DIRECTIONS[i]
+RAYS = _tables["RAYS"]
+RANK_MASK, RANK_ATTACKS = _tables["RANK_MASK"], _tables["RANK_ATTACKS"]
+FILE_MASK, FILE_ATTACKS = _tables["FILE_MASK"], _tables["FILE_ATTACKS"]
+DIAG_MASK, DIAG_ATTACKS = _tables["DIAG_MASK"], _tables["DIAG_ATTACKS"]
+ANTI_MASK, ANTI_ATTACKS = _tables["ANTI_MASK"], _tables["ANTI_ATTACKS"]
+#BETWEEN[a][b] : squares strictly between two squares on a line, LINE[a][b] : the whole line through them
+BETWEEN, LINE = _tables["BETWEEN"], _tables["LINE"]
+del _tables
+
+def rookAttacks(sq, occ):
+    return RANK_ATTACKS[sq][occ & RANK_MASK[sq]] | FILE_ATTACKS[sq][occ & FILE_MASK[sq]]
+
+def bishopAttacks(sq, occ):
+    return DIAG_ATTACKS[sq][occ & DIAG_MASK[sq]] | ANTI_ATTACKS[sq][occ & ANTI_MASK[sq]]
+
+def queenAttacks(sq, occ):
+    return rookAttacks(sq, occ) | bishopAttacks(sq, occ)
@@ -3,10 +3,46 @@ This class is responsable of storing all information about the current state of
 It will also will be responsable for determining the valid moves at the current state.
 It will also keep a move log.
 """
+from array import array
 
+from BitboardChess import (PIECE_INDEX, WHITE, BLACK, FULL, SQUARE_BB, KNIGHT_ATTACKS, KING_ATTACKS,
+                           PAWN_ATTACKS, BETWEEN, LINE, lsb, squares, rookAttacks, bishopAttacks)
+from ZobristChess import PIECE_KEYS, SIDE_KEY, CASTLE_KEYS, castleIndex, enPassantKey, computeHash
+from EvaluationChess import MG_TABLE, EG_TABLE, PHASE, computeEvaluation
+
+#(row, col) of every square, shared so setting a king or en passant square allocates nothing
+SQUARE_COORDS = [(sq // 8, sq % 8) for sq in range(64)]
+EN_PASSANT_SQUARES = [()] + SQUARE_COORDS #indexed by the en passant field of an undo entry, 0 is no square
+UNDO_PLIES = 1024 #undo entries preallocated by every GameState, the stack doubles if a game gets longer
+#Stages of the staged move generation: captures, en passant and promotions, the other moves, or both
+NOISY_MOVES = 1
+QUIET_MOVES = 2
+ALL_MOVES = 3
+
+'''
+Bit mask (bit row*8+col) of the squares a move changes: start, end, the pawn taken en passant,
+and the whole back rank for a castle so both rook squares are in
+'''
+def movedSquares(move):
+    changed = 1 << (move.startRow * 8 + move.startCol) | 1 << (move.endRow * 8 + move.endCol)
+    if move.isEnPassantMove:
+        changed |= 1 << (move.startRow * 8 + move.endCol)
+    elif move.isCastleMove:
+        changed |= 0xFF << (move.endRow * 8)
+    return changed
 
 class GameState():
-    def __init__(self):
+    rayDirections = ((-1, 0),(0, -1),(1, 0),(0, 1),(-1, -1),(-1, 1),(1, -1),(1, 1))
+    knightDirections = ((-2,-1),(-2,1),(-1,-2),(-1,2),(2,-1),(2,1),(1,-2),(1,2))
+
+    #backend "list" walks the 8x8 board of strings, backend "bitboard" builds a BitboardGameState
+    def __new__(cls, backend = "list", fen = None):
+        if cls is GameState and backend == "bitboard":
+            cls = BitboardGameState
+        return super().__new__(cls)
+
+    def __init__(self, backend = "list", fen = None):
+        self.backend = backend
         #board is 8x8 2D list, each element of list has 2 characters.
         #the first character represent the color of the piece "b", "w".
         #The second character represent the type of character.
@@ -34,32 +70,146 @@ class GameState():
         self.pins = []
         self.checks = []
         self.enPassantPossible = () #Coordinate for the square where en passant capture is possible
-        self.currentCastlingRights = CastleRights(True, True, True, True)
-        #Track Log For Changing
-        self.castleRightsLog = [CastleRights(self.currentCastlingRights.wks, self.currentCastlingRights.wqs
-                                            , self.currentCastlingRights.bks, self.currentCastlingRights.bks)]
+        self.attackMaps = {} #attack map of each side for the current position, cleared on every move
+        self.currentCastlingRights = CastleRights(True, True, True, True) #changed in place, never replaced
+        self.halfmoveClock = 0 #plies since the last capture or pawn move
+        self.startFullmoveNumber = 1 #fullmove number and side to move of the position the move log starts from
+        self.startWhiteToMove = True
+        #Zobrist key of the position, updated by makeMove and restored by undoMove
+        self.zobristKey = computeHash(self)
+        #Evaluation terms (see EvaluationChess), updated by makeMove and undoMove
+        self.mgScore, self.egScore, self.phase = computeEvaluation(self)
+        self.pieceCount = 32 #pieces on the board, kings included
+        #Undo stack, two words per ply: the Zobrist key and the packed irreversible state of the position before
+        #the move (see packUndoState). Entry i belongs to moveLog[i]
+        self.undoStack = array("Q", bytes(UNDO_PLIES * 16))
+        #Moves of every piece but the kings ignoring pins and checks, by square: (moves, dependencies) where
+        #dependencies is the mask of squares the moves were read from. dirtySquares collects the squares changed
+        #since the last generation, getValidMoves drops the entries that read one of them (see getCachedMoves)
+        self.incremental = True
+        self.moveCache = {}
+        self.dirtySquares = 0
+        if fen is not None:
+            self.loadFen(fen)
+
+    '''
+    Set up the position described by a FEN string, missing trailing fields get their usual defaults
+    '''
+    def loadFen(self, fen):
+        fields = fen.split()
+        self.board = []
+        for rank in fields[0].split("/"):
+            row = []
+            for char in rank:
+                if char.isdigit():
+                    row.extend(["--"] * int(char))
+                else:
+                    row.append(("w" if char.isupper() else "b") + (char.upper() if char.lower() != "p" else "p"))
+            self.board.append(row)
+        for r in range(8):
+            for c in range(8):
+                if self.board[r][c] == "wK":
+                    self.whiteKingLocation = (r, c)
+                elif self.board[r][c] == "bK":
+                    self.blackKingLocation = (r, c)
+        self.whiteToMove = len(fields) < 2 or fields[1] == "w"
+        castling = fields[2] if len(fields) > 2 else "-"
+        #a right is only kept while its king and rook are on their home squares
+        board = self.board
+        whiteKing = board[7][4] == "wK"
+        blackKing = board[0][4] == "bK"
+        self.currentCastlingRights = CastleRights("K" in castling and whiteKing and board[7][7] == "wR",
+                                                  "Q" in castling and whiteKing and board[7][0] == "wR",
+                                                  "k" in castling and blackKing and board[0][7] == "bR",
+                                                  "q" in castling and blackKing and board[0][0] == "bR")
+        enPassant = fields[3] if len(fields) > 3 else "-"
+        self.enPassantPossible = () if enPassant == "-" else (Move.ranktoRows[enPassant[1]], Move.filetoCols[enPassant[0]])
+        self.halfmoveClock = int(fields[4]) if len(fields) > 4 else 0
+        self.startFullmoveNumber = int(fields[5]) if len(fields) > 5 else 1
+        self.startWhiteToMove = self.whiteToMove
+        self.moveLog = []
+        self.attackMaps = {}
+        self.moveCache = {}
+        self.dirtySquares = 0
+        self.checkMate = False
+        self.staleMate = False
+        self.zobristKey = computeHash(self)
+        self.mgScore, self.egScore, self.phase = computeEvaluation(self)
+        self.pieceCount = sum(piece != "--" for row in self.board for piece in row)
+
+    '''
+    FEN string of the current position
+    '''
+    def getFen(self):
+        ranks = []
+        for row in self.board:
+            rank = ""
+            empty = 0
+            for piece in row:
+                if piece == "--":
+                    empty += 1
+                    continue
+                if empty:
+                    rank += str(empty)
+                    empty = 0
+                rank += piece[1].upper() if piece[0] == "w" else piece[1].lower()
+            ranks.append(rank + (str(empty) if empty else ""))
+        rights = self.currentCastlingRights
+        castling = ("K" if rights.wks else "") + ("Q" if rights.wqs else "") + ("k" if rights.bks else "") + ("q" if rights.bqs else "")
+        enPassant = Move.coltoFiles[self.enPassantPossible[1]] + Move.rowtoRanks[self.enPassantPossible[0]] \
+            if self.enPassantPossible else "-"
+        fullmoveNumber = self.startFullmoveNumber + (len(self.moveLog) + (0 if self.startWhiteToMove else 1)) // 2
+        return "%s %s %s %s %d %d" % ("/".join(ranks), "w" if self.whiteToMove else "b", castling or "-", enPassant,
+                                      self.halfmoveClock, fullmoveNumber)
 
 
     def makeMove(self,move):
+        castle = castleIndex(self.currentCastlingRights)
+        i = 2 * len(self.moveLog)
+        if i == len(self.undoStack):
+            self.undoStack.frombytes(bytes(i * 8)) #double the stack, only very long games get here
+        self.undoStack[i] = self.zobristKey
+        self.undoStack[i + 1] = self.packUndoState(castle, move.pieceCaptured)
+        #take out side, castling and en passant of the old position, they are put back at the end
+        key = self.zobristKey ^ SIDE_KEY ^ CASTLE_KEYS[castle] \
+            ^ enPassantKey(self.board, self.enPassantPossible, self.whiteToMove)
+        key ^= PIECE_KEYS[move.pieceMoved][move.startRow * 8 + move.startCol]
+        if move.isEnPassantMove:
+            key ^= PIECE_KEYS[move.pieceCaptured][move.startRow * 8 + move.endCol]
+        elif move.pieceCaptured != "--":
+            key ^= PIECE_KEYS[move.pieceCaptured][move.endRow * 8 + move.endCol]
+
         self.board[move.endRow][move.endCol] = move.pieceMoved
         self.board[move.startRow][move.startCol] = "--"
+        self.dirtySquares |= movedSquares(move)
         self.moveLog.append(move) #Log and save the move 
         self.whiteToMove = not self.whiteToMove #swap Players
+        self.attackMaps = {}
         #update location of king
-        if move.pieceMoved == "wk":
-            self.whiteKingLocation = (move.endRow,move.endCol)
-        elif move.pieceMoved == "bk":
-            self.blackKingLocation = (move.endRow,move.endCol)
+        if move.pieceMoved == "wK":
+            self.whiteKingLocation = SQUARE_COORDS[move.endRow * 8 + move.endCol]
+        elif move.pieceMoved == "bK":
+            self.blackKingLocation = SQUARE_COORDS[move.endRow * 8 + move.endCol]
 
         #Enpassant move
         if move.isEnPassantMove:
             self.board[move.startRow][move.endCol] = "--" #Capturing the pawn
 
+        #Pawn promotion, the piece is chosen on the move before it is made
+        if move.isPromotionPawn:
+            self.board[move.endRow][move.endCol] = move.pieceMoved[0] + move.promotionChoice
+
         #If Pawn moves twice,next move can capture enpassant
         if move.pieceMoved[1] == "p" and abs(move.startRow - move.endRow) == 2: #Only on 2 squares pawn advances
-            self.enPassantPossible = ((move.startRow + move.endRow)//2, move.endCol)
+            self.enPassantPossible = SQUARE_COORDS[(move.startRow + move.endRow)//2 * 8 + move.endCol]
         else: self.enPassantPossible = ()
 
+        #Fifty move rule counter
+        if move.pieceMoved[1] == "p" or move.pieceCaptured != "--":
+            self.halfmoveClock = 0
+        else:
+            self.halfmoveClock += 1
+
         #Castle Move
         if move.isCastleMove:
             if move.endCol - move.startCol == 2: #Kingside Castle Move
@@ -68,39 +218,43 @@ class GameState():
             else:#Queenside Castle Move
                 self.board[move.endRow][move.endCol + 1]= self.board[move.endRow][move.endCol - 2] #Moves the rook
                 self.board[move.endRow][move.endCol - 2] = '--'
+            rookKeys = PIECE_KEYS[move.pieceMoved[0] + "R"]
+            if move.endCol - move.startCol == 2:
+                key ^= rookKeys[move.endRow * 8 + move.endCol + 1] ^ rookKeys[move.endRow * 8 + move.endCol - 1]
+            else:
+                key ^= rookKeys[move.endRow * 8 + move.endCol - 2] ^ rookKeys[move.endRow * 8 + move.endCol + 1]
         
         #Updating castling rights - Whenever it's a rook or king move
         self.updateCastlingRights(move) 
-        self.castleRightsLog.append(CastleRights(self.currentCastlingRights.wks, self.currentCastlingRights.wqs
-                                            , self.currentCastlingRights.bks, self.currentCastlingRights.bks))
+
+        placed = self.board[move.endRow][move.endCol] #the piece that landed (promoted piece too)
+        key ^= PIECE_KEYS[placed][move.endRow * 8 + move.endCol]
+        self.updateEvaluation(move, placed, 1)
+        self.zobristKey = key ^ CASTLE_KEYS[castleIndex(self.currentCastlingRights)] \
+            ^ enPassantKey(self.board, self.enPassantPossible, self.whiteToMove)
         
 
     """
-    Undo the last move
+    Undo the last move, everything that can't be recomputed from the move comes back from the undo stack
     """
     def undoMove(self):
         if len(self.moveLog) != 0: #Make sure there is move to undo
             move = self.moveLog.pop()
+            self.updateEvaluation(move, self.board[move.endRow][move.endCol], -1)
+            i = 2 * len(self.moveLog)
+            self.zobristKey = self.undoStack[i]
+            state = self.undoStack[i + 1]
             self.board[move.startRow][move.startCol] = move.pieceMoved
-            self.board[move.endRow][move.endCol] = move.pieceCaptured
+            self.dirtySquares |= movedSquares(move)
             self.whiteToMove = not self.whiteToMove #swap Players
-            #update location of king
-            if move.pieceMoved == "wk":
-                self.whiteKingLocation = (move.startRow,move.startCol)
-            elif move.pieceMoved == "bk":
-                self.blackKingLocation = (move.startRow,move.startCol)
+            self.attackMaps = {}
             #Undo EnPassant Move
             if move.isEnPassantMove:
                 self.board[move.endRow][move.endCol] = "--" #remove the pawn that was added in the wrong square
-                self.board[move.startRow][move.endCol] = move.pieceCaptured #put the pawn back on the correct square it was captured from
-                self.enPassantPossible = (move.endRow, move.endCol) #allow an enpassant to happen on the next move
-            #Undo a 2 square pawn advance
-            if move.pieceMoved[1] == "p" and abs(move.startRow - move.endRow) == 2: #Only on 2 squares pawn advances
-                self.enPassantPossible = ()
-            
-            #Undo Castling Move
-            self.castleRightsLog.pop() #get rid of the new castle rights from the move we are undoing
-            self.currentCastlingRights = self.castleRightsLog[-1] #set the currentCastleRights to the last one in the list
+                self.board[move.startRow][move.endCol] = CODE_PIECES[state >> 11 & 15] #put the pawn back on the correct square it was captured from
+            else:
+                self.board[move.endRow][move.endCol] = CODE_PIECES[state >> 11 & 15]
+            self.unpackUndoState(state)
 
             #Undo Castle Move
             if move.isCastleMove:
@@ -111,6 +265,83 @@ class GameState():
                     self.board[move.endRow][move.endCol - 2]= self.board[move.endRow][move.endCol + 1] #Moves the rook
                     self.board[move.endRow][move.endCol + 1] = '--'
 
+    '''
+    Add (sign 1) or take back (sign -1) the change a move makes to the evaluation terms and the piece count.
+    placed is the piece that stands on the end square after the move (the promoted piece on promotions)
+    '''
+    def updateEvaluation(self, move, placed, sign):
+        start = move.startRow * 8 + move.startCol
+        end = move.endRow * 8 + move.endCol
+        moved = move.pieceMoved
+        mg = MG_TABLE[placed][end] - MG_TABLE[moved][start]
+        eg = EG_TABLE[placed][end] - EG_TABLE[moved][start]
+        phase = PHASE[placed] - PHASE[moved]
+        captured = move.pieceCaptured
+        if captured != "--":
+            sq = move.startRow * 8 + move.endCol if move.isEnPassantMove else end
+            mg -= MG_TABLE[captured][sq]
+            eg -= EG_TABLE[captured][sq]
+            phase -= PHASE[captured]
+            self.pieceCount -= sign
+        elif move.isCastleMove:
+            rook = moved[0] + "R"
+            rookStart, rookEnd = (end + 1, end - 1) if move.endCol - move.startCol == 2 else (end - 2, end + 1)
+            mg += MG_TABLE[rook][rookEnd] - MG_TABLE[rook][rookStart]
+            eg += EG_TABLE[rook][rookEnd] - EG_TABLE[rook][rookStart]
+        self.mgScore += sign * mg
+        self.egScore += sign * eg
+        self.phase += sign * phase
+
+    '''
+    Irreversible state of the current position in one int (low to high bits): castling rights 4,
+    en passant square + 1 (0 for none) 7, captured piece code 4, white king square 6, black king square 6,
+    halfmove clock 16
+    '''
+    def packUndoState(self, castle, captured):
+        enPassant = self.enPassantPossible
+        whiteKing = self.whiteKingLocation
+        blackKing = self.blackKingLocation
+        return (castle | ((enPassant[0] * 8 + enPassant[1] + 1) if enPassant else 0) << 4 | PIECE_CODES[captured] << 11
+                | (whiteKing[0] * 8 + whiteKing[1]) << 15 | (blackKing[0] * 8 + blackKing[1]) << 21
+                | min(self.halfmoveClock, 0xFFFF) << 27)
+
+    def unpackUndoState(self, state):
+        rights = self.currentCastlingRights
+        rights.wks = state & 1 != 0
+        rights.wqs = state & 2 != 0
+        rights.bks = state & 4 != 0
+        rights.bqs = state & 8 != 0
+        self.enPassantPossible = EN_PASSANT_SQUARES[state >> 4 & 127]
+        self.whiteKingLocation = SQUARE_COORDS[state >> 15 & 63]
+        self.blackKingLocation = SQUARE_COORDS[state >> 21 & 63]
+        self.halfmoveClock = state >> 27
+
+    '''
+    True when the current position already occurred with the same side to move. Only the positions since the
+    last capture or pawn move can repeat, so the scan stops at the halfmove clock
+    '''
+    def isRepetition(self):
+        key = self.zobristKey
+        stack = self.undoStack
+        plies = len(self.moveLog)
+        for ply in range(plies - 4, max(plies - self.halfmoveClock, 0) - 1, -2):
+            if stack[2 * ply] == key:
+                return True
+        return False
+
+    '''
+    How many times the current position occurred before (2 means the current one is the third: threefold repetition)
+    '''
+    def repetitions(self):
+        key = self.zobristKey
+        stack = self.undoStack
+        plies = len(self.moveLog)
+        count = 0
+        for ply in range(plies - 4, max(plies - self.halfmoveClock, 0) - 1, -2):
+            if stack[2 * ply] == key:
+                count += 1
+        return count
+
     def updateCastlingRights(self,move):
         if move.pieceMoved == "wK":
             self.currentCastlingRights.wks = False
@@ -130,6 +361,17 @@ class GameState():
                     self.currentCastlingRights.bqs = False
                 elif move.startCol == 7: #Right Rook
                     self.currentCastlingRights.bks = False
+        #a rook captured on its original square
+        if move.pieceCaptured == "wR" and move.endRow == 7:
+            if move.endCol == 0:
+                self.currentCastlingRights.wqs = False
+            elif move.endCol == 7:
+                self.currentCastlingRights.wks = False
+        elif move.pieceCaptured == "bR" and move.endRow == 0:
+            if move.endCol == 0:
+                self.currentCastlingRights.bqs = False
+            elif move.endCol == 7:
+                self.currentCastlingRights.bks = False
             
 
     
@@ -137,20 +379,16 @@ class GameState():
         
         self.inCheck, self.pins, self.checks = self.checkForPinsAndChecks()
 
-        moves = []
-
         if self.whiteToMove:
             kingRow = self.whiteKingLocation[0]
             kingCol = self.whiteKingLocation[1]
-            self.getCastleMoves(kingRow, kingCol, moves)
         else:
             kingRow = self.blackKingLocation[0]
             kingCol = self.blackKingLocation[1]
-            self.getCastleMoves(kingRow, kingCol, moves)
 
         if self.inCheck:
             if len(self.checks) == 1: #Only 1 check, block check or move king
-                moves = self.getAllPossibleMoves()
+                moves = self.getCachedMoves() if self.incremental else self.getAllPossibleMoves()
 
                 #To block a check move u must move a piece into one of the squares between enemy piece and king
                 check = self.checks[0]
@@ -160,7 +398,7 @@ class GameState():
                 validSquares = [] #Squares that piece can move to
                 # if knight, must capture knight or move king , other piece can be blocked
                 if pieceChecking[1] == "N":
-                    validSquares[(checkRow,checkCol)]
+                    validSquares = [(checkRow,checkCol)]
                 else:
                     for i in range(1,8):
                         validSq = (kingRow + check[2] * i, kingCol + check[3] * i) # check[2/3] are the check directions
@@ -171,11 +409,14 @@ class GameState():
                 for i in range(len(moves) -1, -1, -1):
                     if moves[i].pieceMoved[1] != "K": #move doesn't move king so it must capture or block
                         if not (moves[i].endRow,moves[i].endCol) in validSquares: #move doesn't block check or capture piece
-                            moves.remove(moves[i])
+                            if not (moves[i].isEnPassantMove and (moves[i].startRow,moves[i].endCol) == (checkRow,checkCol)): #en passant can capture the checking pawn
+                                del moves[i]
             else: #double check, king has to move
+                moves = []
                 self.getKingMoves(kingRow, kingCol, moves)
         else: #not in check so all moves are fine
-            moves = self.getAllPossibleMoves()
+            moves = self.getCachedMoves() if self.incremental else self.getAllPossibleMoves()
+            self.getCastleMoves(kingRow, kingCol, moves)
 
         if len(moves) == 0:
             if self.inCheck: self.checkMate = True 
@@ -188,17 +429,268 @@ class GameState():
         
         return moves
 
+    '''
+    Start a staged generation of the moves of the current position, sets inCheck. Returns the context
+    generateStage needs: the pins, the squares a non king move must reach to answer a check (None when not in check,
+    empty in double check) and the valid moves, only made once a stage needs the quiet moves
+    '''
+    def prepareStages(self):
+        self.inCheck, pins, checks = self.checkForPinsAndChecks()
+        checkSquares = None
+        if len(checks) == 1:
+            kingRow, kingCol = self.whiteKingLocation if self.whiteToMove else self.blackKingLocation
+            checkRow, checkCol, dr, dc = checks[0]
+            checkSquares = {(checkRow, checkCol)}
+            if self.board[checkRow][checkCol][1] != "N":
+                for i in range(1, 8):
+                    checkSquares.add((kingRow + dr * i, kingCol + dc * i))
+                    if (kingRow + dr * i, kingCol + dc * i) == (checkRow, checkCol):
+                        break
+        elif checks:
+            checkSquares = set()
+        return [pins, checkSquares, None]
+
+    '''
+    Legal moves of one stage (NOISY_MOVES, QUIET_MOVES or ALL_MOVES) of the position prepareStages was called on,
+    only those of the piece on fromSq (row*8 + col) when given
+    '''
+    def generateStage(self, context, stage, fromSq = None):
+        if context[2] is None:
+            if stage == NOISY_MOVES:
+                return self.getNoisyStageMoves(context, fromSq)
+            if fromSq is not None:
+                moves = self.getPieceValidMoves(context, fromSq)
+            else:
+                moves = context[2] = self.getValidMoves()
+        else:
+            moves = context[2]
+            if fromSq is not None:
+                moves = [move for move in moves if move.startRow * 8 + move.startCol == fromSq]
+        if stage == ALL_MOVES:
+            return list(moves)
+        noisy = stage == NOISY_MOVES
+        return [move for move in moves if (move.pieceCaptured != "--" or move.isPromotionPawn) == noisy]
+
+    '''
+    Valid moves of the piece on sq, made with its own move function (the hash move and killers only need one piece)
+    '''
+    def getPieceValidMoves(self, context, sq):
+        pins, checkSquares = context[0], context[1]
+        r, c = divmod(sq, 8)
+        piece = self.board[r][c]
+        moves = []
+        if piece[0] != ("w" if self.whiteToMove else "b"):
+            return moves
+        if piece[1] == "K":
+            self.getKingMoves(r, c, moves)
+            if checkSquares is None:
+                self.getCastleMoves(r, c, moves)
+            return moves
+        if checkSquares is not None and not checkSquares:
+            return moves #double check, king has to move
+        self.pins = list(pins) #the move functions take their pin out of the list
+        self.moveFunctions[piece[1]](r, c, moves)
+        if checkSquares is not None:
+            moves = [move for move in moves if (move.endRow, move.endCol) in checkSquares or move.isEnPassantMove]
+        return moves
+
+    '''
+    Captures, en passant captures and promotions of the position prepareStages was called on, made without the
+    quiet moves: each piece only looks at the squares it can capture on (and the promotion square of a pawn)
+    '''
+    def getNoisyStageMoves(self, context, fromSq = None):
+        pins = {(pin[0], pin[1]): (pin[2], pin[3]) for pin in context[0]}
+        checkSquares = context[1]
+        board = self.board
+        color, enemyColor = ("w", "b") if self.whiteToMove else ("b", "w")
+        forward = -1 if self.whiteToMove else 1
+        attacks = None
+        moves = []
+        for sq in (range(64) if fromSq is None else (fromSq,)):
+            r, c = divmod(sq, 8)
+            piece = board[r][c]
+            if piece[0] != color:
+                continue
+            typed = piece[1]
+            if typed == "K":
+                if attacks is None:
+                    attacks = self.getAttackMap(not self.whiteToMove)
+                for d in self.rayDirections:
+                    endRow = r + d[0]
+                    endCol = c + d[1]
+                    if 0 <= endRow < 8 and 0 <= endCol < 8 and board[endRow][endCol][0] == enemyColor \
+                            and not attacks >> (endRow * 8 + endCol) & 1:
+                        moves.append(newMove(sq, endRow * 8 + endCol, piece, board[endRow][endCol]))
+                continue
+            if checkSquares is not None and not checkSquares:
+                continue #double check, king has to move
+            pin = pins.get((r, c))
+            if typed == "p":
+                endRow = r + forward
+                if (endRow == 0 or endRow == 7) and board[endRow][c] == "--" and (pin is None or pin[1] == 0) \
+                        and (checkSquares is None or (endRow, c) in checkSquares):
+                    self.addPawnMove(moves, sq, endRow * 8 + c, piece, "--")
+                for dc in (-1, 1):
+                    endCol = c + dc
+                    if not 0 <= endCol < 8 or (pin is not None and pin != (forward, dc) and pin != (-forward, -dc)):
+                        continue
+                    endPiece = board[endRow][endCol]
+                    if endPiece[0] == enemyColor:
+                        if checkSquares is None or (endRow, endCol) in checkSquares:
+                            self.addPawnMove(moves, sq, endRow * 8 + endCol, piece, endPiece)
+                    elif (endRow, endCol) == self.enPassantPossible and self.enPassantIsSafe(r, c, endCol):
+                        moves.append(newMove(sq, endRow * 8 + endCol, piece, "--", enPassant = True))
+            elif typed == "N":
+                if pin is not None:
+                    continue
+                for d in self.knightDirections:
+                    endRow = r + d[0]
+                    endCol = c + d[1]
+                    if 0 <= endRow < 8 and 0 <= endCol < 8 and board[endRow][endCol][0] == enemyColor \
+                            and (checkSquares is None or (endRow, endCol) in checkSquares):
+                        moves.append(newMove(sq, endRow * 8 + endCol, piece, board[endRow][endCol]))
+            else:
+                directions = self.rayDirections[4:] if typed == "B" else self.rayDirections[:4] if typed == "R" else self.rayDirections
+                for d in directions:
+                    if pin is not None and pin != d and pin != (-d[0], -d[1]):
+                        continue
+                    endRow = r + d[0]
+                    endCol = c + d[1]
+                    while 0 <= endRow < 8 and 0 <= endCol < 8 and board[endRow][endCol] == "--":
+                        endRow += d[0]
+                        endCol += d[1]
+                    if 0 <= endRow < 8 and 0 <= endCol < 8 and board[endRow][endCol][0] == enemyColor \
+                            and (checkSquares is None or (endRow, endCol) in checkSquares):
+                        moves.append(newMove(sq, endRow * 8 + endCol, piece, board[endRow][endCol]))
+        return moves
+
+    '''
+    Captures, en passant captures and promotions only, for the quiescence search
+    '''
+    def getNoisyMoves(self):
+        return self.generateStage(self.prepareStages(), NOISY_MOVES)
+
+    '''
+    Generator of the legal moves in search order, every stage is generated when the consumer gets to it:
+    the hash move (a moveID, checked for legality), the noisy moves sorted by noisyKey (best first),
+    the killer moves (moveIDs of quiet moves), then the other quiet moves sorted by quietKey.
+    The position may be changed between two moves as long as it is back when the next one is asked for.
+    inCheck is set before the first move, so it is still right when no move comes out
+    '''
+    def getStagedMoves(self, hashMoveId = 0, killers = (), noisyKey = None, quietKey = None):
+        context = self.prepareStages()
+        hashMove = None
+        if hashMoveId:
+            hashMove = next((move for move in self.generateStage(context, ALL_MOVES, hashMoveId & 63)
+                             if move.moveID == hashMoveId), None)
+            if hashMove is not None:
+                yield hashMove
+        noisy = self.generateStage(context, NOISY_MOVES)
+        if noisyKey is not None:
+            noisy.sort(key = noisyKey, reverse = True)
+        for move in noisy:
+            if hashMove is None or move.moveID != hashMoveId:
+                yield move
+        played = [hashMoveId]
+        for killerId in killers:
+            if killerId is not None and killerId not in played:
+                killer = next((move for move in self.generateStage(context, QUIET_MOVES, killerId & 63)
+                               if move.moveID == killerId), None)
+                if killer is not None:
+                    played.append(killerId)
+                    yield killer
+        quiet = self.generateStage(context, QUIET_MOVES)
+        if quietKey is not None:
+            quiet.sort(key = quietKey, reverse = True)
+        for move in quiet:
+            if move.moveID not in played:
+                yield move
+
     '''
     Determine if enemy can attack the square r,c
     '''
     def squareUnderAttack(self,r,c):
-        self.whiteToMove = not self.whiteToMove #switch the opponenet turn
-        oppMoves = self.getAllPossibleMoves()
-        self.whiteToMove = not self.whiteToMove #switch the turn back 
-        for move in oppMoves:
-            if move.endRow == r and move.endCol == c: #square is under attack
+        return self.squareAttacked(r, c, not self.whiteToMove)
+
+    '''
+    Determine if the side byWhite attacks the square r,c by looking outward from the square:
+    rays for sliders, knight hops, pawn and king offsets. ignore is a square treated as empty (a king moving away)
+    '''
+    def squareAttacked(self, r, c, byWhite, ignore = ()):
+        enemyColor = "w" if byWhite else "b"
+        board = self.board
+        for i in range(8):
+            d = self.rayDirections[i]
+            endRow = r + d[0]
+            endCol = c + d[1]
+            j = 1
+            while 0 <= endRow < 8 and 0 <= endCol < 8:
+                endPiece = board[endRow][endCol]
+                if endPiece != "--" and (endRow, endCol) != ignore:
+                    if endPiece[0] == enemyColor:
+                        typed = endPiece[1]
+                        if typed == "Q" or (typed == "R" and i <= 3) or (typed == "B" and i >= 4):
+                            return True
+                        if j == 1:
+                            if typed == "K":
+                                return True
+                            #a white pawn attacks upward so it sits below the square (row + 1)
+                            if typed == "p" and i >= 4 and d[0] == (1 if byWhite else -1):
+                                return True
+                    break
+                endRow += d[0]
+                endCol += d[1]
+                j += 1
+        for d in self.knightDirections:
+            endRow = r + d[0]
+            endCol = c + d[1]
+            if 0 <= endRow < 8 and 0 <= endCol < 8 and board[endRow][endCol] == enemyColor + "N":
                 return True
-        return False 
+        return False
+
+    '''
+    Squares attacked by the side byWhite as a 64 bit int (bit row*8+col), computed once per position.
+    The opposing king is taken off the board so a king can't step back along the ray that checks it.
+    Castling and king move legality share this map.
+    '''
+    def getAttackMap(self, byWhite):
+        attacks = self.attackMaps.get(byWhite)
+        if attacks is not None:
+            return attacks
+        color = "w" if byWhite else "b"
+        ignore = self.blackKingLocation if byWhite else self.whiteKingLocation
+        board = self.board
+        attacks = 0
+        for r in range(8):
+            for c in range(8):
+                piece = board[r][c]
+                if piece[0] != color:
+                    continue
+                typed = piece[1]
+                if typed == "p":
+                    endRow = r - 1 if byWhite else r + 1
+                    if 0 <= endRow < 8:
+                        if c > 0: attacks |= 1 << (endRow * 8 + c - 1)
+                        if c < 7: attacks |= 1 << (endRow * 8 + c + 1)
+                elif typed == "N" or typed == "K":
+                    for d in (self.knightDirections if typed == "N" else self.rayDirections):
+                        endRow = r + d[0]
+                        endCol = c + d[1]
+                        if 0 <= endRow < 8 and 0 <= endCol < 8:
+                            attacks |= 1 << (endRow * 8 + endCol)
+                else:
+                    directions = self.rayDirections[4:] if typed == "B" else self.rayDirections[:4] if typed == "R" else self.rayDirections
+                    for d in directions:
+                        endRow = r + d[0]
+                        endCol = c + d[1]
+                        while 0 <= endRow < 8 and 0 <= endCol < 8:
+                            attacks |= 1 << (endRow * 8 + endCol)
+                            if board[endRow][endCol] != "--" and (endRow, endCol) != ignore:
+                                break
+                            endRow += d[0]
+                            endCol += d[1]
+        self.attackMaps[byWhite] = attacks
+        return attacks
 
 
     '''
@@ -214,6 +706,70 @@ class GameState():
                     self.moveFunctions[piece](r,c,moves) #call the appropriate move function based on piece type
         return moves
 
+    '''
+    Same moves as getAllPossibleMoves, in the same order, but the moves of a piece are reused from the last
+    generation unless a square they were read from changed since. Kings, pinned pieces and pawns next to the
+    en passant square depend on more than their own squares and are always generated
+    '''
+    def getCachedMoves(self):
+        cache = self.moveCache
+        if self.dirtySquares:
+            dirty = self.dirtySquares
+            for sq in [sq for sq, entry in cache.items() if entry[1] & dirty]:
+                del cache[sq]
+            self.dirtySquares = 0
+        color = "w" if self.whiteToMove else "b"
+        pinned = {(pin[0], pin[1]) for pin in self.pins}
+        enPassantRow = self.enPassantPossible[0] + (1 if self.whiteToMove else -1) if self.enPassantPossible else -1
+        moves = []
+        for r in range(8):
+            row = self.board[r]
+            for c in range(8):
+                piece = row[c]
+                if piece[0] != color:
+                    continue
+                if piece[1] == "K" or (r, c) in pinned or \
+                        (r == enPassantRow and piece[1] == "p" and abs(c - self.enPassantPossible[1]) == 1):
+                    self.moveFunctions[piece[1]](r, c, moves)
+                    continue
+                entry = cache.get(r * 8 + c)
+                if entry is None:
+                    pieceMoves = []
+                    self.moveFunctions[piece[1]](r, c, pieceMoves)
+                    entry = cache[r * 8 + c] = (pieceMoves, self.moveDependencies(r, c, piece))
+                moves.extend(entry[0])
+        return moves
+
+    '''
+    Mask of the squares the moves of the piece at r,c are read from: its own square, the squares a pawn
+    pushes to or captures on, the knight squares, and the rays of a slider up to the first piece
+    '''
+    def moveDependencies(self, r, c, piece):
+        sq = r * 8 + c
+        typed = piece[1]
+        if typed == "N":
+            return KNIGHT_ATTACKS[sq] | 1 << sq
+        if typed == "p":
+            forward = -8 if piece[0] == "w" else 8
+            mask = 1 << sq | 1 << (sq + forward)
+            if r == (6 if piece[0] == "w" else 1):
+                mask |= 1 << (sq + 2 * forward)
+            if c > 0: mask |= 1 << (sq + forward - 1)
+            if c < 7: mask |= 1 << (sq + forward + 1)
+            return mask
+        mask = 1 << sq
+        directions = self.rayDirections[4:] if typed == "B" else self.rayDirections[:4] if typed == "R" else self.rayDirections
+        for d in directions:
+            endRow = r + d[0]
+            endCol = c + d[1]
+            while 0 <= endRow < 8 and 0 <= endCol < 8:
+                mask |= 1 << (endRow * 8 + endCol)
+                if self.board[endRow][endCol] != "--":
+                    break
+                endRow += d[0]
+                endCol += d[1]
+        return mask
+
 
 
     '''
@@ -230,60 +786,73 @@ class GameState():
                 break
 
         if self.whiteToMove: #white pawn move
-            if self.board[r-1][c] == "--": #1 square jump and check the jump is clear and empty
-                if not piecePinned or pinDirection == (-1,0):
-                    moves.append(Move((r,c), (r-1,c), self.board))
-                    if(r==6):
-                        if self.board[r-2][c] == "--" : #2 square jump and check the jump is clear and first row
-                            moves.append(Move((r,c), (r-2,c), self.board))
-
-            if c-1>=0: #Capture to the left
-                if self.board[r-1][c-1][0] == "b": #any enemy piece
-                    if not piecePinned or pinDirection == (-1,-1):
-                        moves.append(Move((r,c), (r-1,c-1), self.board))
-                elif (r-1,c-1) == self.enPassantPossible :
-                    moves.append(Move((r,c), (r-1,c-1), self.board, True))
-
-            if c+1<=7: #Capture to the right
-                if self.board[r-1][c+1][0] == "b": #any enemy piece
-                    if not piecePinned or pinDirection == (-1,1):
-                        moves.append(Move((r,c), (r-1,c+1), self.board))
-                elif (r-1,c+1) == self.enPassantPossible :
-                    moves.append(Move((r,c), (r-1,c+1), self.board, True))
-
+            moveAmount = -1
+            startRow = 6
+            enemyColor = "b"
+            pawn = "wp"
         else: #Black moves
-            if self.board[r+1][c] == "--": #1 square jump and check the jump is clear and empty
-                if not piecePinned or pinDirection == (1,0):
-                    moves.append(Move((r,c), (r+1,c), self.board))
-                    if(r==1):
-                        if self.board[r+2][c] == "--" : #2 square jump and check the jump is clear and first row
-                            moves.append(Move((r,c), (r+2,c), self.board))
-
-            if c-1>=0: #Capture to the left
-                if self.board[r+1][c-1][0] == "w": #any enemy piece
-                    if not piecePinned or pinDirection == (1,-1):
-                        moves.append(Move((r,c), (r+1,c-1), self.board))
-                elif (r+1,c-1) == self.enPassantPossible :
-                    moves.append(Move((r,c), (r+1,c-1), self.board, True))
-
-            if c+1<=7: #Capture to the right
-                if self.board[r+1][c+1][0] == "w": #any enemy piece
-                    if not piecePinned or pinDirection == (1,1):
-                        moves.append(Move((r,c), (r+1,c+1), self.board))
-                elif (r+1,c+1) == self.enPassantPossible :
-                    moves.append(Move((r,c), (r+1,c+1), self.board, True))
+            moveAmount = 1
+            startRow = 1
+            enemyColor = "w"
+            pawn = "bp"
+
+        start = r*8 + c
+        if self.board[r+moveAmount][c] == "--": #1 square jump and check the jump is clear and empty
+            if not piecePinned or pinDirection == (moveAmount,0) or pinDirection == (-moveAmount,0): #a file pin still lets the pawn push
+                self.addPawnMove(moves, start, start + moveAmount*8, pawn, "--")
+                if r == startRow and self.board[r+2*moveAmount][c] == "--" : #2 square jump and check the jump is clear and first row
+                    moves.append(newMove(start, start + moveAmount*16, pawn, "--"))
+
+        for dc in (-1, 1): #Capture to the left then to the right
+            if 0 <= c+dc <= 7:
+                endPiece = self.board[r+moveAmount][c+dc]
+                if endPiece[0] == enemyColor: #any enemy piece
+                    if not piecePinned or pinDirection == (moveAmount,dc):
+                        self.addPawnMove(moves, start, start + moveAmount*8 + dc, pawn, endPiece)
+                elif (r+moveAmount,c+dc) == self.enPassantPossible and self.enPassantIsSafe(r, c, c+dc):
+                    moves.append(newMove(start, start + moveAmount*8 + dc, pawn, "--", enPassant = True))
+
+    '''
+    Add a pawn move (squares are row*8 + col), a move to the last row is added once for every promotion piece
+    '''
+    def addPawnMove(self, moves, start, end, pawn, captured):
+        if end < 8 or end >= 56:
+            for piece in Move.promotionPieces:
+                moves.append(newMove(start, end, pawn, captured, promotionChoice = piece))
+        else:
+            moves.append(newMove(start, end, pawn, captured))
+
+    '''
+    An en passant capture removes two pawns from the same row at once, so pins are tested by playing it
+    on the board and looking for an attack on the king
+    '''
+    def enPassantIsSafe(self, r, c, endCol):
+        kingRow, kingCol = self.whiteKingLocation if self.whiteToMove else self.blackKingLocation
+        endRow = self.enPassantPossible[0]
+        pawn = self.board[r][c]
+        captured = self.board[r][endCol]
+        self.board[r][c] = "--"
+        self.board[r][endCol] = "--"
+        self.board[endRow][endCol] = pawn
+        safe = not self.squareAttacked(kingRow, kingCol, not self.whiteToMove)
+        self.board[r][c] = pawn
+        self.board[r][endCol] = captured
+        self.board[endRow][endCol] = "--"
+        return safe
 
     '''
     Get all the Rook move for the rook located at row, col and add these moves to the list
     '''
     def getRookMoves(self, r, c,moves):
+        start = r*8 + c
+        piece = self.board[r][c]
         piecePinned = False
         pinDirection = ()
         for i in range(len(self.pins)-1,-1,-1):
             if self.pins[i][0] == r and self.pins[i][1] == c :
                 piecePinned = True
                 pinDirection = (self.pins[i][2],self.pins[i][3])
-                if self.board[r][c][1] != "Q": #Can't remove queen from pins on rook moves, only remove it on bishop move
+                if piece[1] != "Q": #Can't remove queen from pins on rook moves, only remove it on bishop move
                     self.pins.remove(self.pins[i])
                 break
 
@@ -297,9 +866,9 @@ class GameState():
                     if not piecePinned or pinDirection == d or pinDirection == (-d[0],-d[1]):
                         endPiece = self.board[endRow][endCol]
                         if endPiece == "--": #Valid space
-                            moves.append(Move((r,c), (endRow,endCol), self.board))
+                            moves.append(newMove(start, endRow*8 + endCol, piece, endPiece))
                         elif endPiece[0] == enemyColor: #enemy piece
-                            moves.append(Move((r,c), (endRow,endCol), self.board))
+                            moves.append(newMove(start, endRow*8 + endCol, piece, endPiece))
                             break
                         else: #Friendly piece
                             break
@@ -309,6 +878,8 @@ class GameState():
     Get all the Knight move for the knight located at row, col and add these moves to the list
     '''
     def getKnightMoves(self, r, c,moves):
+        start = r*8 + c
+        piece = self.board[r][c]
         piecePinned = False
         for i in range(len(self.pins)-1,-1,-1):
             if self.pins[i][0] == r and self.pins[i][1] == c :
@@ -325,12 +896,14 @@ class GameState():
                 if not piecePinned:
                     endPiece = self.board[endRow][endCol]
                     if allyColor != endPiece[0]: #not Ally piece also empty space
-                        moves.append(Move((r,c), (endRow,endCol), self.board))
+                        moves.append(newMove(start, endRow*8 + endCol, piece, endPiece))
 
     '''
     Get all the Bishop move for the bishop located at row, col and add these moves to the list
     '''
     def getBishopMoves(self, r, c,moves):
+        start = r*8 + c
+        piece = self.board[r][c]
         piecePinned = False
         pinDirection = ()
         for i in range(len(self.pins)-1,-1,-1):
@@ -350,9 +923,9 @@ class GameState():
                     if not piecePinned or pinDirection == d or pinDirection == (-d[0],-d[1]):
                         endPiece = self.board[endRow][endCol]
                         if endPiece == "--": #Valid space
-                            moves.append(Move((r,c), (endRow,endCol), self.board))
+                            moves.append(newMove(start, endRow*8 + endCol, piece, endPiece))
                         elif endPiece[0] == enemyColor: #enemy piece
-                            moves.append(Move((r,c), (endRow,endCol), self.board))
+                            moves.append(newMove(start, endRow*8 + endCol, piece, endPiece))
                             break
                         else: #Friendly piece
                             break
@@ -363,56 +936,53 @@ class GameState():
     Get all the Queen move for the queen located at row, col and add these moves to the list
     '''
     def getQueenMoves(self, r, c,moves):
+        self.getRookMoves(r, c, moves) #rook first, it leaves a queen pin in the list for the bishop moves
         self.getBishopMoves(r, c, moves)
-        self.getRookMoves(r, c, moves)
 
     '''
     Get all the King move for the king located at row, col and add these moves to the list
     '''
     def getKingMoves(self, r, c,moves):
+        start = r*8 + c
+        piece = self.board[r][c]
         rowMoves = (-1,-1,-1,0,0,1,1,1)
         colMoves = (-1,0,1,-1,1,-1,0,1)
         allyColor = "w" if self.whiteToMove else "b"
+        enemyAttacks = self.getAttackMap(allyColor == "b") #squares the king can't step on
         for i in range(8):
             endRow = r + rowMoves[i]
             endCol = c + colMoves[i]
             if 0 <= endRow < 8 and 0 <= endCol < 8 : #stay on board
                 endPiece = self.board[endRow][endCol]
                 if allyColor != endPiece[0]: #not Ally piece also empty space
-                    #place king on end square and check for checks
-                    if allyColor == "w":
-                        self.whiteKingLocation = (endRow,endCol)
-                    else:
-                        self.blackKingLocation = (endRow,endCol)
-                    inCheck,pins,checks = self.checkForPinsAndChecks()
-                    if not inCheck:
-                        moves.append(Move((r,c), (endRow,endCol), self.board))
-                    #place king to an original position
-                    if allyColor == "w":
-                        self.whiteKingLocation = (r,c)
-                    else:
-                        self.blackKingLocation = (r,c)
+                    if not enemyAttacks >> (endRow * 8 + endCol) & 1:
+                        moves.append(newMove(start, endRow*8 + endCol, piece, endPiece))
 
     '''
     Generate all valid castle moves for the king at (r,c) and add them to a list of moves
     '''
     def getCastleMoves(self, r, c, moves ):
-        if self.squareUnderAttack(r, c):
+        if c != 4 or r != (7 if self.whiteToMove else 0):
+            return #the king isn't on its home square, whatever the rights say
+        enemyAttacks = self.getAttackMap(not self.whiteToMove)
+        if enemyAttacks >> (r * 8 + c) & 1:
             return #Can't castle while we are in check
         if (self.whiteToMove and self.currentCastlingRights.wks) or (not self.whiteToMove and self.currentCastlingRights.bks):
-            self.getKingsideCastleMoves(r, c, moves )
+            self.getKingsideCastleMoves(r, c, moves, enemyAttacks)
         if (self.whiteToMove and self.currentCastlingRights.wqs) or (not self.whiteToMove and self.currentCastlingRights.bqs):
-            self.getQueensideCastleMoves(r, c, moves )
+            self.getQueensideCastleMoves(r, c, moves, enemyAttacks)
         
-    def getKingsideCastleMoves(self, r, c, moves):
-        if self.board[r][c+1] == "--" and self.board[r][c+2] == "--":
-            if not self.squareUnderAttack(r,c+1) and not self.squareUnderAttack(r, c+2):
-                moves.append(Move((r,c), (r,c+2), self.board, isCastleMove= True))
+    def getKingsideCastleMoves(self, r, c, moves, enemyAttacks):
+        if self.board[r][c+1] == "--" and self.board[r][c+2] == "--" and self.board[r][7] == self.board[r][c][0] + "R":
+            if not enemyAttacks >> (r * 8 + c + 1) & 1 and not enemyAttacks >> (r * 8 + c + 2) & 1:
+                moves.append(newMove(r*8 + c, r*8 + c+2, self.board[r][c], "--", castle = True))
     
-    def getQueensideCastleMoves(self, r, c, moves):
-        if self.board[r][c-1] == "--" and self.board[r][c-2] == "--" and self.board[r][c-3] == "--":
-            if not self.squareUnderAttack(r,c-1) and not self.squareUnderAttack(r, c-2) and not self.squareUnderAttack(r, c-3):
-                moves.append(Move((r,c), (r,c-2), self.board, isCastleMove= True))
+    def getQueensideCastleMoves(self, r, c, moves, enemyAttacks):
+        #the b-file square only has to be empty, the king never crosses it
+        if self.board[r][c-1] == "--" and self.board[r][c-2] == "--" and self.board[r][c-3] == "--" \
+                and self.board[r][0] == self.board[r][c][0] + "R":
+            if not enemyAttacks >> (r * 8 + c - 1) & 1 and not enemyAttacks >> (r * 8 + c - 2) & 1:
+                moves.append(newMove(r*8 + c, r*8 + c-2, self.board[r][c], "--", castle = True))
     '''
     Return if the player is in check, a list of pins , and a list of checks
     '''
@@ -480,7 +1050,6 @@ class GameState():
                 if enemyColor == endPiece[0] and endPiece[1] == "N": #Enemy knight attacking king
                     inCheck = True
                     checks.append((endRow,endCol,d[0],d[1]))
-            else: break
         return inCheck, pins, checks
 
 class CastleRights():
@@ -489,6 +1058,27 @@ class CastleRights():
         self.wqs = wqs
         self.bks = bks
         self.bqs = bqs
+#Piece codes used inside packed moves
+PIECE_CODES = {"--": 0, "wp": 1, "wN": 2, "wB": 3, "wR": 4, "wQ": 5, "wK": 6,
+               "bp": 7, "bN": 8, "bB": 9, "bR": 10, "bQ": 11, "bK": 12}
+CODE_PIECES = [piece for piece, code in sorted(PIECE_CODES.items(), key = lambda item: item[1])]
+
+#Packed move layout (low to high bits): start square 6, end square 6, promotion 3 (0 none, 1..4 = Q R B N),
+#en passant 1, castle 1, moved piece 4, captured piece 4. Squares are row * 8 + col, so a move fits an array("I").
+#The low 15 bits are the moveID.
+EN_PASSANT_FLAG = 1 << 15
+CASTLE_FLAG = 1 << 16
+PROMOTION_IDS = {"Q": 1 << 12, "R": 2 << 12, "B": 3 << 12, "N": 4 << 12}
+
+'''
+Store a move list as packed ints, 4 bytes a move
+'''
+def packMoves(moves):
+    return array("I", [move.code for move in moves])
+
+def unpackMoves(codes):
+    return [Move.fromCode(code) for code in codes]
+
 class Move():
     #maps key to values
     #key: value
@@ -497,7 +1087,12 @@ class Move():
     rowtoRanks = {v: k for k,v in ranktoRows.items()}
     filetoCols = {"a":0,"b":1,"c":2,"d":3,"e":4,"f":5,"g":6,"h":7}
     coltoFiles = {v:k for k,v in filetoCols.items()}
-    def __init__(self,startSQ, endSQ , board, enPassantPossible = False, isCastleMove = False ):
+    promotionPieces = ("Q", "R", "B", "N")
+    #no per instance __dict__, millions of moves are created during a search
+    __slots__ = ("startRow", "startCol", "endRow", "endCol", "pieceMoved", "pieceCaptured", "isPromotionPawn",
+                 "promotionChoice", "isEnPassantMove", "isCastleMove", "moveID")
+
+    def __init__(self,startSQ, endSQ , board, enPassantPossible = False, isCastleMove = False, promotionChoice = "Q"):
         self.startRow = startSQ[0]
         self.startCol = startSQ[1]
         self.endRow = endSQ[0]
@@ -507,22 +1102,493 @@ class Move():
 
         #Pawn Promotion
         self.isPromotionPawn = (self.pieceMoved == "wp" and self.endRow == 0) or (self.pieceMoved == "bp" and self.endRow == 7)
+        self.promotionChoice = promotionChoice
         #En Passant
         self.isEnPassantMove = enPassantPossible
         if self.isEnPassantMove:
             self.pieceCaptured = "wp" if self.pieceMoved == "bp" else "bp"
         #Castle Move
         self.isCastleMove = isCastleMove
-        self.moveID = self.startRow*1000 + self.startCol*100 + self.endRow*10 + self.endCol
-        
+        #start square, end square and promotion piece, one move per promotion piece
+        self.moveID = (self.startRow*8 + self.startCol) | (self.endRow*8 + self.endCol) << 6
+        if self.isPromotionPawn:
+            self.moveID |= PROMOTION_IDS[promotionChoice]
+
+    '''
+    The whole move as one int, see the packed move layout
+    '''
+    @property
+    def code(self):
+        return (self.moveID | (EN_PASSANT_FLAG if self.isEnPassantMove else 0) | (CASTLE_FLAG if self.isCastleMove else 0)
+                | PIECE_CODES[self.pieceMoved] << 17 | PIECE_CODES[self.pieceCaptured] << 21)
+
+    '''
+    Build a move back from its packed int
+    '''
+    @staticmethod
+    def fromCode(code):
+        promotion = code >> 12 & 7
+        return newMove(code & 63, code >> 6 & 63, CODE_PIECES[code >> 17 & 15], CODE_PIECES[code >> 21 & 15],
+                       code & EN_PASSANT_FLAG != 0, code & CASTLE_FLAG != 0,
+                       Move.promotionPieces[promotion - 1] if promotion else "Q")
     
     def __eq__(self, other):
         if isinstance(other, Move):
             return self.moveID == other.moveID
         return False
 
+    def __hash__(self):
+        return self.moveID
+
     def getChessNotation(self):
-        return self.RankFile(self.startRow,self.startCol) + self.RankFile(self.endRow,self.endCol)
-    
+        notation = self.RankFile(self.startRow,self.startCol) + self.RankFile(self.endRow,self.endCol)
+        if self.isPromotionPawn:
+            notation += self.promotionChoice.lower()
+        return notation
+
+    '''
+    Standard algebraic notation ("Nbd7", "exd8=Q+", "O-O") of this move, a valid move of gs
+    '''
+    def getSan(self, gs, validMoves = None):
+        if validMoves is None:
+            validMoves = gs.getValidMoves()
+        if self.isCastleMove:
+            san = "O-O" if self.endCol > self.startCol else "O-O-O"
+        else:
+            piece = self.pieceMoved[1]
+            capture = self.pieceCaptured != "--"
+            destination = self.RankFile(self.endRow, self.endCol)
+            if piece == "p":
+                san = (self.coltoFiles[self.startCol] + "x" if capture else "") + destination
+                if self.isPromotionPawn:
+                    san += "=" + self.promotionChoice
+            else:
+                #other pieces of the same kind that can go to the same square
+                others = [other for other in validMoves if other.pieceMoved == self.pieceMoved and other.endRow == self.endRow
+                          and other.endCol == self.endCol and (other.startRow, other.startCol) != (self.startRow, self.startCol)]
+                disambiguation = ""
+                if others:
+                    if all(other.startCol != self.startCol for other in others):
+                        disambiguation = self.coltoFiles[self.startCol]
+                    elif all(other.startRow != self.startRow for other in others):
+                        disambiguation = self.rowtoRanks[self.startRow]
+                    else:
+                        disambiguation = self.RankFile(self.startRow, self.startCol)
+                san = piece + disambiguation + ("x" if capture else "") + destination
+        gs.makeMove(self) #check and mate marks
+        replies = gs.getValidMoves()
+        if gs.inCheck:
+            san += "#" if not replies else "+"
+        gs.undoMove()
+        return san
+
+    '''
+    Long algebraic notation: piece, start square, "-" or "x", end square ("Ng1-f3", "e7xd8=Q", "O-O")
+    '''
+    def getLan(self):
+        if self.isCastleMove:
+            return "O-O" if self.endCol > self.startCol else "O-O-O"
+        lan = (self.pieceMoved[1] if self.pieceMoved[1] != "p" else "") + self.RankFile(self.startRow, self.startCol) \
+            + ("x" if self.pieceCaptured != "--" else "-") + self.RankFile(self.endRow, self.endCol)
+        if self.isPromotionPawn:
+            lan += "=" + self.promotionChoice
+        return lan
+
+    '''
+    The valid move of gs written in SAN, None if there is no such move
+    '''
+    @staticmethod
+    def fromSan(gs, san, validMoves = None):
+        parsed = parseSan(san)
+        if parsed is None:
+            return None
+        if validMoves is None:
+            validMoves = gs.getValidMoves()
+        castle, piece, fromRow, fromCol, endRow, endCol, promotion = parsed
+        for move in validMoves:
+            if castle:
+                if move.isCastleMove and (move.endCol > move.startCol) == (castle == "K"):
+                    return move
+            elif move.endRow == endRow and move.endCol == endCol and move.pieceMoved[1] == piece \
+                    and (fromCol is None or move.startCol == fromCol) and (fromRow is None or move.startRow == fromRow) \
+                    and (not move.isPromotionPawn or move.promotionChoice == (promotion or "Q")):
+                return move
+        return None
+
+    '''
+    The valid move of gs written in long algebraic notation, with or without the piece letter and separator
+    ("Ng1-f3", "g1f3", "e7e8q" like UCI), None if there is no such move
+    '''
+    @staticmethod
+    def fromLan(gs, lan, validMoves = None):
+        if validMoves is None:
+            validMoves = gs.getValidMoves()
+        text = lan.rstrip("+#!?")
+        if text.replace("0", "O") in ("O-O", "O-O-O"):
+            return Move.fromSan(gs, text, validMoves)
+        text = text.lstrip("KQRBN").replace("-", "").replace("x", "").replace("=", "")
+        for move in validMoves:
+            if move.getChessNotation() == text.lower():
+                return move
+        return None
+
     def RankFile(self,r,c):
-        return self.coltoFiles[c] + self.rowtoRanks[r]
\ No newline at end of file
+        return self.coltoFiles[c] + self.rowtoRanks[r]
+
+'''
+Split a SAN move into (castle, piece, start row, start col, end row, end col, promotion).
+castle is "K" or "Q" for castling (the other fields are None then), the start square holds the disambiguation
+(None when not given), piece is "p" for pawns. Returns None when san is not a move
+'''
+def parseSan(san):
+    san = san.rstrip("+#!?")
+    if san.replace("0", "O") in ("O-O", "O-O-O"):
+        return ("K" if len(san) == 3 else "Q", None, None, None, None, None, None)
+    promotion = None
+    if "=" in san:
+        san, promotion = san.split("=", 1)
+        promotion = promotion[:1].upper()
+    elif len(san) > 2 and san[-1] in "QRBNqrbn" and san[-2] in "18":
+        san, promotion = san[:-1], san[-1].upper()
+    piece = san[0] if san[:1] in ("K", "Q", "R", "B", "N") else "p"
+    if piece != "p":
+        san = san[1:]
+    san = san.replace("x", "").replace("-", "").replace(":", "")
+    if len(san) < 2 or san[-2] not in Move.filetoCols or san[-1] not in Move.ranktoRows:
+        return None
+    fromRow = fromCol = None
+    for char in san[:-2]: #disambiguation
+        if char in Move.filetoCols:
+            fromCol = Move.filetoCols[char]
+        elif char in Move.ranktoRows:
+            fromRow = Move.ranktoRows[char]
+        else:
+            return None
+    return (None, piece, fromRow, fromCol, Move.ranktoRows[san[-1]], Move.filetoCols[san[-2]], promotion)
+
+'''
+Fast Move constructor for the move generators: squares are row * 8 + col and the pieces are already known,
+so the board is never read
+'''
+_newObject = object.__new__
+def newMove(start, end, pieceMoved, pieceCaptured, enPassant = False, castle = False, promotionChoice = "Q"):
+    move = _newObject(Move)
+    move.startRow = start >> 3
+    move.startCol = start & 7
+    move.endRow = endRow = end >> 3
+    move.endCol = end & 7
+    move.pieceMoved = pieceMoved
+    move.isEnPassantMove = enPassant
+    move.pieceCaptured = ("wp" if pieceMoved == "bp" else "bp") if enPassant else pieceCaptured
+    move.isCastleMove = castle
+    move.promotionChoice = promotionChoice
+    if pieceMoved[1] == "p" and (endRow == 0 or endRow == 7):
+        move.isPromotionPawn = True
+        move.moveID = start | end << 6 | PROMOTION_IDS[promotionChoice]
+    else:
+        move.isPromotionPawn = False
+        move.moveID = start | end << 6
+    return move
+
+
+"""
+Bitboard backend of GameState.
+The position is kept as twelve 64 bit piece bitboards plus color and occupancy masks,
+and move generation uses the precomputed attack tables of BitboardChess instead of walking the board.
+The board list is still maintained so the drawing code can keep reading gs.board.
+"""
+class BitboardGameState(GameState):
+    def __init__(self, backend = "bitboard", fen = None):
+        super().__init__(backend, fen)
+        self.loadBitboards()
+
+    def loadFen(self, fen):
+        super().loadFen(fen)
+        self.loadBitboards()
+
+    '''
+    Rebuild every bitboard from the board list
+    '''
+    def loadBitboards(self):
+        self.pieceBB = [0] * 12
+        self.colorBB = [0, 0]
+        for r in range(8):
+            for c in range(8):
+                piece = self.board[r][c]
+                if piece != "--":
+                    bit = SQUARE_BB[r * 8 + c]
+                    self.pieceBB[PIECE_INDEX[piece]] |= bit
+                    self.colorBB[piece[0] == "b"] |= bit
+        self.occupied = self.colorBB[WHITE] | self.colorBB[BLACK]
+
+    def toggle(self, piece, sq):
+        bit = SQUARE_BB[sq]
+        self.pieceBB[PIECE_INDEX[piece]] ^= bit
+        self.colorBB[piece[0] == "b"] ^= bit
+        self.occupied ^= bit
+
+    '''
+    Every bitboard update is a xor, so the same call makes and unmakes a move
+    placed is the piece that stands on the end square after the move (the promoted piece on promotions)
+    '''
+    def updateBitboards(self, move, placed):
+        start = move.startRow * 8 + move.startCol
+        end = move.endRow * 8 + move.endCol
+        self.toggle(move.pieceMoved, start)
+        if move.isEnPassantMove:
+            self.toggle(move.pieceCaptured, move.startRow * 8 + move.endCol)
+        elif move.pieceCaptured != "--":
+            self.toggle(move.pieceCaptured, end)
+        self.toggle(placed, end)
+        if move.isCastleMove:
+            rook = move.pieceMoved[0] + "R"
+            if move.endCol - move.startCol == 2: #Kingside
+                self.toggle(rook, end + 1)
+                self.toggle(rook, end - 1)
+            else: #Queenside
+                self.toggle(rook, end - 2)
+                self.toggle(rook, end + 1)
+
+    def makeMove(self, move):
+        super().makeMove(move)
+        self.updateBitboards(move, self.board[move.endRow][move.endCol])
+
+    def undoMove(self):
+        if len(self.moveLog) != 0:
+            move = self.moveLog[-1]
+            placed = self.board[move.endRow][move.endCol]
+            super().undoMove()
+            self.updateBitboards(move, placed)
+
+    '''
+    Bitboard of the pieces of color that attack square sq with the given occupancy
+    '''
+    def attackersTo(self, sq, color, occ):
+        pb = self.pieceBB
+        o = 6 * color
+        queens = pb[o + 4]
+        return ((PAWN_ATTACKS[1 - color][sq] & pb[o]) | (KNIGHT_ATTACKS[sq] & pb[o + 1])
+                | (KING_ATTACKS[sq] & pb[o + 5])
+                | (bishopAttacks(sq, occ) & (pb[o + 2] | queens))
+                | (rookAttacks(sq, occ) & (pb[o + 3] | queens)))
+
+    def squareAttacked(self, r, c, byWhite, ignore = ()):
+        occ = self.occupied
+        if ignore != ():
+            occ &= ~SQUARE_BB[ignore[0] * 8 + ignore[1]]
+        return self.attackersTo(r * 8 + c, WHITE if byWhite else BLACK, occ) != 0
+
+    '''
+    Squares attacked by the side byWhite, with the opposing king removed from the occupancy
+    '''
+    def getAttackMap(self, byWhite):
+        attacks = self.attackMaps.get(byWhite)
+        if attacks is not None:
+            return attacks
+        color = WHITE if byWhite else BLACK
+        pb = self.pieceBB
+        o = 6 * color
+        occ = self.occupied & ~pb[6 * (1 - color) + 5]
+        attacks = 0
+        for s in squares(pb[o]):
+            attacks |= PAWN_ATTACKS[color][s]
+        for s in squares(pb[o + 1]):
+            attacks |= KNIGHT_ATTACKS[s]
+        for s in squares(pb[o + 2] | pb[o + 4]):
+            attacks |= bishopAttacks(s, occ)
+        for s in squares(pb[o + 3] | pb[o + 4]):
+            attacks |= rookAttacks(s, occ)
+        attacks |= KING_ATTACKS[lsb(pb[o + 5])]
+        self.attackMaps[byWhite] = attacks
+        return attacks
+
+    '''
+    Return the bitboard of pieces checking the side to move and a dict of pinned square -> line the piece may move on
+    '''
+    def pinsAndCheckers(self):
+        us = WHITE if self.whiteToMove else BLACK
+        them = 1 - us
+        pb = self.pieceBB
+        o = 6 * them
+        kingSq = lsb(pb[6 * us + 5])
+        checkers = self.attackersTo(kingSq, them, self.occupied)
+        pinned = {}
+        snipers = ((rookAttacks(kingSq, 0) & (pb[o + 3] | pb[o + 4]))
+                   | (bishopAttacks(kingSq, 0) & (pb[o + 2] | pb[o + 4])))
+        for s in squares(snipers):
+            blockers = BETWEEN[kingSq][s] & self.occupied
+            #exactly one piece between king and slider and that piece is ours
+            if blockers and not blockers & (blockers - 1) and blockers & self.colorBB[us]:
+                pinned[lsb(blockers)] = LINE[kingSq][s]
+        return kingSq, checkers, pinned
+
+    def checkForPinsAndChecks(self):
+        return self.pinCheckTuples(*self.pinsAndCheckers())
+
+    '''
+    Same tuples as the list backend: (row, col, rowDirection, colDirection)
+    '''
+    def pinCheckTuples(self, kingSq, checkers, pinned):
+        kr, kc = kingSq >> 3, kingSq & 7
+        def direction(sq):
+            r, c = sq >> 3, sq & 7
+            if (abs(r - kr), abs(c - kc)) in ((1, 2), (2, 1)): #knight
+                return (r, c, r - kr, c - kc)
+            return (r, c, (r > kr) - (r < kr), (c > kc) - (c < kc))
+        checks = [direction(sq) for sq in squares(checkers)]
+        pins = [direction(sq) for sq in pinned]
+        return checkers != 0, pins, checks
+
+    def getValidMoves(self):
+        kingSq, checkers, pinned = self.pinsAndCheckers()
+        self.inCheck, self.pins, self.checks = self.pinCheckTuples(kingSq, checkers, pinned)
+        moves = []
+        if checkers & (checkers - 1) == 0: #no check or a single check, double check leaves only king moves
+            checkMask = checkers | BETWEEN[kingSq][lsb(checkers)] if checkers else FULL
+            self.generatePieceMoves(moves, pinned, checkMask, kingSq)
+        self.generateKingMoves(moves, kingSq, legal = True)
+        if not self.inCheck:
+            self.generateCastleMoves(moves, kingSq)
+
+        if len(moves) == 0:
+            if self.inCheck: self.checkMate = True
+            else: self.staleMate = True
+        else:
+            self.checkMate = False
+            self.staleMate = False
+        return moves
+
+    '''
+    Pins and checks are found once, the moves of a stage are only made when generateStage asks for them
+    '''
+    def prepareStages(self):
+        kingSq, checkers, pinned = self.pinsAndCheckers()
+        self.inCheck = checkers != 0
+        #None in double check: only the king can move
+        checkMask = None if checkers & (checkers - 1) else checkers | BETWEEN[kingSq][lsb(checkers)] if checkers else FULL
+        return kingSq, pinned, checkMask, self.inCheck
+
+    def generateStage(self, context, stage, fromSq = None):
+        kingSq, pinned, checkMask, inCheck = context
+        fromMask = FULL if fromSq is None else SQUARE_BB[fromSq]
+        moves = []
+        if checkMask is not None:
+            self.generatePieceMoves(moves, pinned, checkMask, kingSq, True, stage, fromMask)
+        if fromMask >> kingSq & 1:
+            self.generateKingMoves(moves, kingSq, True, stage)
+            if stage & QUIET_MOVES and not inCheck:
+                self.generateCastleMoves(moves, kingSq)
+        return moves
+
+    '''
+    All moves without considering checks
+    '''
+    def getAllPossibleMoves(self):
+        moves = []
+        kingSq = lsb(self.pieceBB[5 if self.whiteToMove else 11])
+        self.generatePieceMoves(moves, {}, FULL, kingSq, legal = False)
+        self.generateKingMoves(moves, kingSq, legal = False)
+        return moves
+
+    '''
+    Add the moves of the piece on start to every square of targets, quiet moves need no board lookup
+    '''
+    def addMoves(self, moves, start, targets, piece):
+        board = self.board
+        quiet = targets & ~self.occupied
+        while quiet:
+            low = quiet & -quiet
+            t = low.bit_length() - 1
+            moves.append(newMove(start, t, piece, "--"))
+            quiet ^= low
+        for t in squares(targets & self.occupied):
+            moves.append(newMove(start, t, piece, board[t >> 3][t & 7]))
+
+    '''
+    Moves of every piece on fromMask except the king, restricted to the check mask and to the line of pinned pieces.
+    stage picks the noisy moves (captures, en passant, promotions), the quiet ones or both
+    '''
+    def generatePieceMoves(self, moves, pinned, checkMask, kingSq, legal = True, stage = ALL_MOVES, fromMask = FULL):
+        us = WHITE if self.whiteToMove else BLACK
+        them = 1 - us
+        pb = self.pieceBB
+        o = 6 * us
+        own = self.colorBB[us]
+        enemy = self.colorBB[them]
+        occ = self.occupied
+        board = self.board
+        targets = ~own & checkMask
+        if stage != ALL_MOVES:
+            targets &= enemy if stage == NOISY_MOVES else ~occ
+        noisy = stage & NOISY_MOVES
+        quiet = stage & QUIET_MOVES
+        color = "w" if us == WHITE else "b"
+
+        #Pawns
+        pawn = color + "p"
+        forward = -8 if us == WHITE else 8
+        startRow = 6 if us == WHITE else 1
+        epSq = self.enPassantPossible[0] * 8 + self.enPassantPossible[1] if self.enPassantPossible != () else -1
+        for s in squares(pb[o] & fromMask):
+            mask = pinned.get(s, FULL) & checkMask
+            one = s + forward
+            if not occ >> one & 1:
+                if mask >> one & 1 and (noisy if one < 8 or one >= 56 else quiet): #a push that promotes is noisy
+                    GameState.addPawnMove(self, moves, s, one, pawn, "--")
+                two = one + forward
+                if quiet and s >> 3 == startRow and not occ >> two & 1 and mask >> two & 1:
+                    moves.append(newMove(s, two, pawn, "--"))
+            if not noisy:
+                continue
+            for t in squares(PAWN_ATTACKS[us][s] & enemy & mask):
+                GameState.addPawnMove(self, moves, s, t, pawn, board[t >> 3][t & 7])
+            if epSq >= 0 and PAWN_ATTACKS[us][s] >> epSq & 1:
+                capSq = epSq - forward
+                if legal:
+                    #play the capture on a scratch occupancy, this covers pins, checks and the rank pin of both pawns
+                    occAfter = (occ ^ SQUARE_BB[s] ^ SQUARE_BB[capSq]) | SQUARE_BB[epSq]
+                    if self.attackersTo(kingSq, them, occAfter) & ~SQUARE_BB[capSq]:
+                        continue
+                moves.append(newMove(s, epSq, pawn, "--", enPassant = True))
+
+        #Knights, a pinned knight can never move
+        knight = color + "N"
+        for s in squares(pb[o + 1] & fromMask):
+            if s not in pinned:
+                self.addMoves(moves, s, KNIGHT_ATTACKS[s] & targets, knight)
+
+        #Sliders
+        for s in squares(pb[o + 2] & fromMask):
+            self.addMoves(moves, s, bishopAttacks(s, occ) & targets & pinned.get(s, FULL), color + "B")
+        for s in squares(pb[o + 3] & fromMask):
+            self.addMoves(moves, s, rookAttacks(s, occ) & targets & pinned.get(s, FULL), color + "R")
+        for s in squares(pb[o + 4] & fromMask):
+            self.addMoves(moves, s, (rookAttacks(s, occ) | bishopAttacks(s, occ)) & targets & pinned.get(s, FULL), color + "Q")
+
+    def generateKingMoves(self, moves, kingSq, legal = True, stage = ALL_MOVES):
+        us = WHITE if self.whiteToMove else BLACK
+        targets = KING_ATTACKS[kingSq] & ~self.colorBB[us]
+        if stage != ALL_MOVES:
+            targets &= self.colorBB[1 - us] if stage == NOISY_MOVES else ~self.occupied
+        if legal and targets:
+            targets &= ~self.getAttackMap(us == BLACK)
+        self.addMoves(moves, kingSq, targets, "wK" if us == WHITE else "bK")
+
+    def generateCastleMoves(self, moves, kingSq):
+        us = WHITE if self.whiteToMove else BLACK
+        if kingSq != (60 if us == WHITE else 4):
+            return #the king isn't on its home square, whatever the rights say
+        rights = self.currentCastlingRights
+        kingside, queenside = (rights.wks, rights.wqs) if us == WHITE else (rights.bks, rights.bqs)
+        occ = self.occupied
+        rook = self.pieceBB[6 * us + 3]
+        kingside = kingside and rook >> (kingSq + 3) & 1
+        queenside = queenside and rook >> (kingSq - 4) & 1
+        if not (kingside or queenside):
+            return
+        enemyAttacks = self.getAttackMap(us == BLACK)
+        if kingside and not (occ | enemyAttacks) & (SQUARE_BB[kingSq + 1] | SQUARE_BB[kingSq + 2]):
+            moves.append(newMove(kingSq, kingSq + 2, self.board[kingSq >> 3][kingSq & 7], "--", castle = True))
+        if queenside and not occ & (SQUARE_BB[kingSq - 1] | SQUARE_BB[kingSq - 2] | SQUARE_BB[kingSq - 3]):
+            if not enemyAttacks & (SQUARE_BB[kingSq - 1] | SQUARE_BB[kingSq - 2]):
+                moves.append(newMove(kingSq, kingSq - 2, self.board[kingSq >> 3][kingSq & 7], "--", castle = True))
@@ -0,0 +1,127 @@
+"""
+Tapered evaluation: material plus piece-square tables, once for the middlegame and once for the endgame.
+GameState keeps the white-minus-black sum of both (mgScore, egScore) and the game phase up to date in
+makeMove/undoMove, so evaluating a leaf only blends two numbers instead of walking the board.
+computeEvaluation rebuilds the three values from scratch, used to set up a position and to check the incremental ones.
+"""
+
+MG_VALUES = {"p": 82, "N": 337, "B": 365, "R": 477, "Q": 1025, "K": 0}
+EG_VALUES = {"p": 94, "N": 281, "B": 297, "R": 512, "Q": 936, "K": 0}
+PHASE_WEIGHTS = {"p": 0, "N": 1, "B": 1, "R": 2, "Q": 4, "K": 0}
+MAX_PHASE = 24 #all minor and major pieces on the board, 0 is a pawn ending
+
+#Square tables from white's point of view, index row * 8 + col with row 0 the 8th rank (like GameState.board)
+PAWN_MG = [
+      0,   0,   0,   0,   0,   0,   0,   0,
+     50,  50,  50,  50,  50,  50,  50,  50,
+     10,  10,  20,  30,  30,  20,  10,  10,
+      5,   5,  10,  25,  25,  10,   5,   5,
+      0,   0,   0,  20,  20,   0,   0,   0,
+      5,  -5, -10,   0,   0, -10,  -5,   5,
+      5,  10,  10, -20, -20,  10,  10,   5,
+      0,   0,   0,   0,   0,   0,   0,   0]
+PAWN_EG = [
+      0,   0,   0,   0,   0,   0,   0,   0,
+     80,  80,  80,  80,  80,  80,  80,  80,
+     50,  50,  50,  50,  50,  50,  50,  50,
+     30,  30,  30,  30,  30,  30,  30,  30,
+     15,  15,  15,  15,  15,  15,  15,  15,
+      5,   5,   5,   5,   5,   5,   5,   5,
+      0,   0,   0,   0,   0,   0,   0,   0,
+      0,   0,   0,   0,   0,   0,   0,   0]
+KNIGHT = [
+    -50, -40, -30, -30, -30, -30, -40, -50,
+    -40, -20,   0,   0,   0,   0, -20, -40,
+    -30,   0,  10,  15,  15,  10,   0, -30,
+    -30,   5,  15,  20,  20,  15,   5, -30,
+    -30,   0,  15,  20,  20,  15,   0, -30,
+    -30,   5,  10,  15,  15,  10,   5, -30,
+    -40, -20,   0,   5,   5,   0, -20, -40,
+    -50, -40, -30, -30, -30, -30, -40, -50]
+BISHOP = [
+    -20, -10, -10, -10, -10, -10, -10, -20,
+    -10,   0,   0,   0,   0,   0,   0, -10,
+    -10,   0,   5,  10,  10,   5,   0, -10,
+    -10,   5,   5,  10,  10,   5,   5, -10,
+    -10,   0,  10,  10,  10,  10,   0, -10,
+    -10,  10,  10,  10,  10,  10,  10, -10,
+    -10,   5,   0,   0,   0,   0,   5, -10,
+    -20, -10, -10, -10, -10, -10, -10, -20]
+ROOK = [
+      0,   0,   0,   0,   0,   0,   0,   0,
+      5,  10,  10,  10,  10,  10,  10,   5,
+     -5,   0,   0,   0,   0,   0,   0,  -5,
+     -5,   0,   0,   0,   0,   0,   0,  -5,
+     -5,   0,   0,   0,   0,   0,   0,  -5,
+     -5,   0,   0,   0,   0,   0,   0,  -5,
+     -5,   0,   0,   0,   0,   0,   0,  -5,
+      0,   0,   0,   5,   5,   0,   0,   0]
+QUEEN = [
+    -20, -10, -10,  -5,  -5, -10, -10, -20,
+    -10,   0,   0,   0,   0,   0,   0, -10,
+    -10,   0,   5,   5,   5,   5,   0, -10,
+     -5,   0,   5,   5,   5,   5,   0,  -5,
+      0,   0,   5,   5,   5,   5,   0,  -5,
+    -10,   5,   5,   5,   5,   5,   0, -10,
+    -10,   0,   5,   0,   0,   0,   0, -10,
+    -20, -10, -10,  -5,  -5, -10, -10, -20]
+KING_MG = [
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -20, -30, -30, -40, -40, -30, -30, -20,
+    -10, -20, -20, -20, -20, -20, -20, -10,
+     20,  20,   0,   0,   0,   0,  20,  20,
+     20,  30,  10,   0,   0,  10,  30,  20]
+KING_EG = [
+    -50, -40, -30, -20, -20, -30, -40, -50,
+    -30, -20, -10,   0,   0, -10, -20, -30,
+    -30, -10,  20,  30,  30,  20, -10, -30,
+    -30, -10,  30,  40,  40,  30, -10, -30,
+    -30, -10,  30,  40,  40,  30, -10, -30,
+    -30, -10,  20,  30,  30,  20, -10, -30,
+    -30, -30,   0,   0,   0,   0, -30, -30,
+    -50, -30, -30, -30, -30, -30, -30, -50]
+
+SQUARE_TABLES = {"p": (PAWN_MG, PAWN_EG), "N": (KNIGHT, KNIGHT), "B": (BISHOP, BISHOP), "R": (ROOK, ROOK),
+                 "Q": (QUEEN, QUEEN), "K": (KING_MG, KING_EG)}
+
+'''
+Signed value of every piece on every square (material + square table), positive for white.
+Black pieces read the table of the mirrored square
+'''
+def buildTable(values, phase):
+    table = {}
+    for piece, squareTables in SQUARE_TABLES.items():
+        squareTable = squareTables[phase]
+        table["w" + piece] = [values[piece] + squareTable[sq] for sq in range(64)]
+        table["b" + piece] = [-(values[piece] + squareTable[sq ^ 56]) for sq in range(64)]
+    return table
+
+#MG_TABLE[piece][row * 8 + col]
+MG_TABLE = buildTable(MG_VALUES, 0)
+EG_TABLE = buildTable(EG_VALUES, 1)
+PHASE = {color + piece: weight for color in "wb" for piece, weight in PHASE_WEIGHTS.items()}
+
+'''
+(mgScore, egScore, phase) of a GameState computed from its board
+'''
+def computeEvaluation(gs):
+    mg = eg = phase = 0
+    for r in range(8):
+        for c in range(8):
+            piece = gs.board[r][c]
+            if piece != "--":
+                mg += MG_TABLE[piece][r * 8 + c]
+                eg += EG_TABLE[piece][r * 8 + c]
+                phase += PHASE[piece]
+    return mg, eg, phase
+
+'''
+Blend the middlegame and endgame scores by the phase, from the side to move point of view
+'''
+def evaluate(gs):
+    phase = min(gs.phase, MAX_PHASE) #promotions can push the phase past the starting material
+    score = (gs.mgScore * phase + gs.egScore * (MAX_PHASE - phase)) // MAX_PHASE
+    return score if gs.whiteToMove else -score
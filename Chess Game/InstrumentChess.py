@@ -0,0 +1,237 @@
+"""
+Instrumentation of the engine, to see where a search spends its time.
+EngineStats counts the calls (and with timing the self seconds) of the GameState methods the search
+leans on, the evaluation and the transposition table probes, plus the search tree shape: nodes per ply,
+nodes per iteration and branching factor, and how often a cutoff came from the first move searched.
+Nothing is added to the engine classes: attach puts counting wrappers on one GameState and one Searcher
+as instance attributes and detach removes them, so a detached engine runs exactly the code it ran before.
+profileSearch runs a search under cProfile instead. From the Chess Game folder:
+    python -m InstrumentChess --depth 5 --timing --json stats.json --profile search.prof
+"""
+import argparse
+import cProfile
+import json
+import pstats
+import time
+
+import EngineChess
+from SearchChess import Searcher
+
+#GameState methods that get counted, those a backend doesn't have are skipped
+GAMESTATE_METHODS = ("getValidMoves", "getCachedMoves", "prepareStages", "generateStage", "checkForPinsAndChecks",
+                     "pinsAndCheckers", "squareUnderAttack", "squareAttacked", "getAttackMap", "makeMove", "undoMove",
+                     "isRepetition")
+
+class EngineStats():
+    def __init__(self, timing = False):
+        self.timing = timing
+        self.calls = {}
+        self.seconds = {}
+        self.plyNodes = [] #negamax nodes by ply
+        self.quiescencePlyNodes = []
+        self.iterations = [] #(depth, nodes of the iteration)
+        self.expanded = 0 #nodes where at least one move was searched
+        self.movesSearched = 0
+        self.cutoffs = 0
+        self.firstMoveCutoffs = 0
+        self.patched = [] #(object, name, original or None when it was a class attribute)
+        self.childSeconds = [] #time spent in counted calls below every timed call in progress
+        self.searcher = None
+
+    '''
+    Wrap function so its calls are counted under name (and timed with timing). The time is self time: what the
+    call spends in other counted calls, a recursive negamax included, goes to those, so the seconds add up
+    '''
+    def counted(self, name, function):
+        calls = self.calls
+        calls.setdefault(name, 0)
+        if not self.timing:
+            def wrapper(*args, **kwargs):
+                calls[name] += 1
+                return function(*args, **kwargs)
+            return wrapper
+        seconds = self.seconds
+        seconds.setdefault(name, 0.0)
+        childSeconds = self.childSeconds
+        clock = time.perf_counter
+        def wrapper(*args, **kwargs):
+            calls[name] += 1
+            childSeconds.append(0.0)
+            start = clock()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                elapsed = clock() - start
+                seconds[name] += elapsed - childSeconds.pop()
+                if childSeconds:
+                    childSeconds[-1] += elapsed
+        return wrapper
+
+    def patch(self, target, name, replacement):
+        self.patched.append((target, name, vars(target).get(name)))
+        setattr(target, name, replacement)
+
+    '''
+    Start counting on gs and, when given, on searcher (its evaluation, table probes and tree shape).
+    Returns self, so it can be used as: with EngineStats().attach(gs, searcher) as stats:
+    '''
+    def attach(self, gs, searcher = None):
+        for name in GAMESTATE_METHODS:
+            if hasattr(gs, name):
+                self.patch(gs, name, self.counted(name, getattr(gs, name)))
+        if searcher is not None:
+            self.searcher = searcher
+            self.ttStart = (searcher.tt.probes, searcher.tt.hits)
+            self.patch(searcher, "evaluate", self.counted("evaluate", searcher.evaluate))
+            self.patch(searcher.tt, "probe", self.counted("ttProbe", searcher.tt.probe))
+            self.patch(searcher, "negamax", self.countedNegamax(searcher.negamax))
+            self.patch(searcher, "quiescence", self.countedQuiescence(searcher.quiescence))
+            self.patch(searcher, "searchRoot", self.countedRoot(searcher.searchRoot))
+        return self
+
+    '''
+    Put back every wrapped method, the counts are kept
+    '''
+    def detach(self):
+        if self.searcher is not None:
+            tt = self.searcher.tt
+            self.ttProbes = tt.probes - self.ttStart[0]
+            self.ttHits = tt.hits - self.ttStart[1]
+        for target, name, original in reversed(self.patched):
+            if original is None:
+                delattr(target, name)
+            else:
+                setattr(target, name, original)
+        self.patched = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.detach()
+
+    '''
+    Nodes by ply, and at every node that searched moves: how many, and whether the first one already cut off
+    '''
+    def countedNegamax(self, negamax):
+        plyNodes = self.plyNodes
+        children = [0] #moves searched at every ply of the current line
+        def wrapper(gs, depth, alpha, beta, ply):
+            while len(plyNodes) <= ply:
+                plyNodes.append(0)
+            while len(children) <= ply:
+                children.append(0)
+            plyNodes[ply] += 1
+            children[ply - 1] += 1
+            children[ply] = 0
+            score = wrapper.negamax(gs, depth, alpha, beta, ply)
+            searched = children[ply]
+            if searched:
+                self.expanded += 1
+                self.movesSearched += searched
+                if score >= beta:
+                    self.cutoffs += 1
+                    if searched == 1:
+                        self.firstMoveCutoffs += 1
+            return score
+        wrapper.negamax = self.counted("negamax", negamax)
+        return wrapper
+
+    def countedQuiescence(self, quiescence):
+        plyNodes = self.quiescencePlyNodes
+        def wrapper(gs, alpha, beta, ply):
+            while len(plyNodes) <= ply:
+                plyNodes.append(0)
+            plyNodes[ply] += 1
+            return quiescence(gs, alpha, beta, ply)
+        return wrapper
+
+    '''
+    Nodes of every iteration of the iterative deepening
+    '''
+    def countedRoot(self, searchRoot):
+        def wrapper(gs, rootMoves, depth):
+            start = self.searcher.nodes
+            try:
+                return searchRoot(gs, rootMoves, depth)
+            finally:
+                self.iterations.append((depth, self.searcher.nodes - start))
+        return wrapper
+
+    '''
+    Everything counted as a dict ready for JSON
+    '''
+    def toDict(self):
+        stats = {"calls": dict(self.calls)}
+        if self.timing:
+            stats["seconds"] = {name: round(seconds, 6) for name, seconds in self.seconds.items()}
+        if self.searcher is not None:
+            if self.patched: #still attached
+                probes = self.searcher.tt.probes - self.ttStart[0]
+                hits = self.searcher.tt.hits - self.ttStart[1]
+            else:
+                probes, hits = self.ttProbes, self.ttHits
+            nodes = [nodes for depth, nodes in self.iterations]
+            stats["tt"] = {"probes": probes, "hits": hits, "hitRate": round(hits / probes, 4) if probes else 0.0}
+            stats["search"] = {
+                "plyNodes": list(self.plyNodes), "quiescencePlyNodes": list(self.quiescencePlyNodes),
+                "iterations": [{"depth": depth, "nodes": nodes} for depth, nodes in self.iterations],
+                #nodes of an iteration over the nodes of the one before
+                "branchingFactor": [round(nodes[i] / nodes[i - 1], 3) for i in range(1, len(nodes)) if nodes[i - 1]],
+                "averageMovesSearched": round(self.movesSearched / self.expanded, 3) if self.expanded else 0.0,
+                "cutoffs": self.cutoffs, "firstMoveCutoffs": self.firstMoveCutoffs,
+                "firstMoveCutoffRate": round(self.firstMoveCutoffs / self.cutoffs, 4) if self.cutoffs else 0.0}
+        return stats
+
+    def saveJson(self, path):
+        with open(path, "w") as file:
+            json.dump(self.toDict(), file, indent = 2)
+
+'''
+Run searcher.search(gs, ...) under cProfile. The raw profile goes to path (for pstats or a viewer) and a
+report of the top functions by sortBy to path + ".txt". Returns the SearchResult
+'''
+def profileSearch(searcher, gs, path, *args, sortBy = "cumulative", limit = 40, **kwargs):
+    profiler = cProfile.Profile()
+    result = profiler.runcall(searcher.search, gs, *args, **kwargs)
+    profiler.dump_stats(path)
+    with open(path + ".txt", "w") as file:
+        pstats.Stats(profiler, stream = file).sort_stats(sortBy).print_stats(limit)
+    return result
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = "Search a position with the engine instrumented")
+    parser.add_argument("--fen", help = "position to search (default: the starting position)")
+    parser.add_argument("--depth", type = int, default = 5)
+    parser.add_argument("--backend", default = "bitboard", choices = ("list", "bitboard"))
+    parser.add_argument("--hash", type = int, default = 16, help = "transposition table size in MB")
+    parser.add_argument("--timing", action = "store_true", help = "also time every counted call (slower)")
+    parser.add_argument("--json", help = "save the stats to this file")
+    parser.add_argument("--profile", help = "run the search under cProfile instead and save the profile to this file")
+    args = parser.parse_args(argv)
+
+    gs = EngineChess.GameState(args.backend, fen = args.fen)
+    searcher = Searcher(hashMB = args.hash)
+    if args.profile:
+        result = profileSearch(searcher, gs, args.profile, args.depth)
+        print("depth %d score %d nodes %d in %.2fs, profile saved to %s" % (result.depth, result.score,
+              result.nodes, result.seconds, args.profile))
+        return 0
+    with EngineStats(args.timing).attach(gs, searcher) as stats:
+        result = searcher.search(gs, args.depth)
+    report = stats.toDict()
+    print("depth %d score %d nodes %d in %.2fs, pv %s" % (result.depth, result.score, result.nodes, result.seconds,
+          result.getPvNotation()))
+    for name, calls in sorted(report["calls"].items(), key = lambda item: -item[1]):
+        seconds = report.get("seconds", {}).get(name)
+        print("%-22s %10d calls%s" % (name, calls, "  %8.3fs" % seconds if seconds is not None else ""))
+    search = report["search"]
+    print("tt hit rate %.1f%%, first move cutoffs %.1f%%, moves searched per node %.2f, branching %s" % (
+          100 * report["tt"]["hitRate"], 100 * search["firstMoveCutoffRate"], search["averageMovesSearched"],
+          search["branchingFactor"]))
+    if args.json:
+        stats.saveJson(args.json)
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,171 @@
+"""
+Load generator for the ServerChess analysis server: client connections each play several games at once
+through the server (legal moves, a move, now and then an evaluation or a short search) and the throughput and
+latency of every op are reported. From the Chess Game folder:
+    python -m LoadChess --port 8765 --clients 8 --sessions 4 --seconds 10
+    python -m LoadChess --spawn --workers 2 --seconds 5     (starts a server of its own)
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import signal
+import subprocess
+import sys
+import time
+
+class AnalysisClient():
+    def __init__(self):
+        self.ids = itertools.count(1)
+        self.waiting = {} #request id: future of its answer
+        self.reader = None
+        self.writer = None
+
+    async def connect(self, host = "127.0.0.1", port = 8765, path = None):
+        if path is not None:
+            self.reader, self.writer = await asyncio.open_unix_connection(path)
+        else:
+            self.reader, self.writer = await asyncio.open_connection(host, port)
+        self.readTask = asyncio.ensure_future(self.readAnswers())
+        return self
+
+    async def readAnswers(self):
+        try:
+            while True:
+                line = await self.reader.readline()
+                if not line:
+                    break
+                answer = json.loads(line)
+                future = self.waiting.pop(answer.get("id"), None)
+                if future is not None and not future.done():
+                    future.set_result(answer)
+        finally:
+            for future in self.waiting.values():
+                if not future.done():
+                    future.set_exception(ConnectionError("server closed the connection"))
+            self.waiting.clear()
+
+    '''
+    Send a request and wait for its answer, searches of one client may be answered in any order
+    '''
+    async def request(self, op, **fields):
+        requestId = next(self.ids)
+        future = asyncio.get_running_loop().create_future()
+        self.waiting[requestId] = future
+        self.writer.write(json.dumps({"id": requestId, "op": op, **fields}).encode() + b"\n")
+        await self.writer.drain()
+        return await future
+
+    async def close(self):
+        self.writer.close()
+        await self.readTask
+
+class LoadStats():
+    def __init__(self):
+        self.latencies = {} #op: [seconds]
+        self.errors = {} #op: count
+
+    def add(self, op, seconds, answer):
+        self.latencies.setdefault(op, []).append(seconds)
+        if not answer.get("ok"):
+            self.errors[op] = self.errors.get(op, 0) + 1
+
+    '''
+    Latency below which a fraction of the requests of op were answered
+    '''
+    def percentile(self, op, fraction):
+        latencies = sorted(self.latencies[op])
+        return latencies[min(len(latencies) - 1, int(fraction * len(latencies)))]
+
+    def report(self, seconds):
+        total = sum(len(latencies) for latencies in self.latencies.values())
+        lines = ["%d requests in %.2fs, %.0f req/s" % (total, seconds, total / seconds)]
+        for op in sorted(self.latencies):
+            lines.append("%-9s %8d  %8.0f req/s  p50 %7.2f ms  p99 %7.2f ms  errors %d" % (op, len(self.latencies[op]),
+                         len(self.latencies[op]) / seconds, 1000 * self.percentile(op, 0.5),
+                         1000 * self.percentile(op, 0.99), self.errors.get(op, 0)))
+        return "\n".join(lines)
+
+async def timedRequest(client, stats, op, **fields):
+    start = time.perf_counter()
+    answer = await client.request(op, **fields)
+    stats.add(op, time.perf_counter() - start, answer)
+    return answer
+
+'''
+Play games through one session until the end time: every ply asks for the legal moves, plays a random one or,
+every searchEvery plies, the server's best move, and evaluates with probability evaluateRate
+'''
+async def playGames(client, stats, endTime, rng, searchEvery = 10, searchTime = 0.05, evaluateRate = 0.2, maxPlies = 80):
+    while time.perf_counter() < endTime:
+        sessionId = (await timedRequest(client, stats, "new"))["session"]
+        for ply in range(maxPlies):
+            if time.perf_counter() >= endTime:
+                break
+            legal = await timedRequest(client, stats, "legal", session = sessionId)
+            if not legal.get("moves"):
+                break
+            if rng.random() < evaluateRate:
+                await timedRequest(client, stats, "evaluate", session = sessionId)
+            move = rng.choice(legal["moves"])
+            if searchEvery and ply % searchEvery == searchEvery - 1:
+                best = await timedRequest(client, stats, "best", session = sessionId, time = searchTime)
+                if best.get("ok"):
+                    move = best["move"]
+            await timedRequest(client, stats, "move", session = sessionId, move = move)
+        await timedRequest(client, stats, "close", session = sessionId)
+
+async def runLoad(args):
+    stats = LoadStats()
+    clients = [await AnalysisClient().connect(args.host, args.port, args.unix) for _ in range(args.clients)]
+    rng = random.Random(args.seed)
+    start = time.perf_counter()
+    endTime = start + args.seconds
+    await asyncio.gather(*[playGames(client, stats, endTime, random.Random(rng.random()), args.search_every,
+                                     args.search_time) for client in clients for _ in range(args.sessions)])
+    elapsed = time.perf_counter() - start
+    print(stats.report(elapsed))
+    serverStats = await clients[0].request("stats")
+    print("server: %d batches, %.2f requests per batch" % (serverStats["batches"], serverStats["averageBatch"]))
+    for client in clients:
+        await client.close()
+
+'''
+Start a server process and wait until it listens
+'''
+def spawnServer(args):
+    command = [sys.executable, "-m", "ServerChess", "--workers", str(args.workers)]
+    command += ["--unix", args.unix] if args.unix else ["--host", args.host, "--port", str(args.port)]
+    server = subprocess.Popen(command, stdout = subprocess.PIPE, text = True)
+    server.stdout.readline() #"listening on ..."
+    return server
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = "Load test a ServerChess analysis server")
+    parser.add_argument("--host", default = "127.0.0.1")
+    parser.add_argument("--port", type = int, default = 8765)
+    parser.add_argument("--unix", help = "connect to this Unix socket path instead of TCP")
+    parser.add_argument("--clients", type = int, default = 8, help = "connections")
+    parser.add_argument("--sessions", type = int, default = 4, help = "games played at once by every connection")
+    parser.add_argument("--seconds", type = float, default = 10.0)
+    parser.add_argument("--search-every", type = int, default = 10, help = "plies between two best move requests, 0 for none")
+    parser.add_argument("--search-time", type = float, default = 0.05, help = "time of a best move request in seconds")
+    parser.add_argument("--seed", type = int, default = 1)
+    parser.add_argument("--spawn", action = "store_true", help = "start a server for the test")
+    parser.add_argument("--workers", type = int, default = 2, help = "engine processes of the spawned server")
+    args = parser.parse_args(argv)
+    server = spawnServer(args) if args.spawn else None
+    try:
+        asyncio.run(runLoad(args))
+    finally:
+        if server is not None:
+            server.send_signal(signal.SIGINT) #the server closes its engine processes on an interrupt
+            try:
+                server.wait(5)
+            except subprocess.TimeoutExpired:
+                server.kill()
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
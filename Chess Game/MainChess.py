@@ -2,14 +2,21 @@
 This is our main driver.
 It will be responsible of handling user input and displaying the current GameState object
 """
+import os
 import pygame as p
 import EngineChess
+import WorkerChess
 
 WIDTH = HEIGHT = 512 
 DIMENSION = 8 #Dimension of chess board are 8x8
 SQ_SIZE = HEIGHT // DIMENSION
 MAX_FPS = 15 #For animation later on
 IMAGES = {}
+AI_THINK_TIME = 2.0 #seconds the computer may think about a move
+PONDER = True #the computer keeps thinking on the player's time about the reply it expects
+BOOK_PATH = "book.bin" #opening book used when the file exists, build it with: python -m BookChess games.pgn book.bin
+TABLEBASE_PATH = "tablebases" #endgame tables used when the folder exists, build them with: python -m TablebaseChess tablebases
+TABLEBASE_PIECES = 3 #positions with this many pieces or less are looked up instead of searched
 
 """
 Initialize a global dictionary of images.
@@ -30,22 +37,35 @@ def main():
     p.init()
     screen = p.display.set_mode((WIDTH,HEIGHT))
     time = p.time.Clock()
-    screen.fill(p.Color("white"))
     gs = EngineChess.GameState()
     validMoves = gs.getValidMoves()
     moveMade = False #flag variable for when a move is made
     animate = False #flag variable for when we should animate a move
     loadImages() #only do this once, before the while loop.
+    renderer = BoardRenderer()
+    idle = False #True when nothing can change until the user does something
     running = True
     sqSelected = () #no square is selected, keep the track of the last click of the user (row,col)
     playerClicks = [] #Keep track the player clicks
     gameOver = False
+    playerOne = True #True if a human is playing white, False if the computer plays it
+    playerTwo = False #Same for black
+    #the computer thinks in another process, the loop never waits for it
+    engine = WorkerChess.EngineWorker(bookPath = BOOK_PATH if os.path.exists(BOOK_PATH) else None,
+                                      tablebasePath = TABLEBASE_PATH if os.path.isdir(TABLEBASE_PATH) else None,
+                                      tablebasePieces = TABLEBASE_PIECES)
     while running:
-        for e in p.event.get():
+        humanTurn = (gs.whiteToMove and playerOne) or (not gs.whiteToMove and playerTwo)
+        events = p.event.get()
+        if not events and idle:
+            events = [p.event.wait()] #sleep until the next event instead of redrawing a still position
+        for e in events:
             if e.type == p.QUIT:
                 running = False
+            elif e.type == p.VIDEOEXPOSE: #the window was covered, its content is lost
+                renderer.invalidate()
             elif e.type == p.MOUSEBUTTONDOWN:
-                if not gameOver:
+                if not gameOver and humanTurn:
                     location = p.mouse.get_pos() #(x,y) location of mouse
                     col = location[0] // SQ_SIZE
                     row = location[1] // SQ_SIZE
@@ -57,27 +77,28 @@ def main():
                         playerClicks.append(sqSelected) #Append both 1st and 2nd click
                     if len(playerClicks) == 2 : #After 2nd click
                         move = EngineChess.Move(playerClicks[0],playerClicks[1],gs.board)
+                        #Pawn Promotion, there is one valid move per piece so choose it before looking the move up
+                        if move.isPromotionPawn and move in validMoves:
+                            print("Entrez q for Queen")
+                            print("Entrez r for Rook")
+                            print("Entrez b for Bishop")
+                            print("Entrez k for Knight")
+                            promotion = ""
+                            while promotion != "Q" and promotion != "R" and promotion != "B" and promotion != "N":
+                                promotion = input("").upper()
+                            move = EngineChess.Move(playerClicks[0],playerClicks[1],gs.board,promotionChoice = promotion)
                         for i in range(len(validMoves)):
                             if move == validMoves[i]:
                                 gs.makeMove(validMoves[i])
                                 moveMade = True
                                 animate = True
-                                #Pawn Promotion
-                                if move.isPromotionPawn:
-                                    print("Entrez q for Queen")
-                                    print("Entrez r for Rook")
-                                    print("Entrez b for Bishop")
-                                    print("Entrez k for Knight")
-                                    promotion = ""
-                                    while promotion != "Q" and promotion != "R" and promotion != "B" and promotion != "N":
-                                        promotion = input("").upper()
-                                    gs.board[validMoves[i].endRow][validMoves[i].endCol] = validMoves[i].pieceMoved[0] + promotion
                                 sqSelected = ()
                                 playerClicks = []
                         if not moveMade:
                                 playerClicks = [sqSelected]
             elif e.type == p.KEYDOWN:
                 if e.key == p.K_z: #when pressed z undo Move
+                    engine.cancel() #the position the engine is thinking about is gone
                     gs.undoMove()
                     sqSelected = ()
                     playerClicks = []
@@ -87,6 +108,7 @@ def main():
                         gameOver = False
 
                 if e.key == p.K_r: #reset the board when 'r' is pressed
+                    engine.cancel()
                     gs = EngineChess.GameState()
                     validMoves = gs.getValidMoves()
                     moveMade = False #flag variable for when a move is made
@@ -94,110 +116,159 @@ def main():
                     sqSelected = () #no square is selected, keep the track of the last click of the user (row,col)
                     playerClicks = [] #Keep track the player clicks
         
+        #Computer move, started once and then checked every frame
+        if not gameOver and not humanTurn and not moveMade:
+            if not engine.thinking:
+                engine.think(gs, AI_THINK_TIME)
+            result = engine.poll()
+            if result is not None and result.bestMove is not None:
+                gs.makeMove(result.bestMove)
+                moveMade = True
+                animate = True
+                humanNext = (gs.whiteToMove and playerOne) or (not gs.whiteToMove and playerTwo)
+                if PONDER and humanNext and len(result.pv) > 1:
+                    engine.ponder(gs, result.pv[1])
+
         if moveMade:
             if animate:
-                animateMove(gs.moveLog[-1],screen,gs.board,time)
+                animateMove(gs.moveLog[-1],screen,gs.board,time,renderer)
             validMoves = gs.getValidMoves()
             moveMade = False
             animate = False
-        drawGameState(screen,gs, validMoves, sqSelected)
-        
+
+        text = None
         if gs.checkMate:
             gameOver = True
-            if gs.whiteToMove:
-                drawText(screen,'Black Wins by Checkmate')
-            else:
-                drawText(screen,'White Wins by Checkmate')
+            text = 'Black Wins by Checkmate' if gs.whiteToMove else 'White Wins by Checkmate'
         elif gs.staleMate:
             gameOver = True
-            drawText(screen,'StaleMate')
-
+            text = 'StaleMate'
+        #only the squares that changed since the last frame are drawn and sent to the screen
+        rects = renderer.draw(screen, gs.board, validMoves, sqSelected, gs.whiteToMove, text)
+        if rects:
+            p.display.update(rects)
+        #the computer's turn needs the loop running to pick up its move, otherwise wait for the user
+        idle = gameOver or (gs.whiteToMove and playerOne) or (not gs.whiteToMove and playerTwo)
         time.tick(MAX_FPS)
-        p.display.flip() #Update the full display Surface to the screen
+    engine.close()
 
 """
 Responsable for all the graphics within a current game state.
+The board squares are drawn once on a surface of their own, fonts and text are made once, and every frame
+only redraws the squares whose piece or highlight changed since the last one.
 """
-def drawGameState(screen,gs, validMoves, sqSelected):
-    drawBoard(screen) #draw squares on the board
-    highlightSquares(screen, gs, validMoves, sqSelected) #highlighting or move suggestions.
-    drawPieces(screen,gs.board) #draw pieces on top of the board
+class BoardRenderer():
+    def __init__(self):
+        #The top left square always white
+        colors = [p.Color("white"),p.Color("gray")]
+        self.boardSurface = p.Surface((WIDTH, HEIGHT))
+        for r in range(DIMENSION):
+            for c in range(DIMENSION):
+                p.draw.rect(self.boardSurface, colors[(r+c) % 2], p.Rect(c*SQ_SIZE,r*SQ_SIZE,SQ_SIZE,SQ_SIZE))
+        self.highlights = {}
+        for kind, color in (("selected", "blue"), ("target", "yellow")):
+            s = p.Surface((SQ_SIZE,SQ_SIZE))
+            s.set_alpha(100) #Transperancy value -> 0 transparent; 255 opaque
+            s.fill(p.Color(color))
+            self.highlights[kind] = s
+        self.font = p.font.SysFont('Helvitca', 32, True, False)
+        self.textSurfaces = {} #text: (shadow, text, location)
+        self.invalidate()
 
-"""
-Draw the squares on the board.
-The top left square always white.
-"""
-def drawBoard(screen):
-    global colors
-    colors = [p.Color("white"),p.Color("gray")]
-    for r in range(DIMENSION):
-        for c in range(DIMENSION):
-            color = colors[((r+c) % 2)] #it will pick the color based on the result 0 for white and 1 for gray
-            p.draw.rect(screen,color,p.Rect(c*SQ_SIZE,r*SQ_SIZE,SQ_SIZE,SQ_SIZE))
+    '''
+    Forget what is on the screen, the next draw redraws everything
+    '''
+    def invalidate(self):
+        self.drawn = [None] * (DIMENSION * DIMENSION) #(piece, highlight) on every square of the screen
+        self.text = None
+        self.textRect = None #area the text covers
 
+    def squareRect(self, sq):
+        return p.Rect(sq % DIMENSION * SQ_SIZE, sq // DIMENSION * SQ_SIZE, SQ_SIZE, SQ_SIZE)
 
-"""
-Draw the pieces on the board using the state GameCurrent.board
-"""
-def drawPieces(screen,board):
-    for r in range(DIMENSION):
-        for c in range(DIMENSION):
-            piece = board[r][c]
-            if piece != "--":
-                 # blit stands for Block Transfer—and it's going to copy the contents of one Surface onto another Surface .
-                 screen.blit(IMAGES[piece],p.Rect(c*SQ_SIZE,r*SQ_SIZE,SQ_SIZE,SQ_SIZE))
+    '''
+    Squares (row*8 + col) a screen rectangle covers
+    '''
+    def squaresUnder(self, rect):
+        rows = range(max(rect.top // SQ_SIZE, 0), min((rect.bottom - 1) // SQ_SIZE, DIMENSION - 1) + 1)
+        cols = range(max(rect.left // SQ_SIZE, 0), min((rect.right - 1) // SQ_SIZE, DIMENSION - 1) + 1)
+        return [r * DIMENSION + c for r in rows for c in cols]
 
-'''
-Highlight square selected and moves for piece selected
-'''
-def highlightSquares(screen, gs, validMoves, sqSelected):
-    if sqSelected != ():
-        r,c = sqSelected
-        if gs.board[r][c][0] == ("w" if gs.whiteToMove else "b"): #Making sure that sqSelected is a piece that can be moved
-            #Highlight selected square
-            s = p.Surface((SQ_SIZE,SQ_SIZE))
-            s.set_alpha(100) #Transperancy value -> 0 transparent; 255 opaque
-            s.fill(p.Color('blue'))
-            screen.blit(s,(c*SQ_SIZE,r*SQ_SIZE))
-            #Highlight moves from that square
-            s.fill(p.Color('yellow'))
-            for move in validMoves:
-                if move.startRow == r and move.startCol == c:
-                    screen.blit(s,(move.endCol*SQ_SIZE, move.endRow*SQ_SIZE))
+    def getText(self, text):
+        surfaces = self.textSurfaces.get(text)
+        if surfaces is None:
+            shadow = self.font.render(text, 2, p.Color('Gray'))
+            textLocation = p.Rect(0, 0, WIDTH, HEIGHT).move(WIDTH/2 - shadow.get_width()/2, HEIGHT/2 - shadow.get_height()/2)
+            front = self.font.render(text, 0, p.Color('Black'))
+            surfaces = self.textSurfaces[text] = (shadow, front, textLocation)
+        return surfaces
+
+    '''
+    Bring the screen up to board (highlighting the selected square and its moves) and text in the middle.
+    Returns the rectangles that changed, the ones to pass to p.display.update
+    '''
+    def draw(self, screen, board, validMoves = (), sqSelected = (), whiteToMove = True, text = None):
+        highlights = {}
+        if sqSelected != ():
+            r,c = sqSelected
+            if board[r][c][0] == ("w" if whiteToMove else "b"): #Making sure that sqSelected is a piece that can be moved
+                highlights[r * DIMENSION + c] = "selected"
+                for move in validMoves:
+                    if move.startRow == r and move.startCol == c:
+                        highlights[move.endRow * DIMENSION + move.endCol] = "target"
+        wanted = [(board[sq // DIMENSION][sq % DIMENSION], highlights.get(sq)) for sq in range(DIMENSION * DIMENSION)]
+        dirty = {sq for sq in range(DIMENSION * DIMENSION) if wanted[sq] != self.drawn[sq]}
+        textRect = self.getText(text)[2].inflate(2, 2).move(1, 1) if text else None #with the offset front text
+        #the text sits on top of the squares, it is redrawn whenever one of them is
+        if text != self.text or (textRect is not None and dirty.intersection(self.squaresUnder(textRect))):
+            for rect in (self.textRect, textRect):
+                if rect is not None:
+                    dirty.update(self.squaresUnder(rect))
+        rects = []
+        for sq in dirty:
+            rect = self.squareRect(sq)
+            piece, highlight = wanted[sq]
+            screen.blit(self.boardSurface, rect, rect)
+            if highlight is not None:
+                screen.blit(self.highlights[highlight], rect)
+            if piece != "--":
+                # blit stands for Block Transfer—and it's going to copy the contents of one Surface onto another Surface .
+                screen.blit(IMAGES[piece], rect)
+            self.drawn[sq] = wanted[sq]
+            rects.append(rect)
+        if text and dirty:
+            shadow, front, textLocation = self.getText(text)
+            screen.blit(shadow, textLocation)
+            screen.blit(front, textLocation.move(2, 2))
+        self.text, self.textRect = text, textRect
+        return rects
 
 '''
-Animating a move
+Animating a move: the board is drawn once without the moving piece, then every frame only puts back the
+background under the piece's last position and draws it at the new one
 '''
-def animateMove(move, screen, board, clock):
-    global colors
-    coords = [] #list of coords that animation will move through
+def animateMove(move, screen, board, clock, renderer):
     dR = move.endRow - move.startRow
     dC = move.endCol - move.startCol
     framesPerSquare = 10 #frames to move one square
     frameCount = (abs(dR) + abs(dC)) * framesPerSquare
+    #the end square still shows the captured piece until the moving one gets there
+    still = [row[:] for row in board]
+    still[move.endRow][move.endCol] = move.pieceCaptured if not move.isEnPassantMove else "--"
+    p.display.update(renderer.draw(screen, still))
+    background = screen.copy()
+    previous = None
     for frame in range(frameCount + 1):
         r,c = (move.startRow + dR*frame/frameCount, move.startCol + dC*frame/frameCount)
-        drawBoard(screen)
-        drawPieces(screen, board)
-        #erase the piece moved from its ending square
-        color = colors[(move.endRow + move.endCol) % 2]
-        endSquare = p.Rect(move.endCol*SQ_SIZE, move.endRow*SQ_SIZE,SQ_SIZE,SQ_SIZE)
-        p.draw.rect(screen, color, endSquare)
-        #draw captured piece into rectangle
-        if move.pieceCaptured != '--':
-            screen.blit(IMAGES[move.pieceCaptured], endSquare)
-        #draw moving piece
-        screen.blit(IMAGES[move.pieceMoved],p.Rect(c*SQ_SIZE, r*SQ_SIZE, SQ_SIZE, SQ_SIZE))
-        p.display.flip()
+        rect = p.Rect(c*SQ_SIZE, r*SQ_SIZE, SQ_SIZE, SQ_SIZE)
+        rects = [rect]
+        if previous is not None:
+            screen.blit(background, previous, previous) #erase the piece from its last position
+            rects.append(previous)
+        screen.blit(IMAGES[move.pieceMoved], rect)
+        p.display.update(rects)
+        previous = rect
         clock.tick(60)
 
-def drawText(screen, text):
-    font = p.font.SysFont('Helvitca', 32, True, False)
-    textObject = font.render(text, 2, p.Color('Gray'))
-    textLocation = p.Rect(0, 0, WIDTH, HEIGHT).move(WIDTH/2 - textObject.get_width()/2, HEIGHT/2 - textObject.get_height()/2)
-    screen.blit(textObject,textLocation)
-    textObject = font.render(text, 0, p.Color('Black'))
-    screen.blit(textObject,textLocation.move(2,2))
-
 if __name__ == "__main__":
     main()
\ No newline at end of file
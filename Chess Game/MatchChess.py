@@ -0,0 +1,287 @@
+"""
+Engine against engine matches without the GUI, to measure what a change is worth.
+Two engine configurations play every opening of a suite twice (once with each color) across a pool of
+worker processes. The workers stay alive for the whole match and keep one Searcher per configuration,
+so a game only costs its moves. Games are appended to a PGN file as they finish, and the Elo difference
+and SPRT (sequential probability ratio test) state are reported live. Run it from the Chess Game folder:
+    python -m MatchChess --engine new:time=0.1,hash=16 --engine old:time=0.1,qchecks=1 --games 200 --pgn match.pgn
+"""
+import argparse
+import math
+import multiprocessing
+import os
+import time
+
+import EngineChess
+from SearchChess import Searcher, MATE_BOUND
+from TranspositionChess import TranspositionTable
+from TablebaseChess import Tablebases
+from PgnChess import gameToPgn
+
+#Short openings (a few plies deep) giving both sides playable positions
+OPENINGS = [
+    "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1",
+    "rnbqkbnr/pppp1ppp/8/4p3/4P3/8/PPPP1PPP/RNBQKBNR w KQkq - 0 2",
+    "rnbqkbnr/pp1ppppp/8/2p5/4P3/8/PPPP1PPP/RNBQKBNR w KQkq - 0 2",
+    "rnbqkbnr/pppp1ppp/4p3/8/4P3/8/PPPP1PPP/RNBQKBNR w KQkq - 0 2",
+    "rnbqkbnr/pp1ppppp/2p5/8/4P3/8/PPPP1PPP/RNBQKBNR w KQkq - 0 2",
+    "rnbqkbnr/ppp1pppp/8/3p4/3P4/8/PPP1PPPP/RNBQKBNR w KQkq - 0 2",
+    "rnbqkb1r/pppppppp/5n2/8/3P4/8/PPP1PPPP/RNBQKBNR w KQkq - 1 2",
+    "rnbqkbnr/pppppppp/8/8/2P5/8/PP1PPPPP/RNBQKBNR b KQkq - 0 1",
+    "rnbqkbnr/pppppppp/8/8/8/5N2/PPPPPPPP/RNBQKB1R b KQkq - 1 1",
+    "r1bqkbnr/pppp1ppp/2n5/4p3/4P3/5N2/PPPP1PPP/RNBQKB1R w KQkq - 2 3",
+    "rnbqkb1r/pppp1ppp/5n2/4p3/4P3/2N5/PPPP1PPP/R1BQKBNR w KQkq - 2 3",
+    "rnbqkbnr/ppp2ppp/4p3/3p4/3PP3/8/PPP2PPP/RNBQKBNR w KQkq - 0 3",
+]
+
+#Limits and Searcher settings an engine configuration may set (--engine name:key=value,...)
+CONFIG_KEYS = {"time": float, "depth": int, "nodes": int, "hash": int, "qchecks": int, "tablebases": str}
+
+'''
+Parse "name:key=value,key=value" into a configuration dict
+'''
+def parseEngine(text):
+    name, _, settings = text.partition(":")
+    config = {"name": name, "time": None, "depth": 64, "nodes": None, "hash": 16, "qchecks": 0, "tablebases": ""}
+    for setting in filter(None, settings.split(",")):
+        key, _, value = setting.partition("=")
+        if key not in CONFIG_KEYS:
+            raise ValueError("unknown engine setting " + key)
+        config[key] = CONFIG_KEYS[key](value)
+    if config["time"] is None and config["depth"] == 64 and config["nodes"] is None:
+        config["time"] = 0.1 #some limit is needed
+    return config
+
+'''
+Openings from a file with one FEN (or EPD) per line, the default suite otherwise
+'''
+def loadOpenings(path = None):
+    if path is None:
+        return list(OPENINGS)
+    openings = []
+    with open(path) as file:
+        for line in file:
+            fields = line.split()
+            if len(fields) >= 4:
+                openings.append(" ".join(fields[:6]) if len(fields) >= 6 and fields[4].isdigit() else " ".join(fields[:4]) + " 0 1")
+    return openings
+
+'''
+True when neither side can mate: bare kings, or one minor piece
+'''
+def insufficientMaterial(gs):
+    if gs.pieceCount > 3:
+        return False
+    return all(piece[1] in "KBN" for row in gs.board for piece in row if piece != "--")
+
+#Searchers of a worker process by configuration name, kept between games
+_searchers = {}
+
+def searcherFor(config):
+    searcher = _searchers.get(config["name"])
+    if searcher is None:
+        tablebases = Tablebases(config["tablebases"]) if config["tablebases"] else None
+        searcher = Searcher(tt = TranspositionTable(config["hash"]), quiescenceChecks = bool(config["qchecks"]),
+                            tablebases = tablebases)
+        _searchers[config["name"]] = searcher
+    return searcher
+
+'''
+Play one game in a worker process. Returns a dict with the game's PGN and its result from the first engine's view
+adjudication: resignScore/resignMoves (both engines agree one side is lost), drawScore/drawMoves/drawPly
+(both engines see a dead draw after drawPly), maxPlies
+'''
+def playGame(task):
+    gameIndex, fen, configs, firstIsWhite, adjudication = task
+    white, black = configs if firstIsWhite else configs[::-1]
+    gs = EngineChess.GameState("bitboard", fen = fen)
+    startWhiteToMove = gs.whiteToMove
+    startMoveNumber = int(fen.split()[5]) if len(fen.split()) > 5 else 1
+    for config in configs:
+        searcherFor(config).tt.clear()
+    sanMoves = []
+    scores = [] #score of every move from white's point of view
+    nodes = 0
+    startTime = time.perf_counter()
+    result, termination = "*", "unterminated"
+    while True:
+        moves = gs.getValidMoves()
+        if not moves:
+            result, termination = ("0-1" if gs.whiteToMove else "1-0", "checkmate") if gs.inCheck else ("1/2-1/2", "stalemate")
+            break
+        if gs.repetitions() >= 2:
+            result, termination = "1/2-1/2", "threefold repetition"
+            break
+        if gs.halfmoveClock >= 100:
+            result, termination = "1/2-1/2", "fifty move rule"
+            break
+        if insufficientMaterial(gs):
+            result, termination = "1/2-1/2", "insufficient material"
+            break
+        if len(sanMoves) >= adjudication["maxPlies"]:
+            result, termination = "1/2-1/2", "max plies adjudication"
+            break
+        config = white if gs.whiteToMove else black
+        search = searcherFor(config).search(gs, config["depth"], config["nodes"], config["time"])
+        move = search.bestMove
+        nodes += search.nodes
+        scores.append(search.score if gs.whiteToMove else -search.score)
+        sanMoves.append(move.getSan(gs, moves))
+        gs.makeMove(move)
+        #adjudication looks at the last moves of both engines
+        last = scores[-2 * adjudication["resignMoves"]:]
+        if len(last) == 2 * adjudication["resignMoves"]:
+            if all(score >= adjudication["resignScore"] for score in last):
+                result, termination = "1-0", "resign adjudication"
+                break
+            if all(score <= -adjudication["resignScore"] for score in last):
+                result, termination = "0-1", "resign adjudication"
+                break
+        last = scores[-2 * adjudication["drawMoves"]:]
+        if len(sanMoves) >= adjudication["drawPly"] and len(last) == 2 * adjudication["drawMoves"] \
+                and all(abs(score) <= adjudication["drawScore"] and abs(score) < MATE_BOUND for score in last):
+            result, termination = "1/2-1/2", "draw adjudication"
+            break
+    tags = {"Event": "Engine match", "Site": "MatchChess", "Date": time.strftime("%Y.%m.%d"), "Round": gameIndex + 1,
+            "White": white["name"], "Black": black["name"], "Result": result}
+    if fen != OPENINGS[0]:
+        tags["SetUp"] = "1"
+        tags["FEN"] = fen
+    tags["PlyCount"] = len(sanMoves)
+    tags["Termination"] = termination
+    points = {"1-0": 1.0, "0-1": 0.0, "1/2-1/2": 0.5}.get(result, 0.5)
+    return {"index": gameIndex, "pgn": gameToPgn(tags, sanMoves, result, startWhiteToMove, startMoveNumber),
+            "score": points if firstIsWhite else 1.0 - points, "plies": len(sanMoves), "nodes": nodes,
+            "seconds": time.perf_counter() - startTime}
+
+'''
+Elo difference of a match score (0..1)
+'''
+def eloFromScore(score):
+    score = min(max(score, 1e-6), 1 - 1e-6)
+    return -400 * math.log10(1 / score - 1)
+
+'''
+Match statistics of the first engine: wins, draws, losses, Elo with its 95% interval, and the SPRT log likelihood
+ratio of elo1 against elo0 (normal approximation of the game results)
+'''
+class MatchStats():
+    def __init__(self, elo0 = 0.0, elo1 = 5.0, alpha = 0.05, beta = 0.05):
+        self.wins = self.draws = self.losses = 0
+        self.elo0, self.elo1 = elo0, elo1
+        self.lowerBound = math.log(beta / (1 - alpha)) #accept H0 (no gain of elo1) below
+        self.upperBound = math.log((1 - beta) / alpha) #accept H1 above
+
+    def add(self, score):
+        if score == 1.0:
+            self.wins += 1
+        elif score == 0.0:
+            self.losses += 1
+        else:
+            self.draws += 1
+
+    def games(self):
+        return self.wins + self.draws + self.losses
+
+    def score(self):
+        return (self.wins + 0.5 * self.draws) / self.games() if self.games() else 0.5
+
+    def variance(self):
+        score = self.score()
+        games = self.games()
+        if not games:
+            return 0.0
+        return (self.wins * (1 - score) ** 2 + self.draws * (0.5 - score) ** 2 + self.losses * score ** 2) / games
+
+    def elo(self):
+        games = self.games()
+        score = self.score()
+        margin = 1.96 * math.sqrt(self.variance() / games) if games else 0.0
+        return eloFromScore(score), eloFromScore(score - margin), eloFromScore(score + margin)
+
+    def llr(self):
+        variance = self.variance()
+        if not variance:
+            return 0.0
+        score0 = 1 / (1 + 10 ** (-self.elo0 / 400))
+        score1 = 1 / (1 + 10 ** (-self.elo1 / 400))
+        return self.games() * (score1 - score0) * (2 * self.score() - score0 - score1) / (2 * variance)
+
+    '''
+    "H1" when the first engine is at least elo1 stronger, "H0" when it is not, None while the test goes on
+    '''
+    def sprt(self):
+        llr = self.llr()
+        if llr >= self.upperBound:
+            return "H1"
+        if llr <= self.lowerBound:
+            return "H0"
+        return None
+
+    def report(self):
+        elo, low, high = self.elo()
+        return "games %d  +%d =%d -%d  score %.3f  elo %+.1f [%+.1f, %+.1f]  llr %.2f [%.2f, %.2f]" % (self.games(),
+               self.wins, self.draws, self.losses, self.score(), elo, low, high, self.llr(), self.lowerBound, self.upperBound)
+
+'''
+Play games games (pairs of every opening, colors swapped) between configs[0] and configs[1] on workers processes.
+Every finished game is appended to pgnPath, report gets a line of statistics per game.
+With sprt the match stops as soon as the test decides. Returns the MatchStats
+'''
+def runMatch(configs, games, workers = None, openings = None, pgnPath = None, adjudication = None, sprt = False,
+             elo0 = 0.0, elo1 = 5.0, report = print):
+    openings = openings or list(OPENINGS)
+    settings = {"resignScore": 1000, "resignMoves": 3, "drawScore": 10, "drawMoves": 8, "drawPly": 80, "maxPlies": 400}
+    settings.update(adjudication or {})
+    tasks = [(i, openings[(i // 2) % len(openings)], configs, i % 2 == 0, settings) for i in range(games)]
+    stats = MatchStats(elo0, elo1)
+    startTime = time.perf_counter()
+    nodes = 0
+    pgnFile = open(pgnPath, "a") if pgnPath else None
+    pool = multiprocessing.Pool(workers or os.cpu_count() or 1)
+    try:
+        for game in pool.imap_unordered(playGame, tasks):
+            stats.add(game["score"])
+            nodes += game["nodes"]
+            if pgnFile is not None:
+                pgnFile.write(game["pgn"])
+                pgnFile.flush()
+            if report is not None:
+                seconds = time.perf_counter() - startTime
+                report("%s  %.2f games/s  %d nps" % (stats.report(), stats.games() / seconds, nodes / seconds))
+            if sprt and stats.sprt() is not None:
+                if report is not None:
+                    report("SPRT: %s accepted" % stats.sprt())
+                break
+    finally:
+        pool.terminate()
+        pool.join()
+        if pgnFile is not None:
+            pgnFile.close()
+    return stats
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = "Engine against engine match")
+    parser.add_argument("--engine", action = "append", required = True,
+                        help = "name:key=value,... with keys time (seconds per move), depth, nodes, hash, qchecks, tablebases; give it twice")
+    parser.add_argument("--games", type = int, default = 100)
+    parser.add_argument("--workers", type = int, help = "worker processes (default: one per core)")
+    parser.add_argument("--openings", help = "file with one FEN or EPD per line")
+    parser.add_argument("--pgn", help = "append the games to this file")
+    parser.add_argument("--max-plies", type = int, default = 400)
+    parser.add_argument("--sprt", action = "store_true", help = "stop when the SPRT decides")
+    parser.add_argument("--elo0", type = float, default = 0.0)
+    parser.add_argument("--elo1", type = float, default = 5.0)
+    args = parser.parse_args(argv)
+    if len(args.engine) != 2:
+        parser.error("give exactly two --engine")
+    configs = [parseEngine(text) for text in args.engine]
+    if configs[0]["name"] == configs[1]["name"]:
+        configs[1]["name"] += "2"
+    stats = runMatch(configs, args.games, args.workers, loadOpenings(args.openings), args.pgn,
+                     {"maxPlies": args.max_plies}, args.sprt, args.elo0, args.elo1)
+    print(stats.report())
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
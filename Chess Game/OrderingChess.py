@@ -0,0 +1,101 @@
+"""
+Move ordering for the search. Alpha-beta only gets close to its best case when the best move of a node is tried first,
+so moves are sorted by: the transposition table move, captures by MVV-LVA (most valuable victim, least valuable attacker),
+promotions, the killer moves of the ply, then quiet moves by their history score.
+stagedMoves gives the same order from GameState.getStagedMoves, which only generates the quiet moves when
+the search gets to them.
+"""
+
+PIECE_ORDER = {"p": 1, "N": 2, "B": 3, "R": 4, "Q": 5, "K": 6}
+MAX_PLY = 128
+
+HASH_MOVE_SCORE = 1 << 30
+CAPTURE_SCORE = 1 << 28
+KILLER_SCORES = (1 << 27, (1 << 27) - 1) #first and second killer of the ply
+HISTORY_MAX = 1 << 26 #history scores stay below the killers
+
+'''
+From/to key of a move, the low 12 bits of moveID (0..4095)
+'''
+def fromTo(move):
+    return move.moveID & 0xFFF
+
+'''
+MVV-LVA score of a capture: the victim counts first, a cheaper attacker breaks ties
+'''
+def mvvLva(move):
+    return PIECE_ORDER[move.pieceCaptured[1]] * 8 - PIECE_ORDER[move.pieceMoved[1]]
+
+class MoveOrdering():
+    def __init__(self):
+        self.killers = [[None, None] for _ in range(MAX_PLY)] #moveIDs of quiet moves that caused a beta cutoff
+        self.history = [0] * 4096 #indexed by fromTo
+
+    '''
+    Killers belong to the positions of one search, the history is aged so it keeps adapting
+    '''
+    def newSearch(self):
+        for killers in self.killers:
+            killers[0] = killers[1] = None
+        self.history = [value // 2 for value in self.history]
+
+    def scoreMove(self, move, ply, hashMove):
+        if hashMove is not None and move.moveID == hashMove.moveID:
+            return HASH_MOVE_SCORE
+        if move.pieceCaptured != "--":
+            return CAPTURE_SCORE + mvvLva(move) + (PIECE_ORDER[move.promotionChoice] if move.isPromotionPawn else 0)
+        if move.isPromotionPawn:
+            return CAPTURE_SCORE + PIECE_ORDER[move.promotionChoice] - 8 #under the captures of a pawn
+        killers = self.killers[ply] if ply < MAX_PLY else (None, None)
+        if move.moveID == killers[0]:
+            return KILLER_SCORES[0]
+        if move.moveID == killers[1]:
+            return KILLER_SCORES[1]
+        return self.history[fromTo(move)]
+
+    '''
+    Score of a noisy move: captures by MVV-LVA plus the promotion piece, promotions without capture after them
+    '''
+    def noisyScore(self, move):
+        if move.pieceCaptured != "--":
+            return mvvLva(move) + (PIECE_ORDER[move.promotionChoice] if move.isPromotionPawn else 0)
+        return PIECE_ORDER[move.promotionChoice] - 8
+
+    def quietScore(self, move):
+        return self.history[move.moveID & 0xFFF]
+
+    '''
+    The legal moves of gs as a generator in the order of orderMoves, generated stage by stage
+    '''
+    def stagedMoves(self, gs, ply, hashMoveId = 0):
+        killers = self.killers[ply] if ply < MAX_PLY else ()
+        return gs.getStagedMoves(hashMoveId, killers, self.noisyScore, self.quietScore)
+
+    '''
+    Sort moves in place, best first
+    '''
+    def orderMoves(self, moves, ply, hashMove = None):
+        moves.sort(key = lambda move: self.scoreMove(move, ply, hashMove), reverse = True)
+        return moves
+
+    '''
+    Captures and promotions only (quiescence search), MVV-LVA order
+    '''
+    def orderCaptures(self, moves):
+        moves.sort(key = lambda move: (mvvLva(move) if move.pieceCaptured != "--" else 0)
+                   + (PIECE_ORDER[move.promotionChoice] if move.isPromotionPawn else 0), reverse = True)
+        return moves
+
+    '''
+    Record a quiet move that caused a beta cutoff at ply, searched to depth
+    '''
+    def updateQuiet(self, move, ply, depth):
+        if ply < MAX_PLY:
+            killers = self.killers[ply]
+            if killers[0] != move.moveID:
+                killers[1] = killers[0]
+                killers[0] = move.moveID
+        key = fromTo(move)
+        self.history[key] += depth * depth
+        if self.history[key] >= HISTORY_MAX:
+            self.history = [value // 2 for value in self.history]
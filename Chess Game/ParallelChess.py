@@ -0,0 +1,88 @@
+"""
+Parallel search over several processes (Lazy SMP).
+Every worker process runs the normal iterative deepening search on the same root position and all of them
+read and write one transposition table that lives in shared memory, so a worker finds the results of the
+others in the table and skips that work. Half of the helpers start one iteration deeper to spread out.
+The main worker decides: when it finishes the others are stopped, and the deepest finished result is returned.
+"""
+import multiprocessing
+import os
+import time
+
+from TranspositionChess import TranspositionTable, tableWords
+from SearchChess import Searcher, SearchResult, movesFromIds
+
+#State of a worker process, set once by initWorker
+_worker = {}
+
+def initWorker(sharedTable, hashMB, stopEvent, searcherOptions):
+    _worker["stopEvent"] = stopEvent
+    _worker["searcher"] = Searcher(tt = TranspositionTable(hashMB, sharedTable), stopEvent = stopEvent, **searcherOptions)
+
+'''
+Search gs in a worker process. Moves don't travel between processes, the PV comes back as moveIDs
+'''
+def searchWorker(gs, workerId, maxDepth, maxNodes, maxTime, generation):
+    searcher = _worker["searcher"]
+    result = searcher.search(gs, maxDepth, maxNodes, maxTime, minDepth = 1 + (workerId % 2 if workerId else 0),
+                             generation = generation)
+    if workerId == 0: #the main worker is done, the helpers only help while it searches
+        _worker["stopEvent"].set()
+    line = result.pv or ([result.bestMove] if result.bestMove is not None else []) #no pv when stopped in depth 1
+    return workerId, [move.moveID for move in line], result.score, result.depth, result.nodes
+
+class ParallelSearcher():
+    #workers is the number of processes (default: one per core), hashMB the size of the shared table.
+    #searcherOptions (evaluate, quiescenceChecks, ...) are given to the Searcher of every worker, they must pickle
+    def __init__(self, workers = None, hashMB = 64, **searcherOptions):
+        self.workers = workers or os.cpu_count() or 1
+        self.hashMB = hashMB
+        self.sharedTable = multiprocessing.RawArray("Q", tableWords(hashMB))
+        self.tt = TranspositionTable(hashMB, self.sharedTable) #view of the shared table in this process
+        self.stopEvent = multiprocessing.Event()
+        self.pool = multiprocessing.Pool(self.workers, initWorker, (self.sharedTable, hashMB, self.stopEvent, searcherOptions))
+
+    '''
+    Ask a running search to stop, it returns the best move found so far
+    '''
+    def stop(self):
+        self.stopEvent.set()
+
+    '''
+    Same limits as Searcher.search, maxNodes counts the nodes of each worker.
+    callback(result) is called once with the final result
+    '''
+    def search(self, gs, maxDepth = 64, maxNodes = None, maxTime = None, callback = None):
+        startTime = time.perf_counter()
+        self.stopEvent.clear()
+        #the pool may hand a process several jobs of one search, so the generation is sent with every job
+        self.tt.newSearch()
+        jobs = [self.pool.apply_async(searchWorker, (gs, workerId, maxDepth, maxNodes, maxTime, self.tt.generation))
+                for workerId in range(self.workers)]
+        answers = sorted(job.get() for job in jobs)
+        #the deepest finished iteration wins, the main worker (first in the list) on equal depths
+        workerId, pvIds, score, depth, nodes = max(answers, key = lambda answer: answer[3])
+        result = SearchResult(None, score, depth, movesFromIds(gs, pvIds), sum(answer[4] for answer in answers),
+                              time.perf_counter() - startTime)
+        result.bestMove = result.pv[0] if result.pv else None
+        if callback is not None:
+            callback(result)
+        return result
+
+    def close(self):
+        self.pool.terminate()
+        self.pool.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+'''
+Convenience wrapper: start the workers, search the position once and return a SearchResult
+'''
+def findBestMoveParallel(gs, workers = None, maxDepth = 64, maxNodes = None, maxTime = None, callback = None, hashMB = 64,
+                         **searcherOptions):
+    with ParallelSearcher(workers, hashMB, **searcherOptions) as searcher:
+        return searcher.search(gs, maxDepth, maxNodes, maxTime, callback)
@@ -0,0 +1,182 @@
+"""
+Perft counts the leaf nodes of the legal move tree down to a fixed depth.
+The counts are compared with known reference values, which makes it the correctness test of
+getValidMoves/makeMove/undoMove, and the nodes per second make it the speed benchmark of the same code.
+Run it from the Chess Game folder:
+    python -m PerftChess --depth 3 --backend bitboard --json results.json
+"""
+import argparse
+import json
+import platform
+import time
+
+import EngineChess
+
+'''
+Standard perft positions, nodes maps a depth to the reference node count.
+depth is the default depth of the suite, low enough for a run to take seconds.
+'''
+POSITIONS = [
+    {"name": "start", "fen": "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1", "depth": 4,
+     "nodes": {1: 20, 2: 400, 3: 8902, 4: 197281, 5: 4865609}},
+    {"name": "kiwipete", "fen": "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1", "depth": 3,
+     "nodes": {1: 48, 2: 2039, 3: 97862, 4: 4085603}},
+    {"name": "endgame rook pins", "fen": "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1", "depth": 4,
+     "nodes": {1: 14, 2: 191, 3: 2812, 4: 43238, 5: 674624}},
+    {"name": "promotions and checks", "fen": "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1", "depth": 3,
+     "nodes": {1: 6, 2: 264, 3: 9467, 4: 422333}},
+    {"name": "promotion captures", "fen": "rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8", "depth": 3,
+     "nodes": {1: 44, 2: 1486, 3: 62379, 4: 2103487}},
+    {"name": "middlegame", "fen": "r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10", "depth": 3,
+     "nodes": {1: 46, 2: 2079, 3: 89890, 4: 3894594}},
+    {"name": "illegal en passant pin", "fen": "3k4/3p4/8/K1P4r/8/8/8/8 b - - 0 1", "depth": 4,
+     "nodes": {1: 18, 2: 92, 3: 1670, 4: 10138, 6: 1134888}},
+    {"name": "en passant gives check", "fen": "8/8/1k6/2b5/2pP4/8/5K2/8 b - d3 0 1", "depth": 4,
+     "nodes": {1: 15, 2: 126, 3: 1928, 4: 13931, 6: 1440467}},
+    {"name": "castling gives check", "fen": "5k2/8/8/8/8/8/8/4K2R w K - 0 1", "depth": 4,
+     "nodes": {1: 15, 2: 66, 3: 1198, 4: 6399, 6: 661072}},
+    {"name": "castling rights", "fen": "r3k2r/1b4bq/8/8/8/8/7B/R3K2R w KQkq - 0 1", "depth": 3,
+     "nodes": {1: 26, 2: 1141, 3: 27826, 4: 1274206}},
+    {"name": "castling prevented", "fen": "r3k2r/8/3Q4/8/8/5q2/8/R3K2R b KQkq - 0 1", "depth": 3,
+     "nodes": {1: 44, 2: 1494, 3: 50509, 4: 1720476}},
+    {"name": "promote out of check", "fen": "2K2r2/4P3/8/8/8/8/8/3k4 w - - 0 1", "depth": 4,
+     "nodes": {1: 11, 2: 133, 3: 1442, 4: 19174, 6: 3821001}},
+    {"name": "discovered check", "fen": "8/8/1P2K3/8/2n5/1q6/8/5k2 b - - 0 1", "depth": 3,
+     "nodes": {1: 29, 2: 165, 3: 5160, 4: 31961, 5: 1004658}},
+    {"name": "under promotion check", "fen": "8/P1k5/K7/8/8/8/8/8 w - - 0 1", "depth": 4,
+     "nodes": {1: 6, 2: 27, 3: 273, 4: 1329, 6: 92683}},
+    {"name": "self stalemate", "fen": "K1k5/8/P7/8/8/8/8/8 w - - 0 1", "depth": 6,
+     "nodes": {1: 2, 2: 6, 3: 13, 4: 63, 6: 2217}},
+    {"name": "double check", "fen": "8/8/2k5/5q2/5n2/8/5K2/8 b - - 0 1", "depth": 3,
+     "nodes": {1: 37, 2: 183, 3: 6559, 4: 23527}},
+]
+
+'''
+Count the leaf nodes depth plies below the current position
+'''
+def perft(gs, depth):
+    moves = gs.getValidMoves()
+    if depth <= 1:
+        return len(moves) if depth == 1 else 1 #bulk count, the last ply is never made
+    nodes = 0
+    for move in moves:
+        gs.makeMove(move)
+        nodes += perft(gs, depth - 1)
+        gs.undoMove()
+    return nodes
+
+'''
+Walk the tree depth plies deep and compare the incremental move generation of the list backend with a full one
+at every node (the same moves in the same order). Returns the number of nodes where they differ
+'''
+def verifyIncremental(gs, depth):
+    moves = gs.getValidMoves()
+    gs.incremental = False
+    full = gs.getValidMoves()
+    gs.incremental = True
+    mismatches = 0 if [move.code for move in moves] == [move.code for move in full] else 1
+    if depth > 1:
+        for move in moves:
+            gs.makeMove(move)
+            mismatches += verifyIncremental(gs, depth - 1)
+            gs.undoMove()
+    return mismatches
+
+'''
+Node count below every root move, keyed by the move notation. Used to find which move disagrees with a reference engine
+'''
+def divide(gs, depth):
+    counts = {}
+    for move in gs.getValidMoves():
+        gs.makeMove(move)
+        counts[move.getChessNotation()] = perft(gs, depth - 1)
+        gs.undoMove()
+    return counts
+
+'''
+Run perft on one position of the suite and return a result dict ready to be saved as JSON
+'''
+def runPosition(position, depth = None, backend = "list", showDivide = False, incremental = True):
+    depth = depth or position["depth"]
+    gs = EngineChess.GameState(backend, fen = position["fen"])
+    gs.incremental = incremental
+    startTime = time.perf_counter()
+    if showDivide:
+        counts = divide(gs, depth)
+        nodes = sum(counts.values())
+    else:
+        counts = None
+        nodes = perft(gs, depth)
+    seconds = time.perf_counter() - startTime
+    expected = position["nodes"].get(depth)
+    result = {"name": position["name"], "fen": position["fen"], "depth": depth, "nodes": nodes,
+              "expected": expected, "passed": expected is None or expected == nodes,
+              "seconds": round(seconds, 4), "nps": int(nodes / seconds) if seconds > 0 else 0}
+    if counts is not None:
+        result["divide"] = counts
+    return result
+
+'''
+Run every position of the suite. report gets one line of text per position
+'''
+def runSuite(positions = POSITIONS, depth = None, backend = "list", showDivide = False, report = print, incremental = True):
+    results = []
+    for position in positions:
+        result = runPosition(position, depth, backend, showDivide, incremental)
+        results.append(result)
+        if report is not None:
+            status = "ok" if result["expected"] is not None and result["passed"] else \
+                "FAIL (expected %d)" % result["expected"] if not result["passed"] else "no reference"
+            report("%-24s depth %d  %10d nodes  %8.2fs  %8d nps  %s" % (result["name"], result["depth"],
+                   result["nodes"], result["seconds"], result["nps"], status))
+            for notation, nodes in sorted((result.get("divide") or {}).items()):
+                report("    %s: %d" % (notation, nodes))
+    return results
+
+'''
+Save a run as JSON so runs can be compared over time
+'''
+def saveResults(results, path, backend = "list"):
+    totalNodes = sum(result["nodes"] for result in results)
+    totalSeconds = sum(result["seconds"] for result in results)
+    report = {"timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": platform.python_version(),
+              "machine": platform.machine(), "backend": backend, "nodes": totalNodes,
+              "seconds": round(totalSeconds, 4), "nps": int(totalNodes / totalSeconds) if totalSeconds > 0 else 0,
+              "passed": all(result["passed"] for result in results), "results": results}
+    with open(path, "w") as file:
+        json.dump(report, file, indent = 2)
+    return report
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = "Perft correctness and speed suite for EngineChess")
+    parser.add_argument("--depth", type = int, help = "depth for every position (default: the suite depth of each position)")
+    parser.add_argument("--backend", default = "list", choices = ("list", "bitboard"))
+    parser.add_argument("--fen", help = "run a single position instead of the suite")
+    parser.add_argument("--name", help = "only run the suite positions whose name contains this text")
+    parser.add_argument("--divide", action = "store_true", help = "print the node count below every root move")
+    parser.add_argument("--json", help = "save the results to this file")
+    parser.add_argument("--full", action = "store_true", help = "list backend: regenerate every move, no move cache")
+    parser.add_argument("--verify", action = "store_true", help = "list backend: check the move cache against full generation")
+    args = parser.parse_args(argv)
+
+    if args.fen:
+        positions = [{"name": "fen", "fen": args.fen, "depth": args.depth or 3, "nodes": {}}]
+    else:
+        positions = [position for position in POSITIONS if not args.name or args.name in position["name"]]
+    if args.verify:
+        failed = 0
+        for position in positions:
+            mismatches = verifyIncremental(EngineChess.GameState(fen = position["fen"]), args.depth or position["depth"])
+            print("%-24s %s" % (position["name"], "ok" if not mismatches else "%d nodes differ" % mismatches))
+            failed += mismatches
+        return 1 if failed else 0
+    results = runSuite(positions, args.depth, args.backend, args.divide, incremental = not args.full)
+    totalNodes = sum(result["nodes"] for result in results)
+    totalSeconds = sum(result["seconds"] for result in results)
+    print("total %d nodes in %.2fs, %d nps" % (totalNodes, totalSeconds, totalNodes / totalSeconds if totalSeconds > 0 else 0))
+    if args.json:
+        saveResults(results, args.json, args.backend)
+    return 0 if all(result["passed"] for result in results) else 1
+
+if __name__ == "__main__":
+    raise SystemExit(main())
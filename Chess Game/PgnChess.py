@@ -0,0 +1,205 @@
+"""
+Reading and writing games in PGN (Portable Game Notation).
+readGames walks a PGN file and yields the tag pairs and the SAN moves of every game, one game at a time,
+so files of any size (plain or gzip) are read in bounded memory. replayGames plays the games through
+GameState.makeMove. gameToPgn formats a finished game. SAN itself is handled by EngineChess.Move.
+"""
+import gzip
+import re
+
+import EngineChess
+
+RESULTS = ("1-0", "0-1", "1/2-1/2", "*")
+TAG = re.compile(r'\[(\w+)\s+"(.*)"\]')
+#comments, numeric annotation glyphs and move numbers
+NOISE = re.compile(r"\{[^}]*\}|\$\d+|\d+\.(\.\.)?")
+KNIGHT_STEPS = ((-2,-1),(-2,1),(-1,-2),(-1,2),(2,-1),(2,1),(1,-2),(1,2))
+KING_STEPS = ((-1,-1),(-1,0),(-1,1),(0,-1),(0,1),(1,-1),(1,0),(1,1))
+SLIDES = {"R": ((-1,0),(1,0),(0,-1),(0,1)), "B": ((-1,-1),(-1,1),(1,-1),(1,1)),
+          "Q": ((-1,0),(1,0),(0,-1),(0,1),(-1,-1),(-1,1),(1,-1),(1,1))}
+
+'''
+Remove the variations (nested parentheses) of a movetext
+'''
+def stripVariations(text):
+    if "(" not in text:
+        return text
+    kept = []
+    level = 0
+    for char in text:
+        if char == "(":
+            level += 1
+        elif char == ")":
+            level -= 1
+        elif level == 0:
+            kept.append(char)
+    return "".join(kept)
+
+'''
+SAN moves of a movetext, without the move numbers, comments, variations and result
+'''
+def movetextMoves(text):
+    text = stripVariations(NOISE.sub(" ", text))
+    return [token for token in text.split() if token not in RESULTS]
+
+'''
+Cut the ";" rest of line comment off a movetext line. A ";" inside a {...} comment is comment text, and a "{"
+after a ";" doesn't open one. inComment tells whether the line starts inside a {...} comment (they may span
+lines), returns the kept text and whether the next line starts inside one
+'''
+def stripLineComment(line, inComment = False):
+    if ";" not in line and "{" not in line and "}" not in line:
+        return line, inComment
+    for i, char in enumerate(line):
+        if inComment:
+            if char == "}":
+                inComment = False
+        elif char == "{":
+            inComment = True
+        elif char == ";":
+            return line[:i], False
+    return line, inComment
+
+'''
+Yield (tags, sanMoves) for every game of a PGN text file (an open file or anything that yields lines)
+'''
+def readGames(lines):
+    tags = {}
+    movetext = []
+    inComment = False
+    for line in lines:
+        line = line.strip()
+        if line.startswith("[") and not inComment:
+            if movetext: #tags after movetext start the next game
+                yield tags, movetextMoves(" ".join(movetext))
+                tags = {}
+                movetext = []
+            match = TAG.match(line)
+            if match:
+                tags[match.group(1)] = match.group(2)
+        elif line and (inComment or not line.startswith("%")): #% lines are escape lines that are ignored
+            line, inComment = stripLineComment(line, inComment)
+            movetext.append(line)
+    if tags or movetext:
+        yield tags, movetextMoves(" ".join(movetext))
+
+'''
+PGN text of a game: tags (dict, written in insertion order), SAN moves and the result ("1-0", "0-1", "1/2-1/2", "*").
+whiteToMove and moveNumber describe the starting position when it is not the normal one
+'''
+def gameToPgn(tags, sanMoves, result, whiteToMove = True, moveNumber = 1, lineLength = 80):
+    lines = ['[%s "%s"]' % (name, str(value).replace('"', "'")) for name, value in tags.items()]
+    lines.append("")
+    tokens = []
+    for san in sanMoves:
+        if whiteToMove:
+            tokens.append("%d. %s" % (moveNumber, san))
+        elif not tokens:
+            tokens.append("%d... %s" % (moveNumber, san))
+        else:
+            tokens.append(san)
+        if not whiteToMove:
+            moveNumber += 1
+        whiteToMove = not whiteToMove
+    tokens.append(result)
+    line = ""
+    for token in tokens:
+        if line and len(line) + 1 + len(token) > lineLength:
+            lines.append(line)
+            line = token
+        else:
+            line = line + " " + token if line else token
+    lines.append(line)
+    return "\n".join(lines) + "\n\n"
+
+'''
+Open a PGN file for reading as text, files ending in .gz are decompressed on the fly
+'''
+def openPgn(path):
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding = "utf-8", errors = "replace")
+    return open(path, encoding = "utf-8", errors = "replace")
+
+'''
+Yield (tags, sanMoves) for every game of a PGN file
+'''
+def readPgnFile(path):
+    with openPgn(path) as file:
+        yield from readGames(file)
+
+'''
+Start square of the piece that moves to (endRow, endCol), found from the board only (no legality check).
+None when no piece or more than one piece fits, the caller then needs the valid moves
+'''
+def trustedStart(board, color, piece, fromRow, fromCol, endRow, endCol):
+    if piece == "p":
+        direction = -1 if color == "w" else 1
+        if fromCol is not None and fromCol != endCol: #capture
+            return endRow - direction, fromCol
+        if board[endRow - direction][endCol] == color + "p":
+            return endRow - direction, endCol
+        return endRow - 2 * direction, endCol
+    found = None
+    if piece in SLIDES:
+        for dr, dc in SLIDES[piece]:
+            r, c = endRow + dr, endCol + dc
+            while 0 <= r < 8 and 0 <= c < 8:
+                if board[r][c] != "--":
+                    if board[r][c] == color + piece and (fromRow is None or r == fromRow) and (fromCol is None or c == fromCol):
+                        if found is not None:
+                            return None
+                        found = (r, c)
+                    break
+                r += dr
+                c += dc
+    else:
+        for dr, dc in KNIGHT_STEPS if piece == "N" else KING_STEPS:
+            r, c = endRow + dr, endCol + dc
+            if 0 <= r < 8 and 0 <= c < 8 and board[r][c] == color + piece \
+                    and (fromRow is None or r == fromRow) and (fromCol is None or c == fromCol):
+                if found is not None:
+                    return None
+                found = (r, c)
+    return found
+
+'''
+Move of gs written in SAN, built from the board without generating the valid moves.
+Only for trusted input (games known to be legal): the move is not checked. Ambiguous cases,
+like two knights of which one is pinned, fall back to the full Move.fromSan
+'''
+def trustedMove(gs, san):
+    parsed = EngineChess.parseSan(san)
+    if parsed is None:
+        return None
+    castle, piece, fromRow, fromCol, endRow, endCol, promotion = parsed
+    color = "w" if gs.whiteToMove else "b"
+    if castle:
+        row = 7 if color == "w" else 0
+        return EngineChess.Move((row, 4), (row, 6 if castle == "K" else 2), gs.board, isCastleMove = True)
+    start = trustedStart(gs.board, color, piece, fromRow, fromCol, endRow, endCol)
+    if start is None:
+        return EngineChess.Move.fromSan(gs, san)
+    enPassant = piece == "p" and start[1] != endCol and gs.board[endRow][endCol] == "--"
+    return EngineChess.Move(start, (endRow, endCol), gs.board, enPassant, promotionChoice = promotion or "Q")
+
+'''
+Play a game through makeMove and yield (gs, move) before every move is made. gs is the same object every time,
+read it before asking for the next move. trusted skips the legality check (see trustedMove).
+The game stops at the first move that can't be read
+'''
+def replayGame(tags, sanMoves, trusted = False, backend = "list"):
+    gs = EngineChess.GameState(backend, fen = tags.get("FEN"))
+    for san in sanMoves:
+        move = trustedMove(gs, san) if trusted else EngineChess.Move.fromSan(gs, san)
+        if move is None:
+            return
+        yield gs, move
+        gs.makeMove(move)
+
+'''
+Yield (tags, gs, move) for every move of every game of a PGN file (plain or .gz), in bounded memory
+'''
+def replayGames(path, trusted = False, backend = "list"):
+    for tags, sanMoves in readPgnFile(path):
+        for gs, move in replayGame(tags, sanMoves, trusted, backend):
+            yield tags, gs, move
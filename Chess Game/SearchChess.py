@@ -0,0 +1,304 @@
+"""
+Search engine on top of EngineChess.
+Negamax with alpha-beta pruning inside an iterative deepening loop. The search stops on a depth,
+node or wall clock budget and always answers with the best move of the last finished iteration.
+"""
+import time
+
+from EngineChess import NOISY_MOVES, ALL_MOVES
+from TranspositionChess import TranspositionTable, EXACT, LOWER, UPPER, encodeMove, findMove
+from OrderingChess import MoveOrdering
+from EvaluationChess import evaluate
+from TablebaseChess import WIN, LOSS
+
+CHECKMATE = 100000 #score of a mate at the root, mates further away score less
+MATE_BOUND = CHECKMATE - 1000 #scores above this are mates
+INFINITY = CHECKMATE + 1
+PIECE_VALUES = {"p": 100, "N": 320, "B": 330, "R": 500, "Q": 900, "K": 0}
+DELTA_MARGIN = 200 #a capture that can't lift the score within this margin of alpha is not searched in quiescence
+
+class SearchStopped(Exception):
+    pass
+
+class SearchResult():
+    def __init__(self, bestMove = None, score = 0, depth = 0, pv = None, nodes = 0, seconds = 0.0):
+        self.bestMove = bestMove
+        self.score = score
+        self.depth = depth
+        self.pv = pv or []
+        self.nodes = nodes
+        self.seconds = seconds
+
+    def getPvNotation(self):
+        return " ".join(move.getChessNotation() for move in self.pv)
+
+'''
+Mate scores count plies from the root, the table stores them counted from the node instead
+'''
+def scoreToTable(score, ply):
+    if score > MATE_BOUND: return score + ply
+    if score < -MATE_BOUND: return score - ply
+    return score
+
+def scoreFromTable(score, ply):
+    if score > MATE_BOUND: return score - ply
+    if score < -MATE_BOUND: return score + ply
+    return score
+
+class Searcher():
+    #tt can be shared between searchers, otherwise each searcher gets its own table of hashMB megabytes
+    #quiescenceChecks also searches every evasion when the side to move is in check at the horizon
+    #stopEvent (a threading or multiprocessing Event) stops the search when it is set
+    #tablebases (TablebaseChess.Tablebases) give the exact score of positions with few pieces instead of searching them
+    def __init__(self, evaluate = evaluate, hashMB = 16, tt = None, quiescenceChecks = False, stopEvent = None,
+                 tablebases = None):
+        self.evaluate = evaluate
+        self.tablebases = tablebases
+        self.quiescenceChecks = quiescenceChecks
+        self.stopEvent = stopEvent
+        self.ordering = MoveOrdering()
+        self.tt = tt if tt is not None else TranspositionTable(hashMB)
+        self.stopped = False
+
+    '''
+    Ask a running search to stop, it returns the best move found so far (safe to call from another thread)
+    '''
+    def stop(self):
+        self.stopped = True
+
+    '''
+    Iterative deepening from minDepth to maxDepth. maxNodes and maxTime (seconds) are hard limits,
+    callback(result) is called after every finished iteration, generation is passed to tt.newSearch
+    '''
+    def search(self, gs, maxDepth = 64, maxNodes = None, maxTime = None, callback = None, minDepth = 1, generation = None):
+        self.stopped = False
+        self.nodes = 0
+        self.maxNodes = maxNodes
+        self.startTime = time.perf_counter()
+        self.deadline = self.startTime + maxTime if maxTime is not None else None
+        self.tt.newSearch(generation)
+        self.ordering.newSearch()
+        rootMoves = gs.getValidMoves()
+        entry = self.tt.probe(gs.zobristKey)
+        self.ordering.orderMoves(rootMoves, 0, findMove(rootMoves, entry[3]) if entry is not None else None)
+        result = SearchResult(rootMoves[0] if rootMoves else None)
+        if len(rootMoves) <= 1: #nothing to think about
+            result.pv = rootMoves[:1]
+            return result
+        if self.tablebases is not None:
+            tablebaseResult = self.tablebaseRoot(gs, rootMoves)
+            if tablebaseResult is not None:
+                return tablebaseResult
+
+        for depth in range(min(minDepth, maxDepth), maxDepth + 1):
+            self.pvTable = [[] for _ in range(depth + 1)]
+            self.rootBest = None
+            try:
+                score = self.searchRoot(gs, rootMoves, depth)
+            except SearchStopped:
+                #the root moves searched so far are exact, keep a better move from the unfinished iteration
+                if self.rootBest is not None and (result.depth == 0 or self.rootBest[1] > result.score):
+                    result.bestMove, result.score, result.pv = self.rootBest[0], self.rootBest[1], self.rootBest[2]
+                break
+            self.tt.store(gs.zobristKey, depth, EXACT, score, encodeMove(self.pvTable[0][0]))
+            result = SearchResult(self.pvTable[0][0], score, depth, self.extendPv(gs, self.pvTable[0], depth), self.nodes,
+                                  time.perf_counter() - self.startTime)
+            if callback is not None:
+                callback(result)
+            if abs(score) > MATE_BOUND: #a forced mate was found, deeper iterations can't change it
+                break
+            #search the previous best move first in the next iteration
+            rootMoves.remove(result.bestMove)
+            rootMoves.insert(0, result.bestMove)
+        result.nodes = self.nodes
+        result.seconds = time.perf_counter() - self.startTime
+        return result
+
+    def searchRoot(self, gs, rootMoves, depth):
+        alpha = -INFINITY
+        for move in rootMoves:
+            gs.makeMove(move)
+            try:
+                score = -self.negamax(gs, depth - 1, -INFINITY, -alpha, 1)
+            finally:
+                gs.undoMove()
+            if score > alpha:
+                alpha = score
+                self.pvTable[0] = [move] + self.pvTable[1]
+                self.rootBest = (move, score, self.pvTable[0])
+        return alpha
+
+    def negamax(self, gs, depth, alpha, beta, ply):
+        self.nodes += 1
+        if self.nodes & 1023 == 0:
+            self.checkLimits()
+        self.pvTable[ply] = []
+        if gs.isRepetition(): #repetition, the side that repeats can't do better than a draw
+            return 0
+        if self.tablebases is not None and gs.pieceCount <= self.tablebases.maxPieces:
+            score = self.tablebaseScore(gs, ply)
+            if score is not None:
+                return score
+        if depth == 0:
+            return self.quiescence(gs, alpha, beta, ply)
+
+        key = gs.zobristKey
+        alphaStart = alpha
+        ttMove = 0
+        entry = self.tt.probe(key)
+        if entry is not None:
+            ttDepth, bound, ttScore, ttMove = entry
+            if ttDepth >= depth:
+                ttScore = scoreFromTable(ttScore, ply)
+                if bound == EXACT or (bound == LOWER and ttScore >= beta) or (bound == UPPER and ttScore <= alpha):
+                    return ttScore
+
+        bestScore = -INFINITY
+        bestMove = None
+        #quiet moves are only generated when the hash move and the captures didn't cut off
+        for move in self.ordering.stagedMoves(gs, ply, ttMove):
+            gs.makeMove(move)
+            try:
+                score = -self.negamax(gs, depth - 1, -beta, -alpha, ply + 1)
+            finally:
+                gs.undoMove()
+            if score > bestScore:
+                bestScore = score
+                bestMove = move
+                if score > alpha:
+                    alpha = score
+                    self.pvTable[ply] = [move] + self.pvTable[ply + 1]
+                    if alpha >= beta:
+                        if move.pieceCaptured == "--" and not move.isPromotionPawn:
+                            self.ordering.updateQuiet(move, ply, depth)
+                        break
+        if bestMove is None: #no legal move
+            return -CHECKMATE + ply if gs.inCheck else 0
+        bound = LOWER if bestScore >= beta else EXACT if bestScore > alphaStart else UPPER
+        self.tt.store(key, depth, bound, scoreToTable(bestScore, ply), encodeMove(bestMove) if bound != UPPER else 0)
+        return bestScore
+
+    '''
+    Past the horizon keep searching captures and promotions until the position is quiet, so the
+    evaluation is never taken in the middle of an exchange. The side to move may also "stand pat"
+    on the static evaluation since it is never forced to capture
+    '''
+    def quiescence(self, gs, alpha, beta, ply):
+        self.nodes += 1
+        if self.nodes & 1023 == 0:
+            self.checkLimits()
+        context = gs.prepareStages()
+        if self.quiescenceChecks and gs.inCheck: #no stand pat in check, every evasion is searched
+            moves = gs.generateStage(context, ALL_MOVES)
+            if len(moves) == 0:
+                return -CHECKMATE + ply
+            standPat = -INFINITY
+            self.ordering.orderMoves(moves, ply)
+        else:
+            standPat = self.evaluate(gs)
+            if standPat >= beta:
+                return standPat
+            if standPat + PIECE_VALUES["Q"] + DELTA_MARGIN < alpha: #not even winning a queen would help
+                return standPat
+            if standPat > alpha:
+                alpha = standPat
+            moves = gs.generateStage(context, NOISY_MOVES)
+            self.ordering.orderCaptures(moves)
+
+        bestScore = standPat
+        for move in moves:
+            if standPat != -INFINITY and not move.isPromotionPawn:
+                #delta pruning, this capture can't bring the score back to alpha
+                if standPat + PIECE_VALUES[move.pieceCaptured[1]] + DELTA_MARGIN <= alpha:
+                    continue
+            gs.makeMove(move)
+            try:
+                score = -self.quiescence(gs, -beta, -alpha, ply + 1)
+            finally:
+                gs.undoMove()
+            if score > bestScore:
+                bestScore = score
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        break
+        return bestScore
+
+    '''
+    Exact score of gs from the tablebases, None if it is not in them
+    '''
+    def tablebaseScore(self, gs, ply):
+        probe = self.tablebases.probe(gs)
+        if probe is None:
+            return None
+        result, plies = probe
+        if result == WIN:
+            return CHECKMATE - ply - plies
+        if result == LOSS:
+            return -CHECKMATE + ply + plies
+        return 0
+
+    '''
+    Pick the root move straight from the tablebases when every move leads into them:
+    the fastest win, else a draw, else the slowest loss
+    '''
+    def tablebaseRoot(self, gs, rootMoves):
+        if gs.pieceCount > self.tablebases.maxPieces or self.tablebases.probe(gs) is None:
+            return None
+        best = None
+        for move in rootMoves:
+            gs.makeMove(move)
+            score = 0 if gs.isRepetition() else self.tablebaseScore(gs, 1)
+            gs.undoMove()
+            if score is None:
+                return None
+            if best is None or -score > best[1]:
+                best = (move, -score)
+        return SearchResult(best[0], best[1], 1, [best[0]], self.nodes, time.perf_counter() - self.startTime)
+
+    '''
+    Table cutoffs cut the principal variation short, finish it with the best moves stored in the table
+    '''
+    def extendPv(self, gs, pv, depth):
+        pv = list(pv)
+        for move in pv:
+            gs.makeMove(move)
+        while len(pv) < depth:
+            entry = self.tt.probe(gs.zobristKey)
+            move = findMove(gs.getValidMoves(), entry[3]) if entry is not None else None
+            if move is None or gs.isRepetition():
+                break
+            gs.makeMove(move)
+            pv.append(move)
+        for move in pv:
+            gs.undoMove()
+        return pv
+
+    def checkLimits(self):
+        if self.stopped or (self.stopEvent is not None and self.stopEvent.is_set()) \
+                or (self.maxNodes is not None and self.nodes >= self.maxNodes) \
+                or (self.deadline is not None and time.perf_counter() >= self.deadline):
+            self.stopped = True
+            raise SearchStopped()
+
+'''
+Rebuild a line of moves of gs from their moveIDs (results coming back from another process).
+The line stops at the first moveID that is not a legal move
+'''
+def movesFromIds(gs, moveIds):
+    moves = []
+    for moveId in moveIds:
+        move = findMove(gs.getValidMoves(), moveId)
+        if move is None:
+            break
+        gs.makeMove(move)
+        moves.append(move)
+    for move in moves:
+        gs.undoMove()
+    return moves
+
+'''
+Convenience wrapper: search the position and return a SearchResult
+'''
+def findBestMove(gs, maxDepth = 64, maxNodes = None, maxTime = None, callback = None, hashMB = 16):
+    return Searcher(hashMB = hashMB).search(gs, maxDepth, maxNodes, maxTime, callback)
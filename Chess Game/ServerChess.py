@@ -0,0 +1,344 @@
+"""
+Analysis server: many games and analysis requests served from one process on a local TCP or Unix socket,
+so GUIs, bots and batch jobs don't each need an engine of their own. Run it from the Chess Game folder:
+    python -m ServerChess --port 8765 --workers 4
+    python -m ServerChess --unix /tmp/chess.sock
+The protocol is one JSON object per line each way. Every request has an "id" (echoed in its answer) and an "op":
+    new [fen]                   start a session, answers its "session" id
+    close session               drop a session
+    move session move           play a move (UCI "e2e4", LAN "Ng1-f3" or SAN "Nf3")
+    undo session                take the last move back
+    fen session                 the session's position
+    legal session|fen [san]     legal moves in UCI (and SAN), check and game state
+    evaluate session|fen        static evaluation, centipawns for the side to move
+    best session|fen [time] [depth]   search, answers move, score, depth, nodes and pv
+    cancel target               cancel the running "best" request of this connection whose id is target
+    stats                       server counters
+Answers are {"id", "ok": true, ...} or {"id", "ok": false, "error"}, searches may answer out of order.
+"legal" and "evaluate" requests are collected for a moment and answered together, one write per connection
+and one computation per position. Searches run on a fixed pool of WorkerChess engine processes; a request
+waits for a free worker, gets at most MAX_TIME seconds, and is refused when MAX_PENDING searches are waiting.
+"""
+import argparse
+import asyncio
+import copy
+import itertools
+import json
+import math
+import time
+
+import EngineChess
+from EvaluationChess import evaluate
+from WorkerChess import EngineWorker
+
+CHEAP_OPS = ("legal", "evaluate")
+BATCH_WAIT = 0.001 #seconds cheap requests are held so more of them are answered together
+DEFAULT_TIME = 1.0
+MAX_TIME = 30.0
+MAX_DEPTH = 64
+SEARCH_GRACE = 2.0 #seconds past its time a search may take before it is given up (process start, pickling)
+POLL_INTERVAL = 0.002 #seconds between two looks at a busy worker
+MAX_PENDING = 4 #searches that may wait for a worker, per worker
+#fields used as dict keys must be JSON scalars, a list or an object can't be hashed
+SCALAR_FIELDS = ("id", "op", "session", "target")
+SCALAR_TYPES = (str, int, float, bool, type(None))
+
+class RequestError(Exception):
+    pass
+
+'''
+Bitboard GameState of a FEN from a client, RequestError unless it has 8 ranks of 8 squares, one king a side,
+no pawn on the first or last rank and only castling rights whose king and rook are on their home squares
+'''
+def loadPosition(fen = None):
+    if fen is None:
+        return EngineChess.GameState("bitboard")
+    if not isinstance(fen, str):
+        raise RequestError("bad fen")
+    try:
+        gs = EngineChess.GameState("bitboard", fen = fen)
+    except (ValueError, IndexError, KeyError):
+        raise RequestError("bad fen")
+    squares = [piece for row in gs.board for piece in row]
+    if len(gs.board) != 8 or len(squares) != 64 or squares.count("wK") != 1 or squares.count("bK") != 1:
+        raise RequestError("bad fen")
+    if any(piece[1] == "p" for piece in gs.board[0] + gs.board[7]):
+        raise RequestError("bad fen")
+    #loadFen drops the rights it can't keep, a client asking for them gets told instead
+    fields = fen.split()
+    castling = fields[2] if len(fields) > 2 else "-"
+    rights = gs.currentCastlingRights
+    kept = ("K" if rights.wks else "") + ("Q" if rights.wqs else "") + ("k" if rights.bks else "") + ("q" if rights.bqs else "")
+    if castling != "-" and (sorted(castling) != sorted(kept) or len(set(castling)) != len(castling)):
+        raise RequestError("bad castling rights")
+    return gs
+
+class Session():
+    def __init__(self, sessionId, fen = None):
+        self.id = sessionId
+        self.gs = loadPosition(fen)
+        self.version = 0 #changes with every move or undo, batched answers are shared per version
+
+class Connection():
+    def __init__(self, writer):
+        self.writer = writer
+        self.searches = {} #request id: task of a running "best" request
+        self.open = True
+
+    def send(self, answer):
+        if self.open:
+            self.writer.write(json.dumps(answer).encode() + b"\n")
+
+class AnalysisServer():
+    def __init__(self, workers = 2, hashMB = 16):
+        self.sessions = {}
+        self.sessionIds = itertools.count(1)
+        self.workers = [EngineWorker(hashMB = hashMB) for _ in range(workers)]
+        self.idleWorkers = asyncio.Queue()
+        for worker in self.workers:
+            self.idleWorkers.put_nowait(worker)
+        self.maxPending = MAX_PENDING * workers
+        self.pending = 0 #searches waiting for a worker or running
+        self.batch = [] #(connection, request) of the cheap requests not answered yet
+        self.batchWake = asyncio.Event()
+        self.counts = {} #requests by op
+        self.batches = 0
+        self.batchedRequests = 0
+        self.server = None
+
+    async def start(self, host = "127.0.0.1", port = 8765, path = None):
+        if path is not None:
+            self.server = await asyncio.start_unix_server(self.handleConnection, path)
+        else:
+            self.server = await asyncio.start_server(self.handleConnection, host, port)
+        self.batcher = asyncio.ensure_future(self.runBatches())
+        return self.server
+
+    def close(self):
+        if self.server is not None:
+            self.server.close()
+            self.batcher.cancel()
+        for worker in self.workers:
+            worker.close()
+
+    async def handleConnection(self, reader, writer):
+        connection = Connection(writer)
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    request = json.loads(line)
+                except ValueError:
+                    connection.send({"id": None, "ok": False, "error": "bad json"})
+                    continue
+                if isinstance(request, dict):
+                    self.dispatch(connection, request)
+                await writer.drain() #a client that doesn't read its answers stops being read
+        except ConnectionError:
+            pass
+        finally:
+            connection.open = False
+            for task in list(connection.searches.values()):
+                task.cancel()
+            writer.close()
+
+    def dispatch(self, connection, request):
+        if not all(isinstance(request.get(field), SCALAR_TYPES) for field in SCALAR_FIELDS):
+            requestId = request.get("id")
+            connection.send({"id": requestId if isinstance(requestId, SCALAR_TYPES) else None, "ok": False,
+                             "error": "bad request"})
+            return
+        op = request.get("op")
+        self.counts[op] = self.counts.get(op, 0) + 1
+        if op in CHEAP_OPS:
+            self.batch.append((connection, request))
+            self.batchWake.set()
+            return
+        if op == "best":
+            requestId = request.get("id")
+            if self.pending >= self.maxPending:
+                connection.send({"id": requestId, "ok": False, "error": "busy"})
+            elif requestId in connection.searches:
+                connection.send({"id": requestId, "ok": False, "error": "duplicate id"})
+            else:
+                self.pending += 1
+                connection.searches[requestId] = asyncio.ensure_future(self.best(connection, request))
+            return
+        try:
+            connection.send({"id": request.get("id"), "ok": True, **self.answer(connection, request)})
+        except RequestError as error:
+            connection.send({"id": request.get("id"), "ok": False, "error": str(error)})
+        except Exception: #a position the engine can't handle must not drop the connection
+            connection.send({"id": request.get("id"), "ok": False, "error": "internal error"})
+
+    '''
+    Answer of a request that is handled at once
+    '''
+    def answer(self, connection, request):
+        op = request.get("op")
+        if op == "new":
+            session = Session(next(self.sessionIds), request.get("fen"))
+            self.sessions[session.id] = session
+            return {"session": session.id, "fen": session.gs.getFen()}
+        if op == "cancel":
+            task = connection.searches.get(request.get("target"))
+            if task is not None:
+                task.cancel()
+            return {"cancelled": task is not None}
+        if op == "stats":
+            return {"requests": dict(self.counts), "sessions": len(self.sessions), "workers": len(self.workers),
+                    "pending": self.pending, "batches": self.batches,
+                    "averageBatch": round(self.batchedRequests / self.batches, 2) if self.batches else 0.0}
+        if op not in ("fen", "close", "move", "undo"):
+            raise RequestError("unknown op")
+        session = self.getSession(request)
+        if op == "fen":
+            return {"fen": session.gs.getFen()}
+        self.runBatch() #answers already asked for must see the position before this change
+        if op == "close":
+            del self.sessions[session.id]
+            return {}
+        if op == "move":
+            move = EngineChess.Move.fromLan(session.gs, str(request.get("move", ""))) \
+                or EngineChess.Move.fromSan(session.gs, str(request.get("move", "")))
+            if move is None:
+                raise RequestError("illegal move")
+            session.gs.makeMove(move)
+        else:
+            session.gs.undoMove()
+        session.version += 1
+        return {"fen": session.gs.getFen()}
+
+    def getSession(self, request):
+        session = self.sessions.get(request.get("session"))
+        if session is None:
+            raise RequestError("unknown session")
+        return session
+
+    '''
+    Position of a request (its session or its fen) and a key shared by requests on the same position
+    '''
+    def position(self, request):
+        if "session" in request:
+            session = self.getSession(request)
+            return session.gs, ("session", session.id, session.version)
+        fen = request.get("fen")
+        if fen is None:
+            raise RequestError("session or fen needed")
+        return loadPosition(fen), ("fen", fen)
+
+    async def runBatches(self):
+        while True:
+            await self.batchWake.wait()
+            await asyncio.sleep(BATCH_WAIT)
+            self.runBatch()
+
+    '''
+    Answer every waiting cheap request, each position is worked out once and each connection gets one write
+    '''
+    def runBatch(self):
+        self.batchWake.clear()
+        if not self.batch:
+            return
+        batch, self.batch = self.batch, []
+        self.batches += 1
+        self.batchedRequests += len(batch)
+        results = {}
+        lines = {}
+        for connection, request in batch:
+            op = request.get("op")
+            try:
+                gs, key = self.position(request)
+                key += (op, bool(request.get("san")))
+                payload = results.get(key)
+                if payload is None:
+                    payload = results[key] = self.legal(gs, request.get("san")) if op == "legal" else {"score": evaluate(gs)}
+                answer = {"id": request.get("id"), "ok": True, **payload}
+            except RequestError as error:
+                answer = {"id": request.get("id"), "ok": False, "error": str(error)}
+            except Exception: #one bad position must not stop the batcher, the others still get their answers
+                answer = {"id": request.get("id"), "ok": False, "error": "internal error"}
+            lines.setdefault(connection, []).append(json.dumps(answer).encode() + b"\n")
+        for connection, connectionLines in lines.items():
+            if connection.open:
+                connection.writer.write(b"".join(connectionLines))
+
+    def legal(self, gs, san = False):
+        moves = gs.getValidMoves()
+        payload = {"moves": [move.getChessNotation() for move in moves], "check": gs.inCheck,
+                   "state": "checkmate" if gs.checkMate else "stalemate" if gs.staleMate else "ongoing"}
+        if san:
+            payload["san"] = [move.getSan(gs, moves) for move in moves]
+        return payload
+
+    '''
+    A "best" request: wait for a free worker, search a copy of the position (the session may move on meanwhile)
+    and answer. Cancelling the task (cancel op, closed connection) stops the worker's search
+    '''
+    async def best(self, connection, request):
+        requestId = request.get("id")
+        worker = None
+        try:
+            gs = copy.deepcopy(self.position(request)[0])
+            maxTime = float(request.get("time", DEFAULT_TIME))
+            if not math.isfinite(maxTime): #a NaN deadline never passes
+                raise ValueError("time")
+            maxTime = min(max(maxTime, 0.01), MAX_TIME)
+            maxDepth = min(max(1, int(request.get("depth", MAX_DEPTH))), MAX_DEPTH)
+            if not gs.getValidMoves():
+                raise RequestError("no legal move")
+            worker = await self.idleWorkers.get()
+            worker.think(gs, maxTime, maxDepth)
+            giveUp = time.perf_counter() + maxTime + SEARCH_GRACE
+            while True:
+                result = worker.poll()
+                if result is not None:
+                    break
+                if time.perf_counter() > giveUp:
+                    raise RequestError("timeout")
+                await asyncio.sleep(POLL_INTERVAL)
+            if result.bestMove is None:
+                raise RequestError("no move found")
+            connection.send({"id": requestId, "ok": True, "move": result.bestMove.getChessNotation(),
+                             "score": result.score, "depth": result.depth, "nodes": result.nodes,
+                             "seconds": round(result.seconds, 4), "pv": [move.getChessNotation() for move in result.pv]})
+        except RequestError as error:
+            connection.send({"id": requestId, "ok": False, "error": str(error)})
+        except (TypeError, ValueError, OverflowError): #int() of an infinite depth overflows
+            connection.send({"id": requestId, "ok": False, "error": "bad time or depth"})
+        except asyncio.CancelledError:
+            connection.send({"id": requestId, "ok": False, "error": "cancelled"})
+        finally:
+            if worker is not None:
+                worker.cancel() #no-op when the search finished
+                self.idleWorkers.put_nowait(worker)
+            self.pending -= 1
+            connection.searches.pop(requestId, None)
+
+async def serve(args):
+    server = AnalysisServer(args.workers, args.hash)
+    await server.start(args.host, args.port, args.unix)
+    print("listening on %s" % (args.unix or "%s:%d" % (args.host, args.port)), flush = True)
+    try:
+        await asyncio.Event().wait() #until interrupted
+    finally:
+        server.close()
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = "Chess analysis server")
+    parser.add_argument("--host", default = "127.0.0.1")
+    parser.add_argument("--port", type = int, default = 8765)
+    parser.add_argument("--unix", help = "listen on this Unix socket path instead of TCP")
+    parser.add_argument("--workers", type = int, default = 2, help = "engine processes searching in parallel")
+    parser.add_argument("--hash", type = int, default = 16, help = "transposition table of every worker in MB")
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,329 @@
+"""
+Endgame tablebases generated locally by retrograde analysis.
+A table holds every position of one material set (like KRK: white king and rook against the black king)
+with its exact result for the side to move and the distance to mate in plies.
+Tables are one byte per position and use the board symmetry: the white king is mirrored into the a-d files,
+and in tables without pawns also into the 1st-4th ranks, so a table stores a quarter of the positions.
+The files are memory mapped when probed. Generate the tables from the Chess Game folder:
+    python -m TablebaseChess tablebases KQK KRK KPK
+"""
+import argparse
+import mmap
+import os
+import time
+from array import array
+
+import EngineChess
+
+WIN, DRAW, LOSS = 1, 0, -1
+ILLEGAL = 255 #byte of positions that can't happen (side not to move in check, pawn on the last rank...)
+MAGIC = b"CTB1"
+HEADER_SIZE = 16 #magic + material name padded to 12 bytes
+PIECE_ORDER = "KQRBNP" #order of the pieces of a side in material names and indexes
+INSUFFICIENT = ("KK", "KBK", "KNK", "KKB", "KKN") #always drawn, no table needed
+
+#Squares the white king is moved into: files a-d (pawn tables), files a-d and ranks 1-4 (tables without pawns)
+PAWN_REGION = [sq for sq in range(64) if sq % 8 < 4]
+QUADRANT = [sq for sq in range(64) if sq % 8 < 4 and sq // 8 >= 4]
+
+'''
+Byte of a position: wins count moves to mate (1..127), losses 128 + moves to mate (128..254), 0 is a draw
+'''
+def encodeValue(win, plies):
+    value = (plies + 1) // 2 if win else 128 + plies // 2
+    if value >= ILLEGAL or (win and value > 127):
+        raise ValueError("distance to mate does not fit a byte")
+    return value
+
+'''
+(WIN/DRAW/LOSS for the side to move, plies to mate) of a table byte, None for illegal positions
+'''
+def decodeValue(value):
+    if value == 0:
+        return DRAW, 0
+    if value < 128:
+        return WIN, 2 * value - 1
+    if value < ILLEGAL:
+        return LOSS, 2 * (value - 128)
+    return None
+
+'''
+Material name of the pieces ("wK", "bQ"...) of one side, like "KRP"
+'''
+def sideName(pieces):
+    return "".join(sorted((piece[1].upper() for piece in pieces), key = PIECE_ORDER.index))
+
+'''
+Pieces of a material name in index order: white king, white pieces, black king, black pieces
+'''
+def namePieces(name):
+    split = name.index("K", 1)
+    return ["w" + piece.replace("P", "p") for piece in name[:split]] + ["b" + piece.replace("P", "p") for piece in name[split:]]
+
+class Table():
+    #data is any buffer of bytes (mmap of a file, or a bytearray while generating)
+    def __init__(self, name, data, offset = 0):
+        self.name = name
+        self.pieces = namePieces(name)
+        self.pawns = "P" in name
+        self.region = PAWN_REGION if self.pawns else QUADRANT
+        self.regionIndex = {sq: i for i, sq in enumerate(self.region)}
+        self.size = len(self.region) * 64 ** (len(self.pieces) - 1) * 2
+        self.data = data
+        self.offset = offset
+
+    '''
+    Index of the position with squares (in the order of self.pieces) and side to move (0 white, 1 black)
+    '''
+    def index(self, squares, blackToMove):
+        flip = 0
+        if squares[0] % 8 > 3:
+            flip = 7 #mirror the files
+        if not self.pawns and squares[0] // 8 < 4:
+            flip |= 56 #mirror the ranks
+        index = self.regionIndex[squares[0] ^ flip]
+        for sq in squares[1:]:
+            index = index * 64 + (sq ^ flip)
+        return index * 2 + blackToMove
+
+    def decode(self, index):
+        blackToMove = index & 1
+        index >>= 1
+        squares = []
+        for _ in range(len(self.pieces) - 1):
+            squares.append(index & 63)
+            index >>= 6
+        squares.append(self.region[index])
+        squares.reverse()
+        return squares, blackToMove
+
+    def value(self, squares, blackToMove):
+        return decodeValue(self.data[self.offset + self.index(squares, blackToMove)])
+
+class Tablebases():
+    #directory holds the .ctb files, maxPieces is the largest piece count (kings included) the search probes
+    def __init__(self, directory = None, maxPieces = 3):
+        self.tables = {}
+        self.maps = []
+        self.paths = []
+        self.maxPieces = maxPieces
+        if directory is not None and os.path.isdir(directory):
+            for fileName in sorted(os.listdir(directory)):
+                if fileName.endswith(".ctb"):
+                    self.open(os.path.join(directory, fileName))
+
+    def open(self, path):
+        with open(path, "rb") as file:
+            data = mmap.mmap(file.fileno(), 0, access = mmap.ACCESS_READ)
+        if data[:4] != MAGIC:
+            raise ValueError("%s is not a tablebase file" % path)
+        name = data[4:HEADER_SIZE].rstrip(b"\0").decode("ascii")
+        self.maps.append(data)
+        self.paths.append(path)
+        self.tables[name] = Table(name, data, HEADER_SIZE)
+
+    '''
+    Pickled as the paths of its files, which are mapped again on unpickling (a worker process gets the same tables)
+    '''
+    def __getstate__(self):
+        return {"paths": self.paths, "maxPieces": self.maxPieces}
+
+    def __setstate__(self, state):
+        self.__init__(None, state["maxPieces"])
+        for path in state["paths"]:
+            self.open(path)
+
+    '''
+    (WIN/DRAW/LOSS, plies to mate) of a position given as [(piece, sq)], None if there is no table for it
+    '''
+    def probePieces(self, pieces, whiteToMove):
+        white = sorted((item for item in pieces if item[0][0] == "w"), key = lambda item: PIECE_ORDER.index(item[0][1].upper()))
+        black = sorted((item for item in pieces if item[0][0] == "b"), key = lambda item: PIECE_ORDER.index(item[0][1].upper()))
+        whiteName = sideName(piece for piece, sq in white)
+        blackName = sideName(piece for piece, sq in black)
+        if whiteName + blackName in INSUFFICIENT:
+            return DRAW, 0
+        table = self.tables.get(whiteName + blackName)
+        if table is not None:
+            return table.value([sq for piece, sq in white] + [sq for piece, sq in black], 0 if whiteToMove else 1)
+        table = self.tables.get(blackName + whiteName)
+        if table is not None: #same table with the colors swapped, the board is turned upside down
+            return table.value([sq ^ 56 for piece, sq in black] + [sq ^ 56 for piece, sq in white], 1 if whiteToMove else 0)
+        return None
+
+    '''
+    Probe a GameState, None when it has more than maxPieces pieces, castling rights, or no table
+    '''
+    def probe(self, gs):
+        if gs.pieceCount > self.maxPieces:
+            return None
+        rights = gs.currentCastlingRights
+        if rights.wks or rights.wqs or rights.bks or rights.bqs:
+            return None
+        pieces = [(piece, r * 8 + c) for r, row in enumerate(gs.board) for c, piece in enumerate(row) if piece != "--"]
+        return self.probePieces(pieces, gs.whiteToMove)
+
+    def close(self):
+        for data in self.maps:
+            data.close()
+        self.maps = []
+        self.paths = []
+        self.tables = {}
+
+'''
+Solve every position of the material set name. Tables the positions convert into (captures and promotions)
+must already be in tablebases. Returns the table bytes.
+Every position gets its moves from GameState.getValidMoves once, then the results are spread backwards from
+the mates: a position with a move into a lost position is won, one whose moves all lead to won positions is lost,
+in order of distance so every distance is the shortest (for the winner) or longest (for the loser) one.
+'''
+def generateTable(name, tablebases):
+    table = Table(name, None)
+    pieces = table.pieces
+    size = table.size
+    data = bytearray([ILLEGAL]) * size
+    successorStart = array("I", [0])
+    successors = array("I")
+    remaining = array("H", bytes(2 * size)) #unresolved moves of every position
+    escape = bytearray(size) #1 when a move reaches a draw or a win, so the position can't be lost
+    externalLoss = {} #longest win of the opponent reached by a capture or promotion
+    buckets = [[]] #buckets[plies]: index * 2 + 1 for a win, index * 2 for a loss
+
+    def push(plies, index, win):
+        while len(buckets) <= plies:
+            buckets.append([])
+        buckets[plies].append(index * 2 + win)
+
+    gs = EngineChess.GameState()
+    gs.currentCastlingRights = EngineChess.CastleRights(False, False, False, False)
+    gs.enPassantPossible = ()
+    gs.board = [["--"] * 8 for _ in range(8)]
+    for index in range(size):
+        squares, blackToMove = table.decode(index)
+        if len(set(squares)) == len(squares) and not any(piece[1] == "p" and squares[i] // 8 in (0, 7)
+                                                         for i, piece in enumerate(pieces)):
+            for piece, sq in zip(pieces, squares):
+                gs.board[sq // 8][sq % 8] = piece
+                gs.dirtySquares |= 1 << sq #the board is set by hand, the move cache has to hear of it
+                if piece == "wK":
+                    gs.whiteKingLocation = (sq // 8, sq % 8)
+                elif piece == "bK":
+                    gs.blackKingLocation = (sq // 8, sq % 8)
+            gs.whiteToMove = not blackToMove
+            gs.attackMaps = {}
+            waitingKing = gs.blackKingLocation if gs.whiteToMove else gs.whiteKingLocation
+            if not gs.squareAttacked(waitingKing[0], waitingKing[1], gs.whiteToMove): #otherwise illegal
+                data[index] = 0
+                moves = gs.getValidMoves()
+                if not moves:
+                    if gs.inCheck:
+                        push(0, index, 0)
+                    else:
+                        escape[index] = 1 #stalemate
+                for move in moves:
+                    start = move.startRow * 8 + move.startCol
+                    end = move.endRow * 8 + move.endCol
+                    childSquares = [end if sq == start else sq for sq in squares]
+                    if move.pieceCaptured == "--" and not move.isPromotionPawn:
+                        successors.append(table.index(childSquares, 1 - blackToMove))
+                        remaining[index] += 1
+                        continue
+                    #the move leaves the table, look the position up in the smaller one
+                    childPieces = [(move.pieceMoved[0] + move.promotionChoice if sq == start and move.isPromotionPawn else piece, childSq)
+                                   for piece, sq, childSq in zip(pieces, squares, childSquares)
+                                   if not (sq == end and piece == move.pieceCaptured)]
+                    result = tablebases.probePieces(childPieces, blackToMove == 1)
+                    if result is None:
+                        raise ValueError("%s needs the table of %s" % (name, sideName(piece for piece, sq in childPieces
+                                         if piece[0] == "w") + sideName(piece for piece, sq in childPieces if piece[0] == "b")))
+                    if result[0] == LOSS:
+                        escape[index] = 1
+                        push(result[1] + 1, index, 1)
+                    elif result[0] == DRAW:
+                        escape[index] = 1
+                    else:
+                        externalLoss[index] = max(externalLoss.get(index, 0), result[1])
+                if moves and not remaining[index] and not escape[index]: #every move leaves the table into a lost position
+                    push(externalLoss[index] + 1, index, 0)
+            for sq in squares:
+                gs.board[sq // 8][sq % 8] = "--"
+                gs.dirtySquares |= 1 << sq
+        successorStart.append(len(successors))
+
+    #reverse the moves: predecessors of every position
+    predecessorStart = array("I", bytes(4 * (size + 1)))
+    for child in successors:
+        predecessorStart[child + 1] += 1
+    for index in range(size):
+        predecessorStart[index + 1] += predecessorStart[index]
+    predecessors = array("I", bytes(4 * len(successors)))
+    filled = array("I", predecessorStart[:size])
+    for index in range(size):
+        for i in range(successorStart[index], successorStart[index + 1]):
+            child = successors[i]
+            predecessors[filled[child]] = index
+            filled[child] += 1
+
+    resolved = bytearray(size)
+    plies = 0
+    while plies < len(buckets):
+        for code in buckets[plies]:
+            index, win = code >> 1, code & 1
+            if resolved[index]:
+                continue
+            resolved[index] = 1
+            data[index] = encodeValue(win, plies)
+            for i in range(predecessorStart[index], predecessorStart[index + 1]):
+                parent = predecessors[i]
+                if resolved[parent]:
+                    continue
+                if not win: #moving into a lost position wins
+                    push(plies + 1, parent, 1)
+                else:
+                    remaining[parent] -= 1
+                    if remaining[parent] == 0 and not escape[parent]:
+                        push(max(plies, externalLoss.get(parent, 0)) + 1, parent, 0)
+        plies += 1
+    return data
+
+'''
+Write a generated table to directory/name.ctb
+'''
+def saveTable(name, data, directory):
+    os.makedirs(directory, exist_ok = True)
+    path = os.path.join(directory, name + ".ctb")
+    with open(path, "wb") as file:
+        file.write(MAGIC + name.encode("ascii").ljust(HEADER_SIZE - len(MAGIC), b"\0"))
+        file.write(data)
+    return path
+
+'''
+Generate the tables of names in order (smaller tables first), skipping the ones already in directory
+'''
+def generateTables(names, directory, report = print):
+    tablebases = Tablebases(directory, maxPieces = 32)
+    for name in names:
+        if name in tablebases.tables or name in INSUFFICIENT:
+            continue
+        startTime = time.perf_counter()
+        data = generateTable(name, tablebases)
+        path = saveTable(name, data, directory)
+        tablebases.open(path)
+        if report is not None:
+            wins = sum(1 for value in data if 0 < value < 128)
+            longest = max((value for value in data if 0 < value < 128), default = 0)
+            report("%-6s %8d positions  %7d wins  longest mate %d moves  %.1fs" % (name, len(data), wins, longest,
+                   time.perf_counter() - startTime))
+    tablebases.close()
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = "Generate endgame tablebases")
+    parser.add_argument("directory", help = "folder of the .ctb files")
+    parser.add_argument("names", nargs = "*", default = ["KQK", "KRK", "KPK"],
+                        help = "material sets, white first (tables needed for promotions must come first)")
+    args = parser.parse_args(argv)
+    generateTables(args.names, args.directory)
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,145 @@
+"""
+Feature planes of positions for training and offline evaluation, built in batches with NumPy.
+A position is PLANES x 8 x 8 values: 12 piece planes (white P N B R Q K, then the black ones), a side to move plane
+(ones when white is to move), 4 castling planes (K Q k q, ones while the right is kept) and an en passant plane
+(a one on the en passant square). Rows and columns are those of GameState.board, row 0 is the 8th rank.
+Every position (a GameState or a FEN string) is reduced to a 64 byte string and a few flags, the planes are
+then filled for a whole chunk of positions at once. encodeToFile writes a .npy file through a memory map, so
+datasets larger than memory are made in one pass. From the Chess Game folder:
+    python -m TensorChess games.pgn.gz positions.npy
+"""
+import argparse
+import itertools
+
+import numpy as np
+
+from PgnChess import readPgnFile, replayGames
+
+PLANES = 18
+SIDE_PLANE = 12
+CASTLE_PLANES = 13
+EN_PASSANT_PLANE = 17
+CHUNK = 4096
+PIECE_CHARS = "PNBRQKpnbrqk"
+#GameState piece names to FEN letters, "." for an empty square
+FEN_CHAR = {color + piece: (piece.upper() if color == "w" else piece.lower()) for color in "wb" for piece in "pNBRQK"}
+FEN_CHAR["--"] = "."
+#FEN placement to 64 characters: digits become that many empty squares, the rank separators go
+EXPAND = str.maketrans({**{str(n): "." * n for n in range(1, 9)}, "/": None})
+#byte of a square to its piece plane, 12 for an empty square
+CHAR_PLANE = np.full(256, 12, dtype = np.uint8)
+for plane, char in enumerate(PIECE_CHARS):
+    CHAR_PLANE[ord(char)] = plane
+PIECE_PLANES = np.arange(12, dtype = np.uint8).reshape(1, 12, 1)
+
+'''
+(64 byte board, white to move, (K, Q, k, q) castling rights, en passant square or -1) of a GameState or a FEN
+'''
+def positionRecord(position):
+    if isinstance(position, str):
+        fields = position.split()
+        squares = fields[0].translate(EXPAND)
+        castling = fields[2] if len(fields) > 2 else "-"
+        enPassant = fields[3] if len(fields) > 3 else "-"
+        epSquare = (8 - int(enPassant[1])) * 8 + "abcdefgh".index(enPassant[0]) if enPassant != "-" else -1
+        return (squares.encode("ascii"), len(fields) < 2 or fields[1] == "w",
+                tuple(right in castling for right in "KQkq"), epSquare)
+    squares = "".join([FEN_CHAR[piece] for row in position.board for piece in row])
+    rights = position.currentCastlingRights
+    epSquare = position.enPassantPossible[0] * 8 + position.enPassantPossible[1] if position.enPassantPossible else -1
+    return squares.encode("ascii"), position.whiteToMove, (rights.wks, rights.wqs, rights.bks, rights.bqs), epSquare
+
+'''
+Fill out[start:start + len(records)] with the planes of position records
+'''
+def encodeRecords(records, out, start = 0):
+    count = len(records)
+    block = out[start:start + count]
+    squares = np.frombuffer(b"".join([record[0] for record in records]), dtype = np.uint8).reshape(count, 1, 64)
+    block[:, :12] = (CHAR_PLANE[squares] == PIECE_PLANES).reshape(count, 12, 8, 8)
+    block[:, SIDE_PLANE] = np.array([record[1] for record in records], dtype = out.dtype).reshape(count, 1, 1)
+    block[:, CASTLE_PLANES:CASTLE_PLANES + 4] = np.array([record[2] for record in records], dtype = out.dtype).reshape(count, 4, 1, 1)
+    block[:, EN_PASSANT_PLANE] = 0
+    epSquares = np.array([record[3] for record in records], dtype = np.int64)
+    rows = np.flatnonzero(epSquares >= 0)
+    block[rows, EN_PASSANT_PLANE, epSquares[rows] // 8, epSquares[rows] % 8] = 1
+
+'''
+Encode positions (GameStates or FEN strings, any iterable) into out starting at row start, chunkSize at a time.
+A GameState is read when it is reached, so an iterator may yield the same object after every move.
+Returns the number of positions written
+'''
+def encodeInto(positions, out, start = 0, chunkSize = CHUNK):
+    positions = iter(positions)
+    row = start
+    while True:
+        records = [positionRecord(position) for position in itertools.islice(positions, chunkSize)]
+        if not records:
+            return row - start
+        if row + len(records) > len(out):
+            raise ValueError("more positions than rows in the output array")
+        encodeRecords(records, out, row)
+        row += len(records)
+
+'''
+Planes of a sequence of positions as a new (len(positions), PLANES, 8, 8) array
+'''
+def encodePositions(positions, dtype = np.uint8, chunkSize = CHUNK):
+    out = np.empty((len(positions), PLANES, 8, 8), dtype = dtype)
+    encodeInto(positions, out, 0, chunkSize)
+    return out
+
+'''
+Cut a .npy file of rows of equal size down to its first rows. The header keeps its length (a smaller shape
+never needs more room, the rest is padded with spaces)
+'''
+def shrinkNpy(path, rows):
+    with open(path, "r+b") as file:
+        version = np.lib.format.read_magic(file)
+        readHeader = np.lib.format.read_array_header_1_0 if version == (1, 0) else np.lib.format.read_array_header_2_0
+        shape, fortranOrder, dtype = readHeader(file)
+        dataStart = file.tell()
+        header = repr({"descr": np.lib.format.dtype_to_descr(dtype), "fortran_order": fortranOrder,
+                       "shape": (rows,) + shape[1:]})
+        lengthBytes = 2 if version == (1, 0) else 4
+        headerStart = 6 + 2 + lengthBytes
+        file.seek(headerStart)
+        file.write((header.ljust(dataStart - headerStart - 1) + "\n").encode("latin1"))
+        file.truncate(dataStart + rows * int(np.prod(shape[1:])) * dtype.itemsize)
+
+'''
+Encode positions into a new memory mapped .npy file at path in one pass. count is the number of positions,
+or an upper bound when it isn't known in advance: the file is cut down to the positions written.
+Returns the number of positions written
+'''
+def encodeToFile(positions, path, count, dtype = np.uint8, chunkSize = CHUNK):
+    out = np.lib.format.open_memmap(path, mode = "w+", dtype = dtype, shape = (count, PLANES, 8, 8))
+    written = encodeInto(positions, out, 0, chunkSize)
+    out.flush()
+    del out
+    if written < count:
+        shrinkNpy(path, written)
+    return written
+
+'''
+Every position of the games of PGN files (before each move), games are replayed in trusted mode
+'''
+def pgnPositions(pgnPaths):
+    for path in pgnPaths:
+        for tags, gs, move in replayGames(path, trusted = True):
+            yield gs
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = "Encode the positions of PGN games into a .npy file of feature planes")
+    parser.add_argument("pgn", nargs = "+", help = "PGN files (plain or .gz)")
+    parser.add_argument("out", help = ".npy file to write")
+    parser.add_argument("--float", action = "store_true", help = "write float32 planes instead of uint8")
+    args = parser.parse_args(argv)
+    #the move count of the movetext is an upper bound, a game stops early at a move that can't be read
+    count = sum(len(sanMoves) for path in args.pgn for tags, sanMoves in readPgnFile(path))
+    written = encodeToFile(pgnPositions(args.pgn), args.out, count, np.float32 if args.float else np.uint8)
+    print("%d positions written" % written)
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,132 @@
+"""
+Fixed size transposition table keyed by GameState.zobristKey.
+Entries live in one array of unsigned 64 bit ints, two ints per entry (key and packed data),
+so the memory of a table is exactly the megabyte budget it was created with.
+Every bucket holds two entries: a depth-preferred slot and an always-replace slot.
+The table can also live in a buffer shared between processes (see ParallelChess).
+"""
+from array import array
+
+#Bound types
+EXACT, LOWER, UPPER = 1, 2, 3
+
+ENTRY_BYTES = 16 #key + data
+BUCKET_ENTRIES = 2
+SCORE_OFFSET = 1 << 21 #scores are stored as unsigned 22 bit values
+MASK64 = 0xFFFFFFFFFFFFFFFF
+
+'''
+Moves are stored as their 15 bit moveID: start square, end square and promotion piece (0 for none)
+'''
+def encodeMove(move):
+    return move.moveID
+
+'''
+Return the move of moves that has the moveID code, or None
+'''
+def findMove(moves, code):
+    if code:
+        for move in moves:
+            if move.moveID == code:
+                return move
+    return None
+
+'''
+Data layout (low to high bits): move 16, depth 8, bound 2, score 22, generation 8
+'''
+def packData(move, depth, bound, score, generation):
+    return move | depth << 16 | bound << 24 | (score + SCORE_OFFSET) << 26 | generation << 48
+
+'''
+The largest power of two number of buckets that fits in sizeMB
+'''
+def bucketCount(sizeMB):
+    buckets = 1
+    while buckets * 2 * ENTRY_BYTES * BUCKET_ENTRIES <= sizeMB * 1024 * 1024:
+        buckets *= 2
+    return buckets
+
+'''
+Number of 64 bit words a table of sizeMB uses, the size of a buffer to share it
+'''
+def tableWords(sizeMB):
+    return bucketCount(sizeMB) * BUCKET_ENTRIES * 2
+
+class TranspositionTable():
+    #buffer is an existing zeroed buffer of at least tableWords(sizeMB) 64 bit words (shared memory),
+    #otherwise the table allocates its own array
+    def __init__(self, sizeMB = 16, buffer = None):
+        self.buffer = buffer
+        self.resize(sizeMB)
+
+    def resize(self, sizeMB):
+        buckets = bucketCount(sizeMB)
+        self.buckets = buckets
+        self.mask = buckets - 1
+        if self.buffer is None:
+            self.table = array("Q", bytes(buckets * BUCKET_ENTRIES * ENTRY_BYTES))
+        else: #a shared buffer is used as it is, another process may already be filling it
+            self.table = memoryview(self.buffer).cast("B").cast("Q")[:buckets * BUCKET_ENTRIES * 2]
+        self.generation = 0
+        self.probes = 0
+        self.hits = 0
+
+    def clear(self):
+        if self.buffer is None:
+            self.resize(self.sizeMB())
+        else:
+            self.table[:] = array("Q", bytes(len(self.table) * 8))
+            self.generation = 0
+
+    def sizeMB(self):
+        return self.buckets * BUCKET_ENTRIES * ENTRY_BYTES / (1024 * 1024)
+
+    '''
+    Called once per search so entries from older searches are replaced first.
+    Processes sharing a table pass in the generation of the search, they may not all have searched as often
+    '''
+    def newSearch(self, generation = None):
+        self.generation = (self.generation + 1 if generation is None else generation) & 0xFF
+
+    '''
+    Return (depth, bound, score, move code) stored for key, or None.
+    The key is stored xored with the data so a torn write (shared tables) never matches
+    '''
+    def probe(self, key):
+        self.probes += 1
+        table = self.table
+        i = (key & self.mask) * 4
+        for j in (i, i + 2):
+            data = table[j + 1]
+            if table[j] ^ data == key and data:
+                self.hits += 1
+                return (data >> 16 & 0xFF, data >> 24 & 3, (data >> 26 & 0x3FFFFF) - SCORE_OFFSET, data & 0xFFFF)
+        return None
+
+    def store(self, key, depth, bound, score, move = 0):
+        table = self.table
+        i = (key & self.mask) * 4
+        depth = min(depth, 0xFF)
+        old = table[i + 1]
+        #depth-preferred slot: same position, deeper search, empty, or left over from an older search
+        if not old or table[i] ^ old == key or depth >= (old >> 16 & 0xFF) or (old >> 48) != self.generation:
+            j = i
+            if not move and old and table[i] ^ old == key:
+                move = old & 0xFFFF #keep the best move of the position when storing a bound without one
+        else: #always-replace slot
+            j = i + 2
+        data = packData(move, depth, bound, score, self.generation)
+        table[j] = key ^ data
+        table[j + 1] = data
+
+    '''
+    Permille of depth-preferred slots used by the current search (UCI "hashfull")
+    '''
+    def hashfull(self):
+        sample = min(1000, self.buckets)
+        used = 0
+        for b in range(sample):
+            data = self.table[b * 4 + 1]
+            if data and data >> 48 == self.generation:
+                used += 1
+        return used * 1000 // sample
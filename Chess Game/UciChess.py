@@ -0,0 +1,256 @@
+"""
+UCI (Universal Chess Interface) front end, so the engine can be run by match managers and GUIs without a window.
+It only needs EngineChess and the search modules, pygame is never imported. Run it from the Chess Game folder:
+    python UciChess.py
+The search runs in a thread so "stop" and "isready" are answered while it thinks. After "go infinite" and
+"go ponder" the bestmove is held until "stop" (or "ponderhit", which starts the clock of a ponder search).
+With Threads above 1 the search is a ParallelSearcher over that many processes.
+"""
+import sys
+import threading
+
+import EngineChess
+from SearchChess import Searcher, MATE_BOUND, CHECKMATE
+from TranspositionChess import TranspositionTable
+from BookChess import OpeningBook
+from TablebaseChess import Tablebases
+
+ENGINE_NAME = "Python Chess Engine"
+ENGINE_AUTHOR = "Qshitah"
+STARTPOS = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+MOVE_OVERHEAD = 0.05 #seconds kept for the answer to reach the GUI
+#name: (type, default, min, max)
+OPTIONS = {"Hash": ("spin", 16, 1, 4096), "Threads": ("spin", 1, 1, 256), "BookFile": ("string", "", None, None),
+           "TablebasePath": ("string", "", None, None), "TablebasePieces": ("spin", 3, 2, 5)}
+GO_PARAMS = ("depth", "nodes", "movetime", "wtime", "btime", "winc", "binc", "movestogo")
+
+'''
+UCI score text of a search score
+'''
+def scoreText(score):
+    if score > MATE_BOUND:
+        return "mate %d" % ((CHECKMATE - score + 1) // 2)
+    if score < -MATE_BOUND:
+        return "mate -%d" % ((CHECKMATE + score) // 2)
+    return "cp %d" % score
+
+'''
+Seconds to think from the go parameters: a fixed movetime, or a share of the clock of the side to move
+'''
+def thinkTime(params, whiteToMove):
+    if "movetime" in params:
+        return max(0.01, params["movetime"] / 1000 - MOVE_OVERHEAD)
+    clock = params.get("wtime" if whiteToMove else "btime")
+    if clock is None:
+        return None #depth, nodes or infinite
+    increment = params.get("winc" if whiteToMove else "binc", 0)
+    movesToGo = params.get("movestogo", 30)
+    seconds = (clock / max(movesToGo, 1) + increment * 0.8) / 1000
+    return max(0.01, min(seconds, clock / 2000) - MOVE_OVERHEAD)
+
+class UciEngine():
+    def __init__(self, output = sys.stdout):
+        self.output = output
+        self.options = {name: option[1] for name, option in OPTIONS.items()}
+        self.gs = EngineChess.GameState("bitboard")
+        self.searcher = None #made on the first go, after the options are set
+        self.book = None
+        self.tablebases = None
+        self.thread = None
+        self.release = threading.Event() #set once the bestmove of the current search may be sent
+        self.ponderTime = None #seconds the ponder search gets after a ponderhit
+        self.timer = None
+
+    def send(self, text):
+        self.output.write(text + "\n")
+        self.output.flush()
+
+    '''
+    Handle one line of input, returns False on "quit"
+    '''
+    def command(self, line):
+        tokens = line.split()
+        if not tokens:
+            return True
+        name, args = tokens[0], tokens[1:]
+        if name == "uci":
+            self.send("id name " + ENGINE_NAME)
+            self.send("id author " + ENGINE_AUTHOR)
+            for optionName, (kind, default, low, high) in OPTIONS.items():
+                if kind == "spin":
+                    self.send("option name %s type spin default %d min %d max %d" % (optionName, default, low, high))
+                else:
+                    self.send("option name %s type string default %s" % (optionName, default or "<empty>"))
+            self.send("uciok")
+        elif name == "isready":
+            self.send("readyok")
+        elif name == "setoption":
+            self.setOption(args)
+        elif name == "ucinewgame":
+            self.stop()
+            if self.searcher is not None:
+                self.searcher.tt.clear()
+        elif name == "position":
+            self.stop()
+            self.setPosition(args)
+        elif name == "go":
+            self.stop()
+            self.go(args)
+        elif name == "stop":
+            self.stop()
+        elif name == "ponderhit":
+            self.ponderHit()
+        elif name == "quit":
+            self.stop()
+            self.closeSearcher()
+            return False
+        return True
+
+    def setOption(self, args):
+        if "name" not in args:
+            return
+        valueAt = args.index("value") if "value" in args else len(args)
+        optionName = " ".join(args[args.index("name") + 1:valueAt])
+        value = " ".join(args[valueAt + 1:])
+        for known, (kind, default, low, high) in OPTIONS.items():
+            if known.lower() == optionName.lower():
+                if kind == "spin":
+                    try:
+                        value = min(max(int(value), low), high)
+                    except ValueError:
+                        return
+                elif value == "<empty>":
+                    value = ""
+                self.stop()
+                self.options[known] = value
+                self.closeSearcher() #rebuilt with the new options on the next go
+                try:
+                    if known == "BookFile":
+                        self.book = None
+                        self.book = OpeningBook(value) if value else None
+                    elif known in ("TablebasePath", "TablebasePieces"):
+                        self.tablebases = None
+                        path = self.options["TablebasePath"]
+                        self.tablebases = Tablebases(path, self.options["TablebasePieces"]) if path else None
+                except (OSError, ValueError) as error: #missing, unreadable or empty file
+                    self.send("info string %s not loaded: %s" % (known, error))
+
+    '''
+    position [startpos | fen <fen>] [moves <move> ...], moves in long algebraic notation (e2e4, e7e8q)
+    '''
+    def setPosition(self, args):
+        movesAt = args.index("moves") if "moves" in args else len(args)
+        fen = STARTPOS if not args or args[0] == "startpos" else " ".join(args[1:movesAt])
+        try:
+            self.gs = EngineChess.GameState("bitboard", fen = fen)
+        except (ValueError, IndexError, KeyError):
+            self.send("info string bad fen " + fen)
+            self.gs = EngineChess.GameState("bitboard")
+            return
+        for notation in args[movesAt + 1:]:
+            move = EngineChess.Move.fromLan(self.gs, notation)
+            if move is None:
+                self.send("info string illegal move " + notation)
+                break
+            self.gs.makeMove(move)
+
+    def makeSearcher(self):
+        if self.searcher is None:
+            if self.options["Threads"] > 1:
+                import ParallelChess #only loaded when used, it starts the worker processes
+                self.searcher = ParallelChess.ParallelSearcher(self.options["Threads"], self.options["Hash"],
+                                                               tablebases = self.tablebases)
+            else:
+                self.searcher = Searcher(tt = TranspositionTable(self.options["Hash"]), tablebases = self.tablebases)
+        return self.searcher
+
+    def closeSearcher(self):
+        if self.searcher is not None and hasattr(self.searcher, "close"):
+            self.searcher.close()
+        self.searcher = None
+
+    '''
+    go parameters with a number after them, missing or unreadable numbers are ignored
+    '''
+    def goParams(self, args):
+        params = {}
+        for i in range(len(args) - 1):
+            if args[i] in GO_PARAMS:
+                try:
+                    params[args[i]] = int(args[i + 1])
+                except ValueError:
+                    pass
+        return params
+
+    def go(self, args):
+        params = self.goParams(args)
+        held = "infinite" in args or "ponder" in args
+        if self.book is not None and not held:
+            move = self.book.pickMove(self.gs)
+            if move is not None:
+                self.send("bestmove " + move.getChessNotation())
+                return
+        maxTime = thinkTime(params, self.gs.whiteToMove)
+        self.ponderTime = maxTime if "ponder" in args else None
+        if held:
+            self.release.clear()
+            maxTime = None
+        else:
+            self.release.set()
+        searcher = self.makeSearcher()
+        self.thread = threading.Thread(target = self.search, args = (searcher, self.gs, params.get("depth", 64),
+                                       params.get("nodes"), maxTime), daemon = True)
+        self.thread.start()
+
+    '''
+    The move pondered on was played: the search goes on as a normal one with the time of its go command
+    '''
+    def ponderHit(self):
+        if self.thread is None or self.release.is_set():
+            return
+        if self.ponderTime is not None:
+            self.timer = threading.Timer(self.ponderTime, self.searcher.stop)
+            self.timer.start()
+        self.release.set()
+
+    def search(self, searcher, gs, maxDepth, maxNodes, maxTime):
+        result = searcher.search(gs, maxDepth, maxNodes, maxTime, self.info)
+        self.release.wait() #infinite and ponder searches answer on stop or ponderhit only
+        if result.bestMove is None:
+            self.send("bestmove 0000")
+        elif len(result.pv) > 1:
+            self.send("bestmove %s ponder %s" % (result.bestMove.getChessNotation(), result.pv[1].getChessNotation()))
+        else:
+            self.send("bestmove " + result.bestMove.getChessNotation())
+
+    def info(self, result):
+        millis = max(1, int(result.seconds * 1000))
+        self.send("info depth %d score %s nodes %d nps %d time %d hashfull %d pv %s" % (result.depth,
+                  scoreText(result.score), result.nodes, result.nodes * 1000 // millis, millis,
+                  self.searcher.tt.hashfull(), result.getPvNotation()))
+
+    '''
+    Stop a running search and wait for its bestmove
+    '''
+    def stop(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        if self.thread is not None:
+            self.release.set()
+            while self.thread.is_alive(): #repeated in case the search had not started (and reset its flag) yet
+                self.searcher.stop()
+                self.thread.join(0.01)
+            self.thread = None
+
+def main():
+    engine = UciEngine()
+    for line in sys.stdin:
+        if not engine.command(line):
+            break
+    engine.stop()
+    engine.closeSearcher()
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
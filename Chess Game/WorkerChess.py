@@ -0,0 +1,139 @@
+"""
+Engine worker: runs the search in its own process so the pygame loop keeps drawing and handling events
+while the computer thinks (a thread would share the interpreter lock with the drawing code).
+The main loop hands over a position with think() and checks poll() once per frame, poll never blocks.
+The worker keeps one Searcher for the whole game, so its transposition table stays warm between moves.
+With an opening book the worker answers with a book move without searching while the game is in the book.
+
+Pondering: after its move the engine can keep searching on the player's time, in the position after the
+reply it expects (the second move of its PV). If the player plays that reply, think() turns the running
+search into the real one (a "ponder hit") and only gives it the normal time from then on. Otherwise the
+ponder search is cancelled, and the new search still finds the ponder results in the transposition table.
+"""
+import multiprocessing
+import time
+
+from SearchChess import Searcher, SearchResult, movesFromIds
+from BookChess import OpeningBook
+from TablebaseChess import Tablebases
+
+'''
+Stop flag of the worker's searcher: the request being searched is cancelled as soon as the main process
+publishes a newer request id (a new search or a cancel), or when the deadline set on a ponder hit has passed
+'''
+class RequestWatch():
+    def __init__(self, latest, deadline):
+        self.latest = latest
+        self.deadline = deadline
+        self.requestId = 0
+
+    def is_set(self):
+        return self.latest.value != self.requestId or 0 < self.deadline.value < time.time()
+
+'''
+Body of the worker process: search every request that is still the latest one and send back
+(requestId, pv as moveIDs, score, depth, nodes, seconds)
+'''
+def workerLoop(connection, latest, deadline, hashMB, bookPath, tablebasePath, tablebasePieces):
+    watch = RequestWatch(latest, deadline)
+    tablebases = Tablebases(tablebasePath, tablebasePieces) if tablebasePath is not None else None
+    searcher = Searcher(hashMB = hashMB, stopEvent = watch, tablebases = tablebases)
+    book = OpeningBook(bookPath) if bookPath is not None else None
+    while True:
+        request = connection.recv()
+        if request is None: #close
+            break
+        requestId, gs, maxDepth, maxTime = request
+        if requestId != latest.value: #cancelled before it started
+            continue
+        watch.requestId = requestId
+        bookMove = book.pickMove(gs) if book is not None else None
+        if bookMove is not None:
+            connection.send((requestId, [bookMove.moveID], 0, 0, 0, 0.0))
+            continue
+        result = searcher.search(gs, maxDepth, maxTime = maxTime) #maxTime is None when pondering
+        line = result.pv or ([result.bestMove] if result.bestMove is not None else []) #no pv when stopped in depth 1
+        connection.send((requestId, [move.moveID for move in line], result.score, result.depth, result.nodes,
+                         result.seconds))
+
+class EngineWorker():
+    #bookPath is an opening book built by BookChess, None to always search
+    #tablebasePath is a folder of TablebaseChess tables, probed instead of searching at tablebasePieces pieces or less
+    def __init__(self, hashMB = 64, bookPath = None, tablebasePath = None, tablebasePieces = 3):
+        self.latest = multiprocessing.Value("q", 0, lock = False) #id of the request the main process wants
+        self.deadline = multiprocessing.Value("d", 0.0, lock = False) #time.time() the ponder search ends at, 0 for none
+        self.connection, workerConnection = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(target = workerLoop,
+                                               args = (workerConnection, self.latest, self.deadline, hashMB, bookPath,
+                                                       tablebasePath, tablebasePieces),
+                                               daemon = True)
+        self.process.start()
+        self.gs = None #position being searched, used to turn the answer back into moves
+        self.thinking = False
+        self.pondering = False
+        self.ponderKey = None #zobristKey of the position being pondered
+        self.answer = None #answer to the latest request, kept until it is asked for
+
+    def request(self, gs, maxDepth, maxTime):
+        self.deadline.value = 0.0
+        self.latest.value += 1
+        self.answer = None
+        self.connection.send((self.latest.value, gs, maxDepth, maxTime)) #gs is pickled, later changes to it don't matter
+
+    '''
+    Start searching gs in the background, any search still running is cancelled.
+    If gs is the position being pondered the ponder search goes on with maxTime left from now
+    '''
+    def think(self, gs, maxTime = None, maxDepth = 64):
+        if self.pondering and gs.zobristKey == self.ponderKey:
+            self.deadline.value = time.time() + maxTime if maxTime is not None else 0.0
+        else:
+            self.request(gs, maxDepth, maxTime)
+        self.gs = gs
+        self.thinking = True
+        self.pondering = False
+
+    '''
+    Search the position after expectedMove is played in gs until think() or cancel() is called
+    '''
+    def ponder(self, gs, expectedMove, maxDepth = 64):
+        gs.makeMove(expectedMove)
+        self.ponderKey = gs.zobristKey
+        self.request(gs, maxDepth, None)
+        gs.undoMove()
+        self.thinking = False
+        self.pondering = True
+
+    '''
+    Drop the current search, its answer will be ignored
+    '''
+    def cancel(self):
+        if self.thinking or self.pondering:
+            self.latest.value += 1
+            self.answer = None
+            self.thinking = False
+            self.pondering = False
+
+    '''
+    SearchResult of the current search once it is finished, None while it is still thinking.
+    Answers of cancelled searches are thrown away, the answer of a ponder search waits for the ponder hit
+    '''
+    def poll(self):
+        while self.connection.poll():
+            answer = self.connection.recv()
+            if answer[0] == self.latest.value:
+                self.answer = answer
+        if self.thinking and self.answer is not None:
+            requestId, pvIds, score, depth, nodes, seconds = self.answer
+            self.answer = None
+            self.thinking = False
+            pv = movesFromIds(self.gs, pvIds)
+            return SearchResult(pv[0] if pv else None, score, depth, pv, nodes, seconds)
+        return None
+
+    def close(self):
+        self.cancel()
+        self.connection.send(None)
+        self.process.join(1)
+        if self.process.is_alive():
+            self.process.terminate()
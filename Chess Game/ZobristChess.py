@@ -0,0 +1,49 @@
+"""
+Zobrist keys used to give every GameState position a 64 bit identity.
+GameState.makeMove keeps gs.zobristKey up to date with xors, computeHash rebuilds it from scratch.
+"""
+import random
+
+_random = random.Random(0x5EED2024) #fixed seed so keys (and anything stored by key) are stable across runs
+
+PIECES = ["wp", "wN", "wB", "wR", "wQ", "wK", "bp", "bN", "bB", "bR", "bQ", "bK"]
+#PIECE_KEYS[piece][row * 8 + col]
+PIECE_KEYS = {piece: [_random.getrandbits(64) for _ in range(64)] for piece in PIECES}
+SIDE_KEY = _random.getrandbits(64) #xored in when black is to move
+CASTLE_KEYS = [_random.getrandbits(64) for _ in range(16)] #indexed by castleIndex
+EP_KEYS = [_random.getrandbits(64) for _ in range(8)] #indexed by en passant file
+
+'''
+Castling rights as 4 bits: wks = 1, wqs = 2, bks = 4, bqs = 8
+'''
+def castleIndex(rights):
+    return rights.wks | rights.wqs << 1 | rights.bks << 2 | rights.bqs << 3
+
+'''
+Key of the en passant file, only when the side to move has a pawn next to the pushed pawn
+(otherwise the capture is impossible and the position is the same as without the en passant square)
+'''
+def enPassantKey(board, enPassantPossible, whiteToMove):
+    if enPassantPossible == ():
+        return 0
+    r, c = enPassantPossible
+    capturerRow, pawn = (r + 1, "wp") if whiteToMove else (r - 1, "bp")
+    if (c > 0 and board[capturerRow][c - 1] == pawn) or (c < 7 and board[capturerRow][c + 1] == pawn):
+        return EP_KEYS[c]
+    return 0
+
+'''
+Recompute the key of a GameState from scratch, used to verify the incremental key
+'''
+def computeHash(gs):
+    key = 0
+    for r in range(8):
+        for c in range(8):
+            piece = gs.board[r][c]
+            if piece != "--":
+                key ^= PIECE_KEYS[piece][r * 8 + c]
+    if not gs.whiteToMove:
+        key ^= SIDE_KEY
+    key ^= CASTLE_KEYS[castleIndex(gs.currentCastlingRights)]
+    key ^= enPassantKey(gs.board, gs.enPassantPossible, gs.whiteToMove)
+    return key
@@ -0,0 +1,48 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import EngineChess
+from BookChess import OpeningBook, buildBook, polyglotKey
+
+#hashes from the Polyglot book format specification
+KEYS = [
+    ([], 0x463B96181691FC9C),
+    (["e2e4"], 0x823C9B50FD114196),
+    (["e2e4", "d7d5"], 0x0756B94461C50FB0),
+    (["e2e4", "d7d5", "e4e5"], 0x662FAFB965DB29D4),
+    (["e2e4", "d7d5", "e4e5", "f7f5"], 0x22A48B5A8E47FF78), #en passant file counts, e5 can take f6
+    (["e2e4", "d7d5", "e4e5", "f7f5", "e1e2"], 0x652A607CA3F242C1),
+    (["e2e4", "d7d5", "e4e5", "f7f5", "e1e2", "e8f7"], 0x00FDD303C946BDD9),
+]
+
+def playMoves(gs, moves):
+    for text in moves:
+        move = next(move for move in gs.getValidMoves() if move.getChessNotation() == text)
+        gs.makeMove(move)
+    return gs
+
+class PolyglotKeyTest(unittest.TestCase):
+    def testSpecificationKeys(self):
+        for backend in ("list", "bitboard"):
+            for moves, key in KEYS:
+                self.assertEqual(polyglotKey(playMoves(EngineChess.GameState(backend), moves)), key, moves)
+
+    def testBuiltBookIsFound(self):
+        directory = tempfile.mkdtemp()
+        try:
+            pgnPath = os.path.join(directory, "games.pgn")
+            with open(pgnPath, "w") as pgn:
+                pgn.write('[Result "1-0"]\n\n1. e4 e5 2. Nf3 1-0\n')
+            bookPath = os.path.join(directory, "book.bin")
+            self.assertEqual(buildBook([pgnPath], bookPath), 2) #black lost, e5 weighs nothing
+            with OpeningBook(bookPath) as book:
+                gs = EngineChess.GameState()
+                self.assertEqual([move.getChessNotation() for move, weight in book.getMoves(gs)], ["e2e4"])
+                self.assertEqual(book.lookup(0x463B96181691FC9C), book.lookup(polyglotKey(gs)))
+        finally:
+            shutil.rmtree(directory)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,128 @@
+import random
+import unittest
+
+import EngineChess
+from PerftChess import POSITIONS, perft, verifyIncremental
+
+BACKENDS = ("list", "bitboard")
+KIWIPETE = "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1"
+
+def castleMoves(gs):
+    return sorted(move.getChessNotation() for move in gs.getValidMoves() if move.isCastleMove)
+
+class CastlingTest(unittest.TestCase):
+    def testRightsWithoutKingOrRookAreDropped(self):
+        for backend in BACKENDS:
+            rights = EngineChess.GameState(backend, fen = "1k6/8/8/8/8/8/8/R3K1R1 w KQkq - 0 1").currentCastlingRights
+            self.assertEqual((rights.wks, rights.wqs, rights.bks, rights.bqs), (False, True, False, False))
+
+    def testNoCastleAwayFromHomeSquares(self):
+        for backend in BACKENDS:
+            gs = EngineChess.GameState(backend, fen = "1k6/8/8/8/8/8/8/4K3 b q - 0 1")
+            #rights forced past loadFen, as a position set up by hand could have them
+            gs.currentCastlingRights = EngineChess.CastleRights(True, True, True, True)
+            self.assertEqual(castleMoves(gs), [])
+            gs = EngineChess.GameState(backend, fen = "4k3/8/8/8/8/8/8/4K2N w - - 0 1")
+            gs.currentCastlingRights = EngineChess.CastleRights(True, True, True, True)
+            self.assertEqual(castleMoves(gs), [])
+
+    def testCastles(self):
+        for backend in BACKENDS:
+            gs = EngineChess.GameState(backend, fen = "r3k2r/8/8/8/8/8/8/R3K2R w KQkq - 0 1")
+            self.assertEqual(castleMoves(gs), ["e1c1", "e1g1"])
+
+class PerftTest(unittest.TestCase):
+    def testKiwipete(self):
+        for backend in BACKENDS:
+            gs = EngineChess.GameState(backend, fen = KIWIPETE)
+            self.assertEqual(perft(gs, 2), 2039)
+
+class MoveCacheTest(unittest.TestCase):
+    def testCachedMatchesFullGeneration(self):
+        for position in POSITIONS:
+            self.assertEqual(verifyIncremental(EngineChess.GameState(fen = position["fen"]), 2), 0, position["name"])
+
+    def testRandomGames(self):
+        rng = random.Random(2024)
+        for game in range(10):
+            gs = EngineChess.GameState()
+            for ply in range(120):
+                moves = gs.getValidMoves()
+                self.assertEqual(verifyIncremental(gs, 1), 0, gs.getFen())
+                if not moves:
+                    break
+                gs.makeMove(rng.choice(moves))
+                if rng.random() < 0.1: #take back now and then, undoMove must dirty the squares too
+                    gs.undoMove()
+
+class StagedMovesTest(unittest.TestCase):
+    def checkStages(self, gs):
+        valid = sorted(move.code for move in gs.getValidMoves())
+        context = gs.prepareStages()
+        noisy = gs.generateStage(context, EngineChess.NOISY_MOVES)
+        self.assertTrue(all(move.pieceCaptured != "--" or move.isPromotionPawn for move in noisy), gs.getFen())
+        quiet = gs.generateStage(context, EngineChess.QUIET_MOVES)
+        self.assertEqual(sorted(move.code for move in noisy + quiet), valid, gs.getFen())
+        context = gs.prepareStages()
+        byPiece = [move for sq in range(64) for move in gs.generateStage(context, EngineChess.ALL_MOVES, sq)]
+        self.assertEqual(sorted(move.code for move in byPiece), valid, gs.getFen())
+        staged = sorted(move.code for move in gs.getStagedMoves())
+        self.assertEqual(staged, valid, gs.getFen())
+
+    def testPerftPositions(self):
+        for backend in BACKENDS:
+            for position in POSITIONS:
+                gs = EngineChess.GameState(backend, fen = position["fen"])
+                self.checkStages(gs)
+                for move in gs.getValidMoves():
+                    gs.makeMove(move)
+                    self.checkStages(gs)
+                    gs.undoMove()
+
+class FenTest(unittest.TestCase):
+    def testRoundTrip(self):
+        for backend in BACKENDS:
+            for fen in ("rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1", KIWIPETE,
+                        "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1", "4k3/8/8/3pP3/8/8/8/4K3 w - d6 0 23"):
+                self.assertEqual(EngineChess.GameState(backend, fen = fen).getFen(), fen)
+
+    def testAfterMoves(self):
+        for backend in BACKENDS:
+            gs = EngineChess.GameState(backend)
+            for text in ("e2e4", "c7c5", "g1f3"):
+                gs.makeMove(EngineChess.Move.fromLan(gs, text))
+            self.assertEqual(gs.getFen(), "rnbqkbnr/pp1ppppp/8/2p5/4P3/5N2/PPPP1PPP/RNBQKB1R b KQkq - 1 2")
+            gs.undoMove()
+            self.assertEqual(gs.getFen(), "rnbqkbnr/pp1ppppp/8/2p5/4P3/8/PPPP1PPP/RNBQKBNR w KQkq c6 0 2")
+
+class NotationTest(unittest.TestCase):
+    def testSanAndLanRoundTrip(self):
+        for backend in BACKENDS:
+            gs = EngineChess.GameState(backend, fen = KIWIPETE)
+            validMoves = gs.getValidMoves()
+            for move in validMoves:
+                self.assertEqual(EngineChess.Move.fromSan(gs, move.getSan(gs, validMoves), validMoves), move)
+                self.assertEqual(EngineChess.Move.fromLan(gs, move.getLan(), validMoves), move)
+                self.assertEqual(EngineChess.Move.fromLan(gs, move.getChessNotation(), validMoves), move)
+
+    def testSan(self):
+        for backend in BACKENDS:
+            gs = EngineChess.GameState(backend, fen = "3k4/1P6/8/8/8/8/R6R/4K3 w - - 0 1")
+            sans = sorted(move.getSan(gs) for move in gs.getValidMoves())
+            self.assertIn("Rad2+", sans) #both rooks reach d2
+            self.assertIn("b8=Q+", sans)
+            self.assertIn("b8=N", sans)
+            gs = EngineChess.GameState(backend, fen = "6k1/5ppp/8/8/8/8/8/R3K3 w Q - 0 1")
+            self.assertIn("Ra8#", [move.getSan(gs) for move in gs.getValidMoves()])
+            self.assertIn("O-O-O", [move.getSan(gs) for move in gs.getValidMoves()])
+            self.assertIsNone(EngineChess.Move.fromSan(gs, "Qd4"))
+            self.assertIsNone(EngineChess.Move.fromSan(gs, "xyz"))
+
+    def testLan(self):
+        for backend in BACKENDS:
+            gs = EngineChess.GameState(backend)
+            self.assertEqual(EngineChess.Move.fromLan(gs, "Ng1-f3").getLan(), "Ng1-f3")
+            self.assertIsNone(EngineChess.Move.fromLan(gs, "e2e5"))
+
+if __name__ == "__main__":
+    unittest.main()
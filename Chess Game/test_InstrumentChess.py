@@ -0,0 +1,32 @@
+import time
+import unittest
+
+import EngineChess
+from InstrumentChess import EngineStats
+from SearchChess import Searcher
+
+class EngineStatsTest(unittest.TestCase):
+    def testSelfTimeAddsUp(self):
+        gs = EngineChess.GameState()
+        searcher = Searcher(hashMB = 1)
+        with EngineStats(timing = True).attach(gs, searcher) as stats:
+            start = time.perf_counter()
+            searcher.search(gs, 3)
+            elapsed = time.perf_counter() - start
+        seconds = stats.toDict()["seconds"]
+        #recursive negamax calls are not counted twice, so no name (nor all of them) takes longer than the search
+        self.assertLessEqual(sum(seconds.values()), elapsed)
+        self.assertGreater(seconds["negamax"], 0)
+
+    def testDetachRestores(self):
+        gs = EngineChess.GameState()
+        searcher = Searcher(hashMB = 1)
+        with EngineStats().attach(gs, searcher) as stats:
+            searcher.search(gs, 2)
+        self.assertNotIn("getValidMoves", vars(gs))
+        self.assertNotIn("negamax", vars(searcher))
+        self.assertGreater(stats.calls["makeMove"], 0)
+        self.assertEqual(stats.toDict()["search"]["iterations"][-1]["depth"], 2)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,21 @@
+import unittest
+
+from PgnChess import readGames, replayGame
+
+class ReadGamesTest(unittest.TestCase):
+    def moves(self, text):
+        return [sanMoves for tags, sanMoves in readGames(text.splitlines())]
+
+    def testSemicolonAfterBraceComment(self):
+        games = self.moves("1. e4 {c; x} e5 2. Nf3 ; note\n2... Nc6 *")
+        self.assertEqual(games, [["e4", "e5", "Nf3", "Nc6"]])
+        self.assertEqual(len(list(replayGame({}, games[0]))), 4)
+
+    def testBraceAfterSemicolon(self):
+        self.assertEqual(self.moves("1. e4 e5 ; { not a comment\n2. Nf3 Nc6 *"), [["e4", "e5", "Nf3", "Nc6"]])
+
+    def testBraceCommentOverLines(self):
+        self.assertEqual(self.moves("1. e4 { a long\n; still the comment } e5 *"), [["e4", "e5"]])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,78 @@
+import asyncio
+import json
+import unittest
+
+from ServerChess import AnalysisServer, RequestError, loadPosition
+
+class LoadPositionTest(unittest.TestCase):
+    def testBadFens(self):
+        for fen in ("x", "8/8/8/8/8/8/8/8 w - - 0 1", "4k3/8/8/8/8/8/8/4K2P w - - 0 1", 42,
+                    "1k6/8/8/8/8/8/8/4K3 b q - 0 1", "4k3/8/8/8/8/8/8/4K2R w KQ - 0 1"):
+            with self.assertRaises(RequestError):
+                loadPosition(fen)
+        self.assertEqual(loadPosition("r3k2r/8/8/8/8/8/8/R3K2R w KQkq - 0 1").getFen(), "r3k2r/8/8/8/8/8/8/R3K2R w KQkq - 0 1")
+
+class ServerTest(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.server = AnalysisServer(workers = 1, hashMB = 1)
+        socket = self.loop.run_until_complete(self.server.start(port = 0)).sockets[0]
+        self.reader, self.writer = self.loop.run_until_complete(asyncio.open_connection(*socket.getsockname()[:2]))
+
+    def tearDown(self):
+        self.writer.close()
+        self.server.close()
+        self.loop.run_until_complete(asyncio.sleep(0.01))
+        self.loop.close()
+
+    '''
+    Send the requests (dicts, or raw lines as bytes) and return the answers by id
+    '''
+    def ask(self, *requests):
+        async def exchange():
+            for request in requests:
+                self.writer.write(request if isinstance(request, bytes) else json.dumps(request).encode() + b"\n")
+            answers = {}
+            for _ in requests:
+                answer = json.loads(await asyncio.wait_for(self.reader.readline(), 10))
+                answers[answer["id"]] = answer
+            return answers
+        return self.loop.run_until_complete(exchange())
+
+    def testErrors(self):
+        self.assertEqual(self.ask(b"{not json\n")[None]["error"], "bad json")
+        self.assertEqual(self.ask({"id": [7], "op": "fen"})[None]["error"], "bad request") #a list id can't be echoed
+        answers = self.ask({"id": 1, "op": "nope"}, {"id": 2, "op": "fen", "session": 99},
+                           {"id": 3, "op": "legal", "fen": "8/8/x w - - 0 1"}, {"id": 4, "op": "legal"},
+                           {"id": 5, "op": "best", "fen": "4k3/8/8/8/8/8/8/4K3 w - - 0 1", "time": float("nan")},
+                           {"id": 6, "op": "best", "fen": "4k3/8/8/8/8/8/8/4K3 w - - 0 1", "depth": float("inf")},
+                           {"id": 8, "op": "evaluate", "fen": "1k6/8/8/8/8/8/8/4K3 b q - 0 1"})
+        self.assertEqual(answers[1]["error"], "unknown op")
+        self.assertEqual(answers[2]["error"], "unknown session")
+        self.assertEqual(answers[3]["error"], "bad fen")
+        self.assertEqual(answers[4]["error"], "session or fen needed")
+        self.assertEqual(answers[5]["error"], "bad time or depth")
+        self.assertEqual(answers[6]["error"], "bad time or depth")
+        self.assertEqual(answers[8]["error"], "bad castling rights")
+
+    def testIllegalMove(self):
+        session = self.ask({"id": 1, "op": "new"})[1]["session"]
+        answers = self.ask({"id": 2, "op": "move", "session": session, "move": "e2e5"},
+                           {"id": 3, "op": "move", "session": session, "move": "Nf3"})
+        self.assertEqual(answers[2]["error"], "illegal move")
+        self.assertTrue(answers[3]["ok"])
+
+    def testBatchSurvivesEngineError(self):
+        session = self.ask({"id": 1, "op": "new"})[1]["session"]
+        def broken():
+            raise ValueError("engine bug")
+        self.server.sessions[session].gs.getValidMoves = broken
+        answers = self.ask({"id": 2, "op": "legal", "session": session}, {"id": 3, "op": "legal"},
+                           {"id": 4, "op": "legal", "fen": "4k3/8/8/8/8/8/8/4K3 w - - 0 1"})
+        self.assertEqual(answers[2]["error"], "internal error")
+        self.assertEqual(answers[3]["error"], "session or fen needed")
+        self.assertEqual(len(answers[4]["moves"]), 5)
+        self.assertEqual(len(self.ask({"id": 5, "op": "legal", "fen": "4k3/8/8/8/8/8/8/4K3 b - - 0 1"})[5]["moves"]), 5)
+
+if __name__ == "__main__":
+    unittest.main()
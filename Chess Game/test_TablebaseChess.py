@@ -0,0 +1,52 @@
+import pickle
+import shutil
+import tempfile
+import unittest
+
+import EngineChess
+from SearchChess import Searcher
+from TablebaseChess import Tablebases, generateTables, WIN, DRAW, LOSS
+
+class TablebaseTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.mkdtemp()
+        generateTables(["KQK"], cls.directory, report = None)
+        cls.tablebases = Tablebases(cls.directory)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tablebases.close()
+        shutil.rmtree(cls.directory)
+
+    def probe(self, fen, tablebases = None):
+        return (tablebases or self.tablebases).probe(EngineChess.GameState("bitboard", fen = fen))
+
+    def testProbes(self):
+        self.assertEqual(self.probe("7k/Q7/6K1/8/8/8/8/8 w - - 0 1"), (WIN, 1))
+        self.assertEqual(self.probe("7k/6Q1/6K1/8/8/8/8/8 b - - 0 1"), (LOSS, 0))
+        self.assertEqual(self.probe("7k/8/6QK/8/8/8/8/8 b - - 0 1"), (DRAW, 0)) #stalemate
+
+    def testColorsSwapped(self):
+        self.assertEqual(self.probe("8/8/8/8/8/6k1/6q1/7K w - - 0 1"), (LOSS, 0))
+
+    def testInsufficientAndMissing(self):
+        self.assertEqual(self.probe("7k/8/8/8/8/8/8/K7 w - - 0 1"), (DRAW, 0))
+        self.assertIsNone(self.probe("7k/8/8/8/8/8/8/KR6 w - - 0 1"))
+
+    def testPickleMapsTheFilesAgain(self):
+        copy = pickle.loads(pickle.dumps(self.tablebases))
+        try:
+            self.assertEqual(self.probe("7k/Q7/6K1/8/8/8/8/8 w - - 0 1", copy), (WIN, 1))
+        finally:
+            copy.close()
+
+    def testSearchPlaysTheMate(self):
+        gs = EngineChess.GameState("bitboard", fen = "7k/Q7/6K1/8/8/8/8/8 w - - 0 1")
+        result = Searcher(hashMB = 1, tablebases = self.tablebases).search(gs, 3)
+        gs.makeMove(result.bestMove)
+        gs.getValidMoves()
+        self.assertTrue(gs.checkMate) #Qa8 and Qg7 both mate
+
+if __name__ == "__main__":
+    unittest.main()
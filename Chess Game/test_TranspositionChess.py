@@ -0,0 +1,51 @@
+import unittest
+
+from TranspositionChess import TranspositionTable, EXACT, LOWER, UPPER
+
+class TranspositionTableTest(unittest.TestCase):
+    def setUp(self):
+        self.tt = TranspositionTable(1)
+        self.tt.newSearch()
+
+    def testStoreProbe(self):
+        key = 0x123456789ABCDEF0
+        self.assertIsNone(self.tt.probe(key))
+        self.tt.store(key, 5, EXACT, -1234, 321)
+        self.assertEqual(self.tt.probe(key), (5, EXACT, -1234, 321))
+
+    def testOtherKeyOfTheBucketMisses(self):
+        key = 0x123456789ABCDEF0
+        self.tt.store(key, 5, LOWER, 50, 7)
+        self.assertIsNone(self.tt.probe(key ^ 1 << 63))
+
+    def testBoundWithoutMoveKeepsMove(self):
+        key = 42
+        self.tt.store(key, 3, EXACT, 10, 99)
+        self.tt.store(key, 4, UPPER, -20)
+        self.assertEqual(self.tt.probe(key), (4, UPPER, -20, 99))
+
+    def testShallowEntryGoesToAlwaysReplaceSlot(self):
+        deep = 5
+        shallow = deep + (self.tt.mask + 1) #same bucket, other key
+        self.tt.store(deep, 8, EXACT, 1, 1)
+        self.tt.store(shallow, 2, EXACT, 2, 2)
+        self.assertEqual(self.tt.probe(deep), (8, EXACT, 1, 1))
+        self.assertEqual(self.tt.probe(shallow), (2, EXACT, 2, 2))
+
+    def testOlderGenerationIsReplaced(self):
+        old = 5
+        new = old + (self.tt.mask + 1)
+        self.tt.store(old, 8, EXACT, 1, 1)
+        self.tt.newSearch()
+        self.tt.store(new, 2, EXACT, 2, 2)
+        self.assertIsNone(self.tt.probe(old))
+        self.assertEqual(self.tt.probe(new), (2, EXACT, 2, 2))
+
+    def testMateScores(self):
+        self.tt.store(7, 1, EXACT, 1000000, 0)
+        self.assertEqual(self.tt.probe(7)[2], 1000000)
+        self.tt.store(8, 1, EXACT, -1000000, 0)
+        self.assertEqual(self.tt.probe(8)[2], -1000000)
+
+if __name__ == "__main__":
+    unittest.main()
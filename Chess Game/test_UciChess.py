@@ -0,0 +1,100 @@
+import io
+import time
+import unittest
+
+from UciChess import UciEngine, scoreText, thinkTime
+from SearchChess import CHECKMATE
+
+MATE_IN_ONE = "position fen 7k/Q7/6K1/8/8/8/8/8 w - - 0 1"
+
+class UciTest(unittest.TestCase):
+    def setUp(self):
+        self.output = io.StringIO()
+        self.engine = UciEngine(self.output)
+
+    def tearDown(self):
+        self.engine.stop()
+        self.engine.closeSearcher()
+
+    def lines(self):
+        return self.output.getvalue().splitlines()
+
+    def bestmoves(self):
+        return [line for line in self.lines() if line.startswith("bestmove")]
+
+    def waitSearch(self):
+        self.engine.thread.join(10)
+
+    def testHandshake(self):
+        self.engine.command("uci")
+        self.engine.command("isready")
+        self.assertIn("uciok", self.lines())
+        self.assertEqual(self.lines()[-1], "readyok")
+        self.assertFalse(self.engine.command("quit"))
+
+    def testPositionMoves(self):
+        self.engine.command("position startpos moves e2e4 e7e5 g1f3")
+        self.assertEqual(self.engine.gs.getFen(), "rnbqkbnr/pppp1ppp/8/4p3/4P3/5N2/PPPP1PPP/RNBQKB1R b KQkq - 1 2")
+        self.engine.command("position startpos moves e2e4 e2e4")
+        self.assertIn("info string illegal move e2e4", self.lines())
+
+    def testBadFen(self):
+        self.engine.command("position fen 8/8/x w - - 0 1")
+        self.assertTrue(self.lines()[-1].startswith("info string bad fen"))
+
+    def testGoDepth(self):
+        self.engine.command("position startpos")
+        self.engine.command("go depth 2")
+        self.waitSearch()
+        self.assertEqual(len(self.bestmoves()), 1)
+        self.assertTrue(any(line.startswith("info depth 2 ") for line in self.lines()))
+
+    def testBadGoValuesAreIgnored(self):
+        self.assertEqual(self.engine.goParams(["depth", "x", "movetime", "100", "nodes"]), {"movetime": 100})
+        self.engine.command("position startpos")
+        self.engine.command("go depth")
+        self.engine.command("stop")
+        self.assertEqual(len(self.bestmoves()), 1)
+
+    def testInfiniteWaitsForStop(self):
+        self.engine.command(MATE_IN_ONE)
+        self.engine.command("go infinite depth 3")
+        self.waitSearchDone()
+        self.assertEqual(self.bestmoves(), [])
+        self.engine.command("stop")
+        self.assertEqual(len(self.bestmoves()), 1)
+
+    def testPonderHit(self):
+        self.engine.command(MATE_IN_ONE)
+        self.engine.command("go ponder depth 3")
+        self.waitSearchDone()
+        self.assertEqual(self.bestmoves(), [])
+        self.engine.command("ponderhit")
+        self.waitSearch()
+        self.assertEqual(len(self.bestmoves()), 1)
+
+    def waitSearchDone(self):
+        #the search stops once it has seen the mate, only the bestmove is held
+        deadline = time.time() + 10
+        while not any(" score mate 1 " in line for line in self.lines()) and time.time() < deadline:
+            time.sleep(0.01)
+        time.sleep(0.1)
+
+    def testBadBookFile(self):
+        self.engine.command("setoption name BookFile value /nonexistent/book.bin")
+        self.assertTrue(self.lines()[-1].startswith("info string BookFile not loaded"))
+        self.assertIsNone(self.engine.book)
+        self.engine.command("setoption name Hash value lots")
+        self.assertEqual(self.engine.options["Hash"], 16)
+
+    def testScoreText(self):
+        self.assertEqual(scoreText(35), "cp 35")
+        self.assertEqual(scoreText(CHECKMATE - 1), "mate 1")
+        self.assertEqual(scoreText(-(CHECKMATE - 2)), "mate -1")
+
+    def testThinkTime(self):
+        self.assertIsNone(thinkTime({"depth": 5}, True))
+        self.assertAlmostEqual(thinkTime({"movetime": 1000}, True), 0.95)
+
+if __name__ == "__main__":
+    unittest.main()